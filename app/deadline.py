@@ -0,0 +1,90 @@
+"""
+Deadline helpers
+Thread-safe page and document timeouts that work inside thread and process pools
+(replaces the SIGALRM-based timeout, which only works in the main thread)
+"""
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class Deadline:
+    """以 time.monotonic() 計算的截止時間（None 表示沒有時限）"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        Args:
+            seconds: 從現在起算的秒數，None 或 <= 0 表示沒有時限
+        """
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.expires_at = time.monotonic() + self.seconds if self.seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """剩餘秒數（沒有時限時為 None，已過期時為 0）"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """是否已超過截止時間"""
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def limit(self, timeout: Optional[float]) -> Optional[float]:
+        """取 timeout 與剩餘時間中較短者"""
+        remaining = self.remaining()
+        if timeout is None:
+            return remaining
+        if remaining is None:
+            return timeout
+        return min(timeout, remaining)
+
+
+class DeadlineExceeded(TimeoutError):
+    """run_with_timeout 逾時（worker 為已被放棄、仍在背景執行的執行緒）"""
+
+    def __init__(self, message: str, worker: threading.Thread):
+        super().__init__(message)
+        self.worker = worker
+
+
+def run_with_timeout(fn: Callable, timeout: Optional[float], *args, **kwargs) -> Any:
+    """
+    在獨立的 daemon 執行緒中執行 fn，並在 timeout 秒內等待結果
+
+    Python 無法強制終止執行緒；逾時後該執行緒會被放棄並在背景自行結束，
+    呼叫端不應再使用它正在操作的物件（例如 OCR 引擎）。
+
+    Args:
+        fn: 要執行的函數
+        timeout: 最長等待秒數，None 表示無限等待
+
+    Returns:
+        fn 的回傳值
+
+    Raises:
+        DeadlineExceeded: 超過時限（TimeoutError 的子類別，可由 worker 得知放棄的執行緒何時結束）
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+
+    outcome = {}
+    done = threading.Event()
+
+    def target():
+        try:
+            outcome["result"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    worker = threading.Thread(target=target, name="ocr-deadline", daemon=True)
+    worker.start()
+
+    if not done.wait(timeout):
+        raise DeadlineExceeded(f"處理超過時限 ({timeout:.1f} 秒)", worker)
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
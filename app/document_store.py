@@ -0,0 +1,420 @@
+"""
+Document store
+Keeps uploaded-file metadata, processing results (raw text, layouts,
+markdown, txt) and background OCR job state behind a pluggable interface
+with TTL expiry; the SQLite backend is shared by all uvicorn workers
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 文件記錄的欄位
+DOCUMENT_FIELDS = (
+    "file_id",
+    "filename",
+    "file_type",
+    "file_path",
+    "sha256",
+    "upload_time",
+    "updated_at",
+    "expires_at",
+    "raw_text",
+    "layout_info",
+    "processed_text",
+    "markdown_content",
+    "txt_content"
+)
+
+# 以 JSON 儲存的欄位
+JSON_FIELDS = ("layout_info",)
+
+
+class DocumentStore(ABC):
+    """文件儲存介面（記錄在最後一次更新後 ttl 秒過期）"""
+
+    def __init__(self, ttl: float = 86400):
+        """
+        Args:
+            ttl: 記錄保留秒數，0 表示不過期
+        """
+        self.ttl = max(0.0, ttl)
+
+    def _expiry(self, now: float) -> Optional[float]:
+        return now + self.ttl if self.ttl else None
+
+    def _new_record(self, file_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """建立完整的記錄（未提供的欄位為 None）"""
+        self._check_fields(fields)
+        now = time.time()
+        record = {field: None for field in DOCUMENT_FIELDS}
+        record.update(fields)
+        record["file_id"] = file_id
+        record["upload_time"] = record["upload_time"] or now
+        record["updated_at"] = now
+        record["expires_at"] = self._expiry(now)
+        return record
+
+    @staticmethod
+    def _check_fields(fields: Dict[str, Any]):
+        unknown = set(fields) - set(DOCUMENT_FIELDS)
+        if unknown:
+            raise ValueError(f"不支援的文件欄位: {', '.join(sorted(unknown))}")
+
+    @abstractmethod
+    def create(self, file_id: str, **fields) -> Dict[str, Any]:
+        """
+        新增文件記錄
+
+        Args:
+            file_id: 檔案 ID
+            **fields: DOCUMENT_FIELDS 中的欄位
+
+        Returns:
+            完整的記錄
+        """
+
+    @abstractmethod
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """讀取文件記錄（不存在或已過期時為 None）"""
+
+    @abstractmethod
+    def update(self, file_id: str, **fields) -> bool:
+        """
+        更新文件記錄的欄位，並延長過期時間
+
+        Returns:
+            記錄是否存在
+        """
+
+    @abstractmethod
+    def delete(self, file_id: str) -> bool:
+        """刪除文件記錄，回傳記錄是否存在"""
+
+    @abstractmethod
+    def put_job(self, job: Dict[str, Any]):
+        """
+        新增或更新 OCR 背景工作狀態（與文件記錄相同的 ttl，從最後一次更新起算）
+
+        Args:
+            job: 工作資料（以 job_id 為鍵，內容須可序列化為 JSON）
+        """
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """讀取 OCR 背景工作狀態（不存在或已過期時為 None）"""
+
+    @abstractmethod
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        """
+        移除已過期的記錄（已過期的工作狀態一併移除）
+
+        Returns:
+            被移除的記錄（呼叫端負責刪除對應的上傳檔案）
+        """
+
+    @abstractmethod
+    def get_stats(self) -> dict:
+        """獲取儲存統計資訊"""
+
+    def close(self):
+        """關閉儲存"""
+
+
+class MemoryDocumentStore(DocumentStore):
+    """行程內記憶體儲存（單一 worker 使用，超過上限時淘汰最久未更新的記錄）"""
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 1000):
+        """
+        Args:
+            ttl: 記錄保留秒數，0 表示不過期
+            max_entries: 記錄數量上限
+        """
+        super().__init__(ttl)
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # job_id -> (過期時間, 工作資料)
+        self._jobs: "OrderedDict[str, Tuple[Optional[float], Dict[str, Any]]]" = OrderedDict()
+        self._evicted = 0
+
+    def create(self, file_id: str, **fields) -> Dict[str, Any]:
+        record = self._new_record(file_id, fields)
+        with self._lock:
+            self._records[file_id] = record
+            self._records.move_to_end(file_id)
+            while len(self._records) > self.max_entries:
+                evicted_id, _ = self._records.popitem(last=False)
+                self._evicted += 1
+                logger.warning(f"文件記錄數量超過上限，淘汰最舊的記錄 (file_id: {evicted_id})")
+        return dict(record)
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(file_id)
+            if record is None:
+                return None
+            if record["expires_at"] is not None and record["expires_at"] <= time.time():
+                return None
+            return dict(record)
+
+    def update(self, file_id: str, **fields) -> bool:
+        self._check_fields(fields)
+        now = time.time()
+        with self._lock:
+            record = self._records.get(file_id)
+            if record is None:
+                return False
+            record.update(fields)
+            record["updated_at"] = now
+            record["expires_at"] = self._expiry(now)
+            self._records.move_to_end(file_id)
+            return True
+
+    def delete(self, file_id: str) -> bool:
+        with self._lock:
+            return self._records.pop(file_id, None) is not None
+
+    def put_job(self, job: Dict[str, Any]):
+        with self._lock:
+            self._jobs[job["job_id"]] = (self._expiry(time.time()), dict(job))
+            self._jobs.move_to_end(job["job_id"])
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._jobs.get(job_id)
+            if entry is None:
+                return None
+            expires_at, job = entry
+            if expires_at is not None and expires_at <= time.time():
+                return None
+            return dict(job)
+
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            expired_jobs = [
+                job_id for job_id, (expires_at, _) in self._jobs.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for job_id in expired_jobs:
+                del self._jobs[job_id]
+            expired = [
+                file_id for file_id, record in self._records.items()
+                if record["expires_at"] is not None and record["expires_at"] <= now
+            ]
+            return [self._records.pop(file_id) for file_id in expired]
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "documents": len(self._records),
+                "jobs": len(self._jobs),
+                "max_entries": self.max_entries,
+                "evicted": self._evicted,
+                "ttl": self.ttl
+            }
+
+
+class SQLiteDocumentStore(DocumentStore):
+    """SQLite 儲存（WAL 模式，多個 worker 行程可共用同一份資料庫）"""
+
+    def __init__(self, path: str, ttl: float = 86400):
+        """
+        Args:
+            path: 資料庫檔案路徑
+            ttl: 記錄保留秒數，0 表示不過期
+        """
+        super().__init__(ttl)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 連線不可跨執行緒使用，每個執行緒各自建立
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    file_id TEXT PRIMARY KEY,
+                    filename TEXT,
+                    file_type TEXT,
+                    file_path TEXT,
+                    sha256 TEXT,
+                    upload_time REAL,
+                    updated_at REAL,
+                    expires_at REAL,
+                    raw_text TEXT,
+                    layout_info TEXT,
+                    processed_text TEXT,
+                    markdown_content TEXT,
+                    txt_content TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_expires_at ON documents (expires_at)")
+            # OCR 背景工作狀態（任一 worker 都能回應其他 worker 建立的工作查詢）
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    data TEXT,
+                    updated_at REAL,
+                    expires_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires_at ON jobs (expires_at)")
+
+        logger.info(f"✓ 文件儲存已開啟: {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """取得目前執行緒的連線"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            key: json.dumps(value, ensure_ascii=False) if key in JSON_FIELDS and value is not None else value
+            for key, value in fields.items()
+        }
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        for key in JSON_FIELDS:
+            if record.get(key) is not None:
+                record[key] = json.loads(record[key])
+        return record
+
+    def create(self, file_id: str, **fields) -> Dict[str, Any]:
+        record = self._new_record(file_id, fields)
+        encoded = self._encode(record)
+        columns = ", ".join(encoded)
+        placeholders = ", ".join(f":{key}" for key in encoded)
+        with self._connect() as conn:
+            conn.execute(f"INSERT OR REPLACE INTO documents ({columns}) VALUES ({placeholders})", encoded)
+        return record
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT * FROM documents WHERE file_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (file_id, time.time())
+        ).fetchone()
+        return self._decode(row) if row is not None else None
+
+    def update(self, file_id: str, **fields) -> bool:
+        self._check_fields(fields)
+        now = time.time()
+        encoded = self._encode(fields)
+        encoded.update(updated_at=now, expires_at=self._expiry(now))
+        assignments = ", ".join(f"{key} = :{key}" for key in encoded)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE documents SET {assignments} WHERE file_id = :_file_id",
+                {**encoded, "_file_id": file_id}
+            )
+        return cursor.rowcount > 0
+
+    def delete(self, file_id: str) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+        return cursor.rowcount > 0
+
+    def put_job(self, job: Dict[str, Any]):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, data, updated_at, expires_at) VALUES (?, ?, ?, ?)",
+                (job["job_id"], json.dumps(job, ensure_ascii=False), now, self._expiry(now))
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM jobs WHERE job_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (job_id, time.time())
+        ).fetchone()
+        return json.loads(row["data"]) if row is not None else None
+
+    def purge_expired(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "DELETE FROM documents WHERE file_id = ? AND expires_at <= ?",
+                    [(row["file_id"], now) for row in rows]
+                )
+            conn.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        return [self._decode(row) for row in rows]
+
+    def get_stats(self) -> dict:
+        conn = self._connect()
+        documents = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        jobs = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        try:
+            size_bytes = self.path.stat().st_size
+        except OSError:
+            size_bytes = 0
+        return {
+            "backend": "sqlite",
+            "documents": documents,
+            "jobs": jobs,
+            "size_bytes": size_bytes,
+            "ttl": self.ttl
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# 全域文件儲存實例
+_document_store: Optional[DocumentStore] = None
+
+
+def get_document_store() -> DocumentStore:
+    """
+    獲取或創建文件儲存（單例模式）
+
+    Returns:
+        DocumentStore 實例（DOCUMENT_STORE=sqlite 或 memory）
+    """
+    global _document_store
+
+    if _document_store is None:
+        backend = os.getenv("DOCUMENT_STORE", "sqlite")
+        ttl = float(os.getenv("DOCUMENT_TTL", "86400"))
+
+        if backend == "memory":
+            _document_store = MemoryDocumentStore(
+                ttl=ttl,
+                max_entries=int(os.getenv("DOCUMENT_STORE_MAX_ENTRIES", "1000"))
+            )
+        elif backend == "sqlite":
+            _document_store = SQLiteDocumentStore(
+                path=os.getenv("DOCUMENT_STORE_PATH", "./data/documents.db"),
+                ttl=ttl
+            )
+        else:
+            raise ValueError(f"不支援的文件儲存類型: {backend}")
+
+    return _document_store
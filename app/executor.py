@@ -0,0 +1,280 @@
+"""
+OCR worker executor
+Runs CPU-bound OCR stages off the event loop with a bounded admission queue
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+import logging
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from .ocr_pool import get_ocr_pool, get_preload_languages
+from .services_simple import map_language
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    """工作佇列已滿（應以 503 + Retry-After 回應）"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _init_process_worker(languages: List[str]):
+    """process 模式工作行程初始化：預先載入 PRELOAD_LANGUAGES 的引擎（失敗的語言只記錄在預先載入狀態）"""
+    get_ocr_pool().preload(languages)
+
+
+def _worker_preload_status() -> Dict[str, Any]:
+    """在工作行程中回報行程 ID 與引擎預先載入狀態"""
+    time.sleep(0.05)  # 讓其他仍在初始化的工作行程也能取得預熱工作
+    return {"pid": os.getpid(), **get_ocr_pool().get_preload_status()}
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    """在工作執行緒/行程中執行，並回傳實際開始與結束時間"""
+    started_at = time.time()
+    result = fn(*args, **kwargs)
+    return started_at, time.time(), result
+
+
+class OCRExecutor:
+    """有界的 OCR 工作執行器（執行緒池或行程池）"""
+
+    def __init__(self, max_workers: int = 1, max_queue: int = 8, mode: str = "thread"):
+        """
+        初始化執行器
+
+        Args:
+            max_workers: 同時執行的工作數量
+            max_queue: 等待中的工作上限，超過時直接拒絕
+            mode: thread 或 process
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"不支援的執行器模式: {mode}")
+
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.mode = mode
+
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # process 模式工作行程的預先載入狀態（warm_up 完成後設定）
+        self._preload_status: Optional[Dict[str, Any]] = None
+
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_wait_time": 0.0,
+            "max_wait_time": 0.0,
+            "total_run_time": 0.0
+        }
+
+    def _get_executor(self) -> Executor:
+        """
+        延遲建立底層執行器
+
+        process 模式使用 spawn 啟動工作行程：服務行程中已有事件迴圈、Paddle 引擎與多個背景執行緒，
+        fork 會複製這些狀態與可能被持有的鎖。每個工作行程在初始化時載入自己的引擎。
+        """
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process_worker,
+                    initargs=(get_preload_languages(),)
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="ocr-worker"
+                )
+            logger.info(f"✓ OCR 執行器已建立 (模式: {self.mode}, 工作數: {self.max_workers}, 佇列上限: {self.max_queue})")
+        return self._executor
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        process 模式預先啟動所有工作行程，並等待每個行程載入 PRELOAD_LANGUAGES 的引擎
+        （thread 模式的引擎由服務行程中的引擎池預先載入，不需預熱）
+
+        Returns:
+            與 OCREnginePool.get_preload_status 相同格式的狀態（合併所有工作行程）
+        """
+        if self.mode != "process":
+            return self.get_preload_status()
+
+        # 沒有閒置工作行程時每次送出都會啟動新行程；持續送出直到每個行程都回報過
+        executor = self._get_executor()
+        statuses: Dict[int, Dict[str, Any]] = {}
+        try:
+            while len(statuses) < self.max_workers:
+                futures = [executor.submit(_worker_preload_status) for _ in range(self.max_workers)]
+                for future in futures:
+                    status = future.result()
+                    statuses[status["pid"]] = status
+        except Exception as e:
+            logger.error(f"✗ OCR 工作行程預熱失敗: {str(e)}")
+            failed = self.get_preload_status()
+            with self._lock:
+                self._preload_status = {
+                    "ready": False,
+                    "languages": dict.fromkeys(failed["languages"], "failed"),
+                    "errors": dict.fromkeys(failed["languages"], str(e))
+                }
+            return self.get_preload_status()
+
+        languages: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        for status in statuses.values():
+            for lang, state in status["languages"].items():
+                if languages.get(lang) != "failed":
+                    languages[lang] = state
+            errors.update(status["errors"])
+
+        with self._lock:
+            self._preload_status = {
+                "ready": all(state == "ready" for state in languages.values()),
+                "languages": languages,
+                "errors": errors
+            }
+        logger.info(f"✓ OCR 工作行程已預熱 (行程數: {len(statuses)})")
+        return self.get_preload_status()
+
+    def get_preload_status(self) -> Dict[str, Any]:
+        """
+        process 模式工作行程的引擎預先載入狀態（warm_up 完成前為 loading）
+
+        Returns:
+            {"ready": 所有工作行程皆已預熱, "languages": {語言: 狀態}, "errors": {語言: 錯誤訊息}}
+        """
+        with self._lock:
+            if self._preload_status is not None:
+                return dict(self._preload_status)
+        languages = dict.fromkeys((map_language(lang) for lang in get_preload_languages()), "loading")
+        return {"ready": False, "languages": languages, "errors": {}}
+
+    def submit(self, fn: Callable, *args, **kwargs) -> "asyncio.Future":
+        """
+        立即進行准入檢查並送出工作（必須在事件迴圈中呼叫）
+
+        Args:
+            fn: 要執行的函數（process 模式下必須可被 pickle）
+
+        Returns:
+            可 await 的 asyncio.Future，結果為 fn 的回傳值
+
+        Raises:
+            QueueFullError: 佇列已滿
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise QueueFullError("OCR 工作佇列已滿，請稍後再試", self._estimate_retry_after())
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+        enqueued_at = time.time()
+        try:
+            future = self._get_executor().submit(_timed_call, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._stats["failed"] += 1
+            raise
+
+        return asyncio.ensure_future(self._collect(future, enqueued_at))
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        將工作送入執行器並等待結果
+
+        Raises:
+            QueueFullError: 佇列已滿
+        """
+        return await self.submit(fn, *args, **kwargs)
+
+    async def _collect(self, future, enqueued_at: float) -> Any:
+        """等待底層 future 完成並更新統計"""
+        try:
+            started_at, finished_at, result = await asyncio.wrap_future(future)
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        wait_time = max(0.0, started_at - enqueued_at)
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["total_wait_time"] += wait_time
+            self._stats["max_wait_time"] = max(self._stats["max_wait_time"], wait_time)
+            self._stats["total_run_time"] += finished_at - started_at
+
+        return result
+
+    def _estimate_retry_after(self) -> int:
+        """依平均執行時間估算 Retry-After 秒數（呼叫端須持有鎖）"""
+        completed = self._stats["completed"]
+        avg_run_time = self._stats["total_run_time"] / completed if completed else 1.0
+        waves = self._pending / self.max_workers
+        return max(1, int(avg_run_time * waves + 0.5))
+
+    def get_stats(self) -> dict:
+        """獲取執行器統計資訊"""
+        with self._lock:
+            stats = dict(self._stats)
+            pending = self._pending
+
+        completed = stats["completed"]
+        stats.update({
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(pending, self.max_workers),
+            "queue_depth": max(0, pending - self.max_workers),
+            "avg_wait_time": stats["total_wait_time"] / completed if completed else 0.0,
+            "avg_run_time": stats["total_run_time"] / completed if completed else 0.0
+        })
+        return stats
+
+    def shutdown(self, wait: bool = False):
+        """關閉底層執行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+        self._preload_status = None
+
+
+# 全域執行器實例
+_ocr_executor: Optional[OCRExecutor] = None
+
+
+def get_ocr_executor() -> OCRExecutor:
+    """
+    獲取或創建 OCR 執行器（單例模式）
+
+    Returns:
+        OCRExecutor 實例
+    """
+    global _ocr_executor
+
+    if _ocr_executor is None:
+        _ocr_executor = OCRExecutor(
+            max_workers=int(os.getenv("OCR_WORKERS", "1")),
+            max_queue=int(os.getenv("OCR_MAX_QUEUE", "8")),
+            mode=os.getenv("OCR_EXECUTOR_MODE", "thread")
+        )
+
+    return _ocr_executor
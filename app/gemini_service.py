@@ -3,12 +3,18 @@ Gemini API integration service
 Handles text structuring, summarization and other AI features
 """
 
-import google.generativeai as genai
-from typing import Optional
+import httpx
+from typing import AsyncIterator, List, Optional
+import asyncio
+import json
 import logging
+import random
+import re
 import time
 import os
 
+from .llm_cache import make_llm_cache_key
+
 logger = logging.getLogger(__name__)
 
 
@@ -79,6 +85,109 @@ DEFAULT_PROMPTS = {
 }
 
 
+# 長文件分段時，擷取各段重點的提示詞（map 階段，之後再以原提示詞彙整）
+CHUNK_NOTES_PROMPT = """你是一個專業的閱讀助手。以下是一份長文件中的第 {index}/{total} 段 OCR 辨識內容。
+
+請完整擷取這一段中的所有重要資訊（研究背景、方法、數據、結論、作者、出處等），以條列式輸出。
+不要省略數字與專有名詞，不要加入原文沒有的內容，也不要撰寫前言或總結。"""
+
+# 分段後需要彙整（reduce）的提示詞類型；其餘類型各段結果依序串接
+REDUCE_PROMPT_TYPES = {"summarize", "academic"}
+
+# OCR 輸出中的頁面分隔標記（--- 第 N 頁 ---）
+PAGE_MARKER_PATTERN = re.compile(r"^--- 第 \d+ 頁 ---$", re.MULTILINE)
+
+# 預設的分段字元數上限與同時進行的分段請求數
+DEFAULT_CHUNK_CHARS = 20000
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+# 單次請求的輸出 token 上限
+DEFAULT_MAX_OUTPUT_TOKENS = 8192
+
+# 串接模式下每個輸出 token 可容納的輸入字元數（中文約一字一 token，並保留 Markdown 標記的空間）
+OUTPUT_CHARS_PER_TOKEN = 0.75
+
+
+def _split_block(block: str, max_chars: int) -> List[str]:
+    """將超過上限的單頁依段落（空行）切開，單一段落仍超過上限時依字元數硬切"""
+    pieces: List[str] = []
+    current = ""
+    for paragraph in block.split("\n\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        candidate = f"{current}\n\n{paragraph}" if current else paragraph
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = paragraph
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_text_chunks(text: str, max_chars: int) -> List[str]:
+    """
+    將長文件切分為多段（優先在頁面分隔標記處切開，再依字元數上限合併相鄰頁面）
+    
+    Args:
+        text: 要切分的文字
+        max_chars: 每段的字元數上限（0 表示不切分）
+        
+    Returns:
+        各段文字（順序與原文相同）
+    """
+    if max_chars <= 0 or len(text) <= max_chars:
+        return [text]
+    
+    # 以頁面標記為界切成頁面區塊（標記保留在所屬頁面的開頭）
+    starts = [match.start() for match in PAGE_MARKER_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    blocks = [text[start:end].strip("\n") for start, end in zip(starts, starts[1:] + [len(text)])]
+    
+    chunks: List[str] = []
+    current = ""
+    for block in blocks:
+        if not block:
+            continue
+        for piece in _split_block(block, max_chars) if len(block) > max_chars else [block]:
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if len(candidate) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# Gemini REST API 預設端點（可改為本機代理或測試用的 stub server）
+DEFAULT_API_ENDPOINT = "https://generativelanguage.googleapis.com"
+
+# 系統指令模式的生成參數（輸出 token 上限由 max_output_tokens 設定）
+SYSTEM_INSTRUCTION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+}
+
+# 可重試的 HTTP 狀態碼（速率限制與伺服器錯誤）
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiRequestError(RuntimeError):
+    """Gemini API 請求錯誤（retryable 表示是否值得重試）"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
 class GeminiService:
     """Gemini API 服務類別"""
     
@@ -87,7 +196,12 @@ class GeminiService:
         api_key: Optional[str] = None,
         model_name: str = "gemini-2.0-flash-exp",
         max_retries: int = 3,
-        timeout: int = 60
+        timeout: int = 60,
+        api_endpoint: str = DEFAULT_API_ENDPOINT,
+        retry_base_delay: float = 1.0,
+        chunk_chars: int = DEFAULT_CHUNK_CHARS,
+        chunk_concurrency: int = DEFAULT_CHUNK_CONCURRENCY,
+        max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS
     ):
         """
         初始化 Gemini 服務
@@ -96,31 +210,33 @@ class GeminiService:
             api_key: Gemini API 金鑰
             model_name: 模型名稱
             max_retries: 最大重試次數
-            timeout: 請求超時時間（秒）
+            timeout: 每次請求的超時時間（秒）
+            api_endpoint: Gemini REST API 端點
+            retry_base_delay: 重試退避的基準秒數
+            chunk_chars: 長文件分段的字元數上限（0 表示不分段）
+            chunk_concurrency: 同時進行的分段請求數上限（所有請求共用）
+            max_output_tokens: 單次請求的輸出 token 上限（串接模式的分段大小也受此限制）
         """
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         self.model_name = model_name
         self.max_retries = max_retries
         self.timeout = timeout
-        self.model = None
+        self.api_endpoint = api_endpoint.rstrip("/")
+        self.retry_base_delay = retry_base_delay
+        # 共用的 HTTP 連線池（第一次使用時建立）
+        self._http_client: Optional[httpx.AsyncClient] = None
+        # 長文件分段處理
+        self.chunk_chars = max(0, chunk_chars)
+        self.chunk_concurrency = max(1, chunk_concurrency)
+        self.max_output_tokens = max(1, max_output_tokens)
+        self._chunk_semaphore: Optional[asyncio.Semaphore] = None
         
         if not self.api_key or self.api_key == "your_gemini_api_key_here":
             logger.warning("Gemini API Key 未設定，Gemini 功能將無法使用")
             self.api_available = False
         else:
-            self._initialize_client()
             self.api_available = True
-    
-    def _initialize_client(self):
-        """初始化 Gemini 客戶端"""
-        try:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(self.model_name)
             logger.info(f"✓ Gemini API 初始化成功 (模型: {self.model_name})")
-        except Exception as e:
-            logger.error(f"Gemini API 初始化失敗: {str(e)}")
-            self.api_available = False
-            raise RuntimeError(f"無法初始化 Gemini API: {str(e)}")
     
     def get_default_prompt(self, prompt_type: str) -> str:
         """
@@ -134,15 +250,44 @@ class GeminiService:
         """
         return DEFAULT_PROMPTS.get(prompt_type, DEFAULT_PROMPTS["structure"])
     
-    def process_text(
+    def response_cache_key(
         self,
         text: str,
         prompt_type: str = "structure",
         custom_prompt: Optional[str] = None,
         system_instruction: Optional[str] = None
     ) -> str:
+        """回應快取鍵（模型名稱、實際提示詞、系統指令、實際分段字元數與正規化後的輸入文字）"""
+        prompt = custom_prompt or self.get_default_prompt(prompt_type)
+        return make_llm_cache_key(
+            self.model_name, prompt, system_instruction, text, self._chunk_limit(prompt_type, custom_prompt)
+        )
+    
+    def _chunk_limit(self, prompt_type: str, custom_prompt: Optional[str]) -> int:
         """
-        使用 Gemini 處理文字
+        實際使用的分段字元數上限
+        
+        串接模式（結構化、自訂提示詞）每段的輸出長度與輸入相當，分段大小不超過單次輸出 token 上限可容納的字元數，
+        避免輸出被截斷；彙整模式每段只輸出重點，只受 chunk_chars 限制。
+        """
+        if self.chunk_chars <= 0 or self._should_reduce(prompt_type, custom_prompt):
+            return self.chunk_chars
+        return min(self.chunk_chars, int(self.max_output_tokens * OUTPUT_CHARS_PER_TOKEN))
+    
+    def _build_prompt(self, text: str, prompt_type: str, custom_prompt: Optional[str]) -> str:
+        """組合提示詞與要處理的內容"""
+        system_prompt = custom_prompt or self.get_default_prompt(prompt_type)
+        return f"{system_prompt}\n\n以下是需要處理的內容：\n\n{text}"
+    
+    async def process_text_async(
+        self,
+        text: str,
+        prompt_type: str = "structure",
+        custom_prompt: Optional[str] = None,
+        system_instruction: Optional[str] = None
+    ) -> str:
+        """
+        使用 Gemini 處理文字（非同步，不阻塞事件迴圈）
         
         Args:
             text: 要處理的文字
@@ -156,44 +301,225 @@ class GeminiService:
         if not self.api_available:
             raise RuntimeError("Gemini API 不可用，請檢查 API Key 設定")
         
-        # 選擇提示詞
-        if custom_prompt:
-            system_prompt = custom_prompt
-        else:
-            system_prompt = self.get_default_prompt(prompt_type)
+        chunks = split_text_chunks(text, self._chunk_limit(prompt_type, custom_prompt))
+        if len(chunks) == 1:
+            return await self.generate_content_async(
+                self._build_prompt(text, prompt_type, custom_prompt),
+                system_instruction
+            )
+        
+        return await self._process_chunks_async(chunks, prompt_type, custom_prompt, system_instruction)
+    
+    async def _process_chunks_async(
+        self,
+        chunks: List[str],
+        prompt_type: str,
+        custom_prompt: Optional[str],
+        system_instruction: Optional[str]
+    ) -> str:
+        """
+        分段處理長文件（map-reduce）
+        
+        各段以有上限的並行度同時送出；總結類提示詞先擷取各段重點，再以原提示詞彙整成一份結果，
+        其餘提示詞（結構化、自訂）的各段結果依原順序串接。
+        
+        Args:
+            chunks: 各段文字
+            prompt_type: 提示詞類型
+            custom_prompt: 自訂提示詞（覆蓋 prompt_type）
+            system_instruction: 系統指令
+            
+        Returns:
+            處理後的文字
+        """
+        reduce = self._should_reduce(prompt_type, custom_prompt)
+        start_time = time.time()
+        tasks = self._start_chunk_tasks(chunks, prompt_type, custom_prompt, system_instruction, reduce)
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            # 任一段失敗或請求被取消時，取消尚未完成的分段請求
+            for task in tasks:
+                task.cancel()
+        logger.info(f"✓ Gemini 分段處理完成：{len(chunks)} 段，耗時 {time.time() - start_time:.2f} 秒")
+        
+        if not reduce:
+            return "\n\n".join(result.strip() for result in results)
+        
+        return await self.generate_content_async(
+            self._build_prompt(self._join_chunk_notes(results), prompt_type, None),
+            system_instruction
+        )
+    
+    @staticmethod
+    def _should_reduce(prompt_type: str, custom_prompt: Optional[str]) -> bool:
+        """分段結果是否需要彙整（總結類提示詞），否則依序串接"""
+        return custom_prompt is None and prompt_type in REDUCE_PROMPT_TYPES
+    
+    @staticmethod
+    def _join_chunk_notes(results: List[str]) -> str:
+        """組合各段重點，作為彙整步驟的輸入"""
+        total = len(results)
+        return "\n\n".join(f"### 第 {i}/{total} 段重點\n{result.strip()}" for i, result in enumerate(results, 1))
+    
+    def _start_chunk_tasks(
+        self,
+        chunks: List[str],
+        prompt_type: str,
+        custom_prompt: Optional[str],
+        system_instruction: Optional[str],
+        reduce: bool
+    ) -> List["asyncio.Task"]:
+        """同時送出各段請求（受 chunk_concurrency 限制），回傳依原順序排列的工作"""
+        if self._chunk_semaphore is None:
+            self._chunk_semaphore = asyncio.Semaphore(self.chunk_concurrency)
+        total = len(chunks)
+        
+        async def run_chunk(index: int, chunk: str) -> str:
+            if reduce:
+                prompt = f"{CHUNK_NOTES_PROMPT.format(index=index, total=total)}\n\n以下是需要處理的內容：\n\n{chunk}"
+            else:
+                prompt = self._build_prompt(chunk, prompt_type, custom_prompt)
+            async with self._chunk_semaphore:
+                logger.info(f"Gemini 分段處理：第 {index}/{total} 段 ({len(chunk)} 字元)")
+                return await self.generate_content_async(prompt, system_instruction)
+        
+        return [asyncio.ensure_future(run_chunk(i, chunk)) for i, chunk in enumerate(chunks, 1)]
+    
+    async def process_text_stream(
+        self,
+        text: str,
+        prompt_type: str = "structure",
+        custom_prompt: Optional[str] = None,
+        system_instruction: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        使用 Gemini 處理文字並逐段產出生成的文字
         
-        # 構建完整提示
-        full_prompt = f"{system_prompt}\n\n以下是需要處理的內容：\n\n{text}"
+        單段文件直接轉送模型的串流輸出；分段的長文件在串接模式下依序產出已完成的各段結果，
+        彙整模式下各段重點完成後再串流彙整步驟的輸出。
         
-        # 如果有系統指令，使用新版 API
+        Args:
+            text: 要處理的文字
+            prompt_type: 提示詞類型
+            custom_prompt: 自訂提示詞（覆蓋 prompt_type）
+            system_instruction: 系統指令
+            
+        Yields:
+            新生成的文字片段（全部串接即為完整結果）
+        """
+        if not self.api_available:
+            raise RuntimeError("Gemini API 不可用，請檢查 API Key 設定")
+        
+        chunks = split_text_chunks(text, self._chunk_limit(prompt_type, custom_prompt))
+        if len(chunks) == 1:
+            async for piece in self.stream_content_async(
+                self._build_prompt(text, prompt_type, custom_prompt),
+                system_instruction
+            ):
+                yield piece
+            return
+        
+        reduce = self._should_reduce(prompt_type, custom_prompt)
+        tasks = self._start_chunk_tasks(chunks, prompt_type, custom_prompt, system_instruction, reduce)
+        try:
+            if not reduce:
+                for index, task in enumerate(tasks):
+                    result = (await task).strip()
+                    yield f"\n\n{result}" if index else result
+                return
+            results = await asyncio.gather(*tasks)
+        finally:
+            # 用戶端中斷或任一段失敗時，取消尚未完成的分段請求
+            for task in tasks:
+                task.cancel()
+        
+        async for piece in self.stream_content_async(
+            self._build_prompt(self._join_chunk_notes(results), prompt_type, None),
+            system_instruction
+        ):
+            yield piece
+    
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """取得共用的 HTTP 連線池（API Key 放在請求標頭，避免出現在記錄的 URL 中）"""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                base_url=self.api_endpoint,
+                headers={"x-goog-api-key": self.api_key},
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._http_client
+    
+    def _build_payload(self, prompt: str, system_instruction: Optional[str]) -> dict:
+        """組合 generateContent 請求內容"""
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
         if system_instruction:
-            generation_config = {
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "max_output_tokens": 8192,
+            payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+            payload["generationConfig"] = {
+                "temperature": SYSTEM_INSTRUCTION_CONFIG["temperature"],
+                "topP": SYSTEM_INSTRUCTION_CONFIG["top_p"],
+                "maxOutputTokens": self.max_output_tokens,
             }
-            
-            model_with_system = genai.GenerativeModel(
-                self.model_name,
-                system_instruction=system_instruction,
-                generation_config=generation_config
+        return payload
+    
+    async def _request(self, payload: dict) -> str:
+        """送出一次 generateContent 請求並取出文字"""
+        try:
+            response = await self._get_http_client().post(
+                f"/v1beta/models/{self.model_name}:generateContent",
+                json=payload
             )
-            
-            return self._generate_with_retry(model_with_system, full_prompt)
-        else:
-            return self._generate_with_retry(self.model, full_prompt)
+        except httpx.HTTPError as e:
+            raise GeminiRequestError(f"連線失敗: {type(e).__name__}: {str(e)}")
+        
+        if response.status_code != 200:
+            raise GeminiRequestError(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                retryable=response.status_code in RETRYABLE_STATUS_CODES
+            )
+        
+        text = self._extract_text(self._parse_json(response.text))
+        if not text:
+            raise GeminiRequestError("Gemini API 返回空內容")
+        return text
     
-    def _generate_with_retry(self, model, prompt: str) -> str:
+    @staticmethod
+    def _parse_json(raw: str) -> dict:
+        """解析回應（或串流片段）的 JSON，格式錯誤時拋出 GeminiRequestError"""
+        try:
+            data = json.loads(raw)
+        except ValueError as e:
+            raise GeminiRequestError(f"回應格式錯誤: {str(e)}: {raw[:200]}")
+        if not isinstance(data, dict):
+            raise GeminiRequestError(f"回應格式錯誤: {raw[:200]}")
+        return data
+    
+    @staticmethod
+    def _extract_text(data: dict) -> str:
+        """取出回應（或串流片段）中第一個候選結果的文字"""
+        return "".join(
+            part.get("text", "")
+            for candidate in data.get("candidates", [])[:1]
+            for part in candidate.get("content", {}).get("parts", [])
+        )
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """指數退避加上隨機抖動（避免多個請求同時重試）"""
+        return self.retry_base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+    
+    async def generate_content_async(self, prompt: str, system_instruction: Optional[str] = None) -> str:
         """
-        帶重試機制的生成函數
+        帶重試機制的非同步生成函數（每次嘗試都受 timeout 限制）
         
         Args:
-            model: Gemini 模型實例
             prompt: 提示詞
+            system_instruction: 系統指令
             
         Returns:
             生成的文字
         """
+        payload = self._build_payload(prompt, system_instruction)
         last_error = None
         
         for attempt in range(self.max_retries):
@@ -201,30 +527,110 @@ class GeminiService:
                 logger.info(f"Gemini API 請求 (嘗試 {attempt + 1}/{self.max_retries})...")
                 
                 start_time = time.time()
-                response = model.generate_content(prompt)
+                text = await asyncio.wait_for(self._request(payload), timeout=self.timeout)
                 elapsed_time = time.time() - start_time
                 
                 logger.info(f"✓ Gemini API 請求成功，耗時 {elapsed_time:.2f} 秒")
+                return text
                 
-                if response.text:
-                    return response.text
-                else:
-                    raise ValueError("Gemini API 返回空內容")
-                
-            except Exception as e:
+            except asyncio.TimeoutError:
+                last_error = GeminiRequestError(f"請求超時（{self.timeout} 秒）")
+            except GeminiRequestError as e:
                 last_error = e
-                logger.warning(f"Gemini API 請求失敗 (嘗試 {attempt + 1}): {str(e)}")
+            
+            logger.warning(f"Gemini API 請求失敗 (嘗試 {attempt + 1}): {str(last_error)}")
+            if not last_error.retryable:
+                break
+            
+            if attempt < self.max_retries - 1:
+                wait_time = self._backoff_delay(attempt)
+                logger.info(f"等待 {wait_time:.1f} 秒後重試...")
+                await asyncio.sleep(wait_time)
+        
+        error_msg = f"Gemini API 請求失敗（已嘗試 {attempt + 1} 次）: {str(last_error)}"
+        logger.error(error_msg)
+        raise RuntimeError(error_msg)
+    
+    async def stream_content_async(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        串流生成（streamGenerateContent），模型每產生一段文字就立即產出
+        
+        尚未收到任何文字前的失敗會依 generate_content_async 的規則重試；
+        已經送出部分文字後的失敗無法重試，直接拋出錯誤。
+        timeout 限制兩段文字之間的最長等待時間。
+        
+        Args:
+            prompt: 提示詞
+            system_instruction: 系統指令
+            
+        Yields:
+            新生成的文字片段
+        """
+        payload = self._build_payload(prompt, system_instruction)
+        last_error = None
+        
+        for attempt in range(self.max_retries):
+            emitted = False
+            try:
+                logger.info(f"Gemini API 串流請求 (嘗試 {attempt + 1}/{self.max_retries})...")
                 
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # 指數退避
-                    logger.info(f"等待 {wait_time} 秒後重試...")
-                    time.sleep(wait_time)
+                start_time = time.time()
+                async with self._get_http_client().stream(
+                    "POST",
+                    f"/v1beta/models/{self.model_name}:streamGenerateContent",
+                    params={"alt": "sse"},
+                    json=payload
+                ) as response:
+                    if response.status_code != 200:
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        raise GeminiRequestError(
+                            f"HTTP {response.status_code}: {body[:200]}",
+                            retryable=response.status_code in RETRYABLE_STATUS_CODES
+                        )
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        text = self._extract_text(self._parse_json(line[len("data:"):]))
+                        if text:
+                            emitted = True
+                            yield text
+                
+                if not emitted:
+                    raise GeminiRequestError("Gemini API 返回空內容")
+                
+                logger.info(f"✓ Gemini API 串流完成，耗時 {time.time() - start_time:.2f} 秒")
+                return
+                
+            except httpx.TimeoutException:
+                last_error = GeminiRequestError(f"請求超時（{self.timeout} 秒）")
+            except httpx.HTTPError as e:
+                last_error = GeminiRequestError(f"連線失敗: {type(e).__name__}: {str(e)}")
+            except GeminiRequestError as e:
+                last_error = e
+            
+            logger.warning(f"Gemini API 串流請求失敗 (嘗試 {attempt + 1}): {str(last_error)}")
+            if emitted or not last_error.retryable:
+                break
+            
+            if attempt < self.max_retries - 1:
+                wait_time = self._backoff_delay(attempt)
+                logger.info(f"等待 {wait_time:.1f} 秒後重試...")
+                await asyncio.sleep(wait_time)
         
-        # 所有重試都失敗
-        error_msg = f"Gemini API 請求失敗（已重試 {self.max_retries} 次）: {str(last_error)}"
+        error_msg = f"Gemini API 串流請求失敗（已嘗試 {attempt + 1} 次）: {str(last_error)}"
         logger.error(error_msg)
         raise RuntimeError(error_msg)
     
+    async def close(self):
+        """關閉 HTTP 連線池"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
     def is_available(self) -> bool:
         """檢查 Gemini API 是否可用"""
         return self.api_available
@@ -235,7 +641,10 @@ class GeminiService:
             "available": self.api_available,
             "model": self.model_name,
             "max_retries": self.max_retries,
-            "timeout": self.timeout
+            "timeout": self.timeout,
+            "chunk_chars": self.chunk_chars,
+            "chunk_concurrency": self.chunk_concurrency,
+            "max_output_tokens": self.max_output_tokens
         }
 
 
@@ -257,12 +666,17 @@ def get_gemini_service() -> GeminiService:
         model_name = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
         max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
         timeout = int(os.getenv("GEMINI_TIMEOUT", "60"))
+        api_endpoint = os.getenv("GEMINI_API_ENDPOINT", DEFAULT_API_ENDPOINT)
         
         _gemini_service = GeminiService(
             api_key=api_key,
             model_name=model_name,
             max_retries=max_retries,
-            timeout=timeout
+            timeout=timeout,
+            api_endpoint=api_endpoint,
+            chunk_chars=int(os.getenv("GEMINI_CHUNK_CHARS", str(DEFAULT_CHUNK_CHARS))),
+            chunk_concurrency=int(os.getenv("GEMINI_CHUNK_CONCURRENCY", str(DEFAULT_CHUNK_CONCURRENCY))),
+            max_output_tokens=int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", str(DEFAULT_MAX_OUTPUT_TOKENS)))
         )
     
     return _gemini_service
@@ -0,0 +1,143 @@
+"""
+Health checks
+Readiness derived from the OCR engine pool, page-parallel worker pools,
+executor queue saturation and free disk space, cached for a short TTL so
+frequent probes stay cheap
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .executor import get_ocr_executor
+from .ocr_pool import get_ocr_pool
+from .parallel import get_page_parallelism, get_parallel_preload_status
+
+logger = logging.getLogger(__name__)
+
+
+class HealthChecker:
+    """就緒狀態檢查（結果快取 cache_ttl 秒）"""
+
+    def __init__(self, directories: List[str], min_free_bytes: int = 0, cache_ttl: float = 5.0):
+        """
+        Args:
+            directories: 需要檢查剩餘空間的目錄（上傳與臨時目錄）
+            min_free_bytes: 每個目錄所在磁碟的最低剩餘空間
+            cache_ttl: 檢查結果的快取秒數
+        """
+        self.directories = directories
+        self.min_free_bytes = max(0, min_free_bytes)
+        self.cache_ttl = max(0.0, cache_ttl)
+
+        self._lock = threading.Lock()
+        self._cached: Optional[Dict[str, Any]] = None
+        self._cached_at = 0.0
+
+    def _check_engines(self) -> Dict[str, Any]:
+        """預先載入的引擎是否全部就緒（未設定預先載入時，只要已有可用的引擎即可）"""
+        executor = get_ocr_executor()
+        if executor.mode == "process":
+            # OCR 在工作行程中執行，以工作行程的預熱狀態為準
+            preload = executor.get_preload_status()
+            return {"ok": preload["ready"], **preload}
+
+        pool = get_ocr_pool()
+        preload = pool.get_preload_status()
+        if preload["languages"]:
+            return {"ok": preload["ready"], **preload}
+        stats = pool.get_stats()
+        return {"ok": stats["engines_created"] > 0, "languages": {}, "errors": {}}
+
+    def _check_parallel(self) -> Dict[str, Any]:
+        """多頁平行處理的行程池是否已預先啟動（OCR_PAGE_PARALLELISM > 1 時檢查）"""
+        preload = get_parallel_preload_status()
+        return {"ok": preload["ready"], **preload}
+
+    def _check_queue(self) -> Dict[str, Any]:
+        """OCR 工作佇列是否已滿（已滿時新的請求會被拒絕；未設定等待佇列時不檢查）"""
+        stats = get_ocr_executor().get_stats()
+        return {
+            "ok": stats["max_queue"] <= 0 or stats["queue_depth"] < stats["max_queue"],
+            "running": stats["running"],
+            "max_workers": stats["max_workers"],
+            "queue_depth": stats["queue_depth"],
+            "max_queue": stats["max_queue"]
+        }
+
+    def _check_disk(self) -> Dict[str, Any]:
+        """上傳與臨時目錄所在磁碟的剩餘空間"""
+        directories = {}
+        ok = True
+        for directory in self.directories:
+            try:
+                usage = shutil.disk_usage(directory)
+            except OSError as e:
+                directories[directory] = {"ok": False, "error": str(e)}
+                ok = False
+                continue
+            directory_ok = usage.free >= self.min_free_bytes
+            directories[directory] = {
+                "ok": directory_ok,
+                "free_bytes": usage.free,
+                "total_bytes": usage.total
+            }
+            ok = ok and directory_ok
+        return {"ok": ok, "min_free_bytes": self.min_free_bytes, "directories": directories}
+
+    def _compute(self) -> Dict[str, Any]:
+        checks = {
+            "ocr_engines": self._check_engines(),
+            "ocr_queue": self._check_queue(),
+            "disk": self._check_disk()
+        }
+        if get_page_parallelism() > 1:
+            checks["ocr_parallel"] = self._check_parallel()
+        return {
+            "ready": all(check["ok"] for check in checks.values()),
+            "checks": checks,
+            "checked_at": time.time()
+        }
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        獲取就緒狀態（使用快取的檢查結果）
+
+        Returns:
+            {"ready": 是否就緒, "checks": {ocr_engines, ocr_queue, disk, ocr_parallel（頁面平行度 > 1 時）}, "checked_at": 檢查時間}
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._cached is None or now - self._cached_at >= self.cache_ttl:
+                self._cached = self._compute()
+                self._cached_at = now
+                if not self._cached["ready"]:
+                    failed = [name for name, check in self._cached["checks"].items() if not check["ok"]]
+                    logger.warning(f"⚠ 服務尚未就緒: {', '.join(failed)}")
+            return self._cached
+
+
+# 全域健康檢查實例
+_health_checker: Optional[HealthChecker] = None
+
+
+def get_health_checker() -> HealthChecker:
+    """
+    獲取或創建健康檢查（單例模式）
+
+    Returns:
+        HealthChecker 實例
+    """
+    global _health_checker
+
+    if _health_checker is None:
+        _health_checker = HealthChecker(
+            directories=[os.getenv("UPLOAD_DIR", "./uploads"), os.getenv("TEMP_DIR", "./temp")],
+            min_free_bytes=int(os.getenv("MIN_FREE_DISK_BYTES", str(512 * 1024 * 1024))),
+            cache_ttl=float(os.getenv("HEALTH_CACHE_TTL", "5"))
+        )
+
+    return _health_checker
@@ -0,0 +1,248 @@
+"""
+Background janitor
+Periodically evicts expired documents, old uploads and temp files, and
+keeps the upload/temp directories under a total disk budget (oldest first)
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .document_store import get_document_store
+
+logger = logging.getLogger(__name__)
+
+# 剛建立的檔案可能仍在上傳或處理中，超過磁碟預算時也不淘汰
+MIN_EVICTION_AGE = 60
+
+
+class Janitor:
+    """定期清理上傳檔案、臨時檔案與過期的文件記錄"""
+
+    def __init__(
+        self,
+        upload_dir: str,
+        temp_dir: str,
+        interval: float = 300,
+        max_age: float = 86400,
+        disk_budget: int = 0
+    ):
+        """
+        初始化清理器
+
+        Args:
+            upload_dir: 上傳目錄
+            temp_dir: 臨時檔案目錄
+            interval: 清理間隔秒數
+            max_age: 檔案保留秒數，0 表示不依時間清理
+            disk_budget: 上傳與臨時目錄的總大小上限（位元組），0 表示不限制
+        """
+        self.upload_dir = Path(upload_dir)
+        self.temp_dir = Path(temp_dir)
+        self.interval = max(1.0, interval)
+        self.max_age = max(0.0, max_age)
+        self.disk_budget = max(0, disk_budget)
+
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "runs": 0,
+            "errors": 0,
+            "records_expired": 0,
+            "files_evicted_expired": 0,
+            "files_evicted_age": 0,
+            "files_evicted_budget": 0,
+            "bytes_freed": 0,
+            "disk_usage_bytes": 0,
+            "last_run_at": None,
+            "last_run_duration": 0.0
+        }
+
+    def _list_files(self) -> List[Tuple[Path, float, int]]:
+        """列出上傳與臨時目錄中的檔案 (路徑, 修改時間, 大小)，略過 .gitkeep 等隱藏檔"""
+        files = []
+        for directory in (self.upload_dir, self.temp_dir):
+            if not directory.exists():
+                continue
+            for path in directory.iterdir():
+                if path.name.startswith("."):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if path.is_file():
+                    files.append((path, stat.st_mtime, stat.st_size))
+        return files
+
+    def _remove(self, path: Path) -> int:
+        """刪除檔案並回傳釋放的位元組數（已不存在時為 0）"""
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            return size
+        except OSError:
+            return 0
+
+    def _file_id(self, path: Path) -> str:
+        """檔案對應的 file_id（上傳檔名為 {file_id}.{ext}，臨時檔名為 {file_id}_...）"""
+        if path.parent == self.upload_dir:
+            return path.stem
+        return path.name.split("_", 1)[0]
+
+    def _remove_document(self, path: Path):
+        """刪除上傳檔案對應的文件記錄（上傳檔名為 {file_id}.{ext}）"""
+        if path.parent == self.upload_dir:
+            get_document_store().delete(path.stem)
+
+    def run_once(self) -> dict:
+        """
+        執行一次清理（同步，應在執行緒中呼叫）
+
+        Returns:
+            本次清理結果
+        """
+        started_at = time.time()
+        result = {
+            "records_expired": 0,
+            "files_evicted_expired": 0,
+            "files_evicted_age": 0,
+            "files_evicted_budget": 0,
+            "bytes_freed": 0
+        }
+
+        # 1. 過期的文件記錄及其上傳檔案、下載用的臨時檔案
+        for record in get_document_store().purge_expired():
+            result["records_expired"] += 1
+            paths = list(self.temp_dir.glob(f"{record['file_id']}_*"))
+            if record.get("file_path"):
+                paths.append(Path(record["file_path"]))
+            for path in paths:
+                freed = self._remove(path)
+                if freed:
+                    result["files_evicted_expired"] += 1
+                    result["bytes_freed"] += freed
+
+        # 2. 超過保留時間的檔案（包含沒有對應記錄的上傳檔案與下載用的臨時檔案）
+        #    記錄仍有效的檔案不刪除：記錄的期限會隨更新延長，檔案的修改時間則不會
+        files = self._list_files()
+        store = get_document_store()
+        live = {path for path, _, _ in files if store.get(self._file_id(path)) is not None}
+        if self.max_age:
+            kept = []
+            for path, mtime, size in files:
+                if started_at - mtime > self.max_age and path not in live:
+                    self._remove_document(path)
+                    freed = self._remove(path)
+                    if freed:
+                        result["files_evicted_age"] += 1
+                        result["bytes_freed"] += freed
+                else:
+                    kept.append((path, mtime, size))
+            files = kept
+
+        # 3. 超過磁碟預算時從最舊的檔案開始淘汰（先淘汰沒有有效記錄的檔案）
+        usage = sum(size for _, _, size in files)
+        if self.disk_budget and usage > self.disk_budget:
+            for path, mtime, size in sorted(files, key=lambda item: (item[0] in live, item[1])):
+                if usage <= self.disk_budget:
+                    break
+                if started_at - mtime < MIN_EVICTION_AGE:
+                    continue
+                self._remove_document(path)
+                freed = self._remove(path)
+                usage -= size
+                if freed:
+                    result["files_evicted_budget"] += 1
+                    result["bytes_freed"] += freed
+
+        duration = time.time() - started_at
+        with self._lock:
+            for key, value in result.items():
+                self._stats[key] += value
+            self._stats["runs"] += 1
+            self._stats["disk_usage_bytes"] = usage
+            self._stats["last_run_at"] = started_at
+            self._stats["last_run_duration"] = duration
+
+        evicted = result["files_evicted_expired"] + result["files_evicted_age"] + result["files_evicted_budget"]
+        if evicted or result["records_expired"]:
+            logger.info(
+                f"✓ 清理完成：過期記錄 {result['records_expired']} 筆，刪除檔案 {evicted} 個，"
+                f"釋放 {result['bytes_freed'] / 1024 / 1024:.1f}MB，耗時 {duration:.2f} 秒"
+            )
+        return result
+
+    async def _loop(self):
+        """定期在執行緒中執行清理，不阻塞事件迴圈"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                logger.error(f"背景清理失敗: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """啟動背景清理工作（必須在事件迴圈中呼叫）"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(
+                f"✓ 背景清理已啟動 (間隔: {self.interval:.0f} 秒, 保留: {self.max_age:.0f} 秒, "
+                f"磁碟預算: {self.disk_budget / 1024 / 1024:.0f}MB)"
+            )
+
+    async def stop(self):
+        """停止背景清理工作"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> dict:
+        """獲取清理統計資訊"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            "running": self._task is not None,
+            "interval": self.interval,
+            "max_age": self.max_age,
+            "disk_budget": self.disk_budget
+        })
+        return stats
+
+
+# 全域清理器實例
+_janitor: Optional[Janitor] = None
+
+
+def get_janitor() -> Janitor:
+    """
+    獲取或創建背景清理器（單例模式）
+
+    Returns:
+        Janitor 實例
+    """
+    global _janitor
+
+    if _janitor is None:
+        _janitor = Janitor(
+            upload_dir=os.getenv("UPLOAD_DIR", "./uploads"),
+            temp_dir=os.getenv("TEMP_DIR", "./temp"),
+            interval=float(os.getenv("JANITOR_INTERVAL", "300")),
+            max_age=float(os.getenv("FILE_MAX_AGE", "86400")),
+            disk_budget=int(os.getenv("DISK_BUDGET_BYTES", "0"))
+        )
+
+    return _janitor
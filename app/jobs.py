@@ -0,0 +1,271 @@
+"""
+Asynchronous OCR jobs
+Background scheduler with bounded concurrency, per-page progress and result polling;
+job state is mirrored to the document store so any worker can answer a poll
+"""
+
+import asyncio
+import time
+import uuid
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .document_store import DocumentStore, get_document_store
+from .executor import get_ocr_executor, QueueFullError
+from .pipeline import run_ocr_file, lookup_cached_result
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# 處理中的進度寫入共用儲存的最短間隔秒數（狀態變更時一律寫入）
+PROGRESS_SAVE_INTERVAL = 1.0
+
+
+class OCRJobManager:
+    """OCR 背景工作管理器"""
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_retained: int = 1000,
+        store: Optional[DocumentStore] = None
+    ):
+        """
+        初始化工作管理器
+
+        Args:
+            max_concurrent: 同時執行的工作數量上限
+            max_retained: 行程內保留的工作數量上限（超過時淘汰最舊的已結束工作，共用儲存中的狀態保留至過期）
+            store: 保存工作狀態的共用儲存，None 表示使用全域文件儲存
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_retained = max(1, max_retained)
+        self.store = store
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def create_job(
+        self,
+        file_id: str,
+        file_path: str,
+        file_type: str,
+        language: str,
+        on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+        file_sha256: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        建立 OCR 工作並立即排入背景執行（必須在事件迴圈中呼叫）
+
+        Args:
+            file_id: 檔案 ID
+            file_path: 上傳檔案路徑
+            file_type: MIME 類型
+            language: OCR 語言
+            on_complete: 工作成功後的回呼（接收工作資料）
+            file_sha256: 上傳時已計算的檔案雜湊（查詢結果快取，不必重新計算）
+
+        Returns:
+            工作資料
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "file_id": file_id,
+            "language": language,
+            "status": JOB_QUEUED,
+            "current_page": 0,
+            "total_pages": 0,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "raw_text": None,
+            "layout_info": None,
+            "page_errors": [],
+            "cached": False
+        }
+        self._jobs[job_id] = job
+        self._evict_finished()
+        self._save(job)
+
+        self._tasks[job_id] = asyncio.create_task(
+            self._run_job(job, file_path, file_type, on_complete, file_sha256)
+        )
+        logger.info(f"✓ 已建立 OCR 工作 (job_id: {job_id}, file_id: {file_id})")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """獲取工作資料（其他 worker 行程建立的工作從共用儲存讀取）"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._get_store().get_job(job_id)
+        return job
+
+    def _get_store(self) -> DocumentStore:
+        return self.store if self.store is not None else get_document_store()
+
+    def _save(self, job: Dict[str, Any]):
+        """將工作狀態寫入共用儲存（寫入失敗只記錄警告，不影響工作執行）"""
+        try:
+            self._get_store().put_job(job)
+        except Exception as e:
+            logger.warning(f"OCR 工作狀態寫入失敗 (job_id: {job['job_id']}): {str(e)}")
+
+    async def _run_job(
+        self,
+        job: Dict[str, Any],
+        file_path: str,
+        file_type: str,
+        on_complete: Optional[Callable[[Dict[str, Any]], Awaitable[None]]],
+        file_sha256: Optional[str] = None
+    ):
+        """在並行數量限制內執行工作（快取命中時不佔用並行數量與 OCR 佇列）"""
+        executor = get_ocr_executor()
+        last_saved = 0.0
+
+        def update_progress(current_page: int, total_pages: int):
+            nonlocal last_saved
+            job["current_page"] = current_page
+            job["total_pages"] = total_pages
+            # 於工作執行緒中呼叫；限制寫入頻率，完成與失敗時另外寫入最終狀態
+            now = time.monotonic()
+            if now - last_saved >= PROGRESS_SAVE_INTERVAL:
+                last_saved = now
+                self._save(job)
+
+        # 行程池無法回傳進度回呼，僅在 thread 模式啟用
+        progress_callback = update_progress if executor.mode == "thread" else None
+
+        try:
+            # 重複上傳的檔案直接使用快取結果（讀取磁碟在執行緒中進行，不阻塞事件迴圈）
+            result = None
+            if file_sha256:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    None, lookup_cached_result, file_sha256, job["language"], update_progress
+                )
+                if result is not None:
+                    job["started_at"] = time.time()
+
+            if result is None:
+                result = await self._run_ocr(job, file_path, file_type, progress_callback, file_sha256)
+
+            job["raw_text"] = result["raw_text"]
+            job["layout_info"] = result["layout_info"]
+            job["page_errors"] = result["page_errors"]
+            job["cached"] = result["cached"]
+            job["total_pages"] = job["total_pages"] or len(result["layout_info"])
+            job["current_page"] = job["total_pages"]
+
+            if on_complete is not None:
+                await on_complete(job)
+
+            job["status"] = JOB_COMPLETED
+            logger.info(f"✓ OCR 工作完成 (job_id: {job['job_id']})")
+
+        except asyncio.CancelledError:
+            job["status"] = JOB_FAILED
+            job["error"] = "工作已取消"
+            raise
+        except Exception as e:
+            logger.error(f"OCR 工作失敗 (job_id: {job['job_id']}): {str(e)}")
+            job["status"] = JOB_FAILED
+            job["error"] = str(e)
+        finally:
+            job["finished_at"] = time.time()
+            self._tasks.pop(job["job_id"], None)
+            self._save(job)
+
+    async def _run_ocr(
+        self,
+        job: Dict[str, Any],
+        file_path: str,
+        file_type: str,
+        progress_callback: Optional[Callable[[int, int], None]],
+        file_sha256: Optional[str]
+    ) -> Dict[str, Any]:
+        """在並行數量限制內送入 OCR 執行器，佇列已滿時等待後重新排隊"""
+        executor = get_ocr_executor()
+        async with self._semaphore:
+            job["status"] = JOB_RUNNING
+            job["started_at"] = time.time()
+            self._save(job)
+
+            while True:
+                try:
+                    return await executor.run(
+                        run_ocr_file,
+                        file_path,
+                        file_type,
+                        job["language"],
+                        progress_callback,
+                        None,
+                        file_sha256,
+                        cache_checked=bool(file_sha256)
+                    )
+                except QueueFullError as e:
+                    # 背景工作不直接失敗，等待後重新排隊
+                    logger.info(f"OCR 工作佇列已滿，{e.retry_after} 秒後重試 (job_id: {job['job_id']})")
+                    await asyncio.sleep(e.retry_after)
+
+    def _evict_finished(self):
+        """淘汰超過保留上限的最舊已結束工作"""
+        if len(self._jobs) <= self.max_retained:
+            return
+
+        for job_id in list(self._jobs.keys()):
+            if len(self._jobs) <= self.max_retained:
+                break
+            if self._jobs[job_id]["status"] in (JOB_COMPLETED, JOB_FAILED):
+                del self._jobs[job_id]
+
+    def get_stats(self) -> dict:
+        """獲取工作統計資訊"""
+        counts = {JOB_QUEUED: 0, JOB_RUNNING: 0, JOB_COMPLETED: 0, JOB_FAILED: 0}
+        for job in self._jobs.values():
+            counts[job["status"]] += 1
+        return {
+            "max_concurrent": self.max_concurrent,
+            "retained": len(self._jobs),
+            **counts
+        }
+
+    async def shutdown(self):
+        """取消所有尚未完成的工作"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# 全域工作管理器實例
+_job_manager: Optional[OCRJobManager] = None
+
+
+def get_job_manager() -> OCRJobManager:
+    """
+    獲取或創建 OCR 工作管理器（單例模式）
+
+    Returns:
+        OCRJobManager 實例
+    """
+    global _job_manager
+
+    if _job_manager is None:
+        _job_manager = OCRJobManager(
+            max_concurrent=int(os.getenv("OCR_JOB_CONCURRENCY", "2")),
+            max_retained=int(os.getenv("OCR_JOB_MAX_RETAINED", "1000"))
+        )
+
+    return _job_manager
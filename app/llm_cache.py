@@ -0,0 +1,90 @@
+"""
+LLM response cache
+Persistent cache of Gemini responses with TTL and LRU size eviction, keyed by
+model, prompt, system instruction, chunk size and the normalised input text
+"""
+
+import hashlib
+import json
+import os
+import unicodedata
+from typing import Optional
+
+from .result_cache import OCRResultCache
+
+
+def normalize_text(text: str) -> str:
+    """正規化輸入文字（Unicode NFC、統一換行、去除行尾與首尾空白），避免無意義的差異造成快取未命中"""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def make_llm_cache_key(
+    model_name: str,
+    prompt: str,
+    system_instruction: Optional[str],
+    text: str,
+    chunk_chars: int = 0
+) -> str:
+    """
+    組合 LLM 回應的快取鍵
+
+    Args:
+        model_name: 模型名稱
+        prompt: 實際使用的提示詞（預設提示詞或自訂提示詞）
+        system_instruction: 系統指令
+        text: 要處理的文字
+        chunk_chars: 長文件分段的字元數上限（分段方式不同時回應也不同）
+
+    Returns:
+        固定長度的快取鍵
+    """
+    raw = json.dumps(
+        [
+            model_name,
+            normalize_text(prompt),
+            normalize_text(system_instruction or ""),
+            chunk_chars,
+            normalize_text(text)
+        ],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(OCRResultCache):
+    """LLM 回應磁碟快取（沿用 OCR 結果快取的儲存、LRU 淘汰與 TTL 過期）"""
+
+    label = "LLM 回應"
+
+    def get_response(self, key: str) -> Optional[str]:
+        """讀取快取的回應，未命中或已過期時為 None"""
+        entries = self._read(key, "hits", "misses")
+        return entries[0]["text"] if entries else None
+
+    def put_response(self, key: str, text: str):
+        """寫入回應"""
+        self._write(key, [{"text": text}], "stores")
+
+
+# 全域快取實例
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """
+    獲取或創建 LLM 回應快取（單例模式）
+
+    Returns:
+        LLMResponseCache 實例
+    """
+    global _llm_cache
+
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache(
+            cache_dir=os.getenv("LLM_CACHE_DIR", "./cache/llm"),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        )
+
+    return _llm_cache
@@ -3,33 +3,46 @@ FastAPI Main Application
 Provides all API endpoints
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import aiofiles
+import asyncio
+import hashlib
+import json
 import os
 import uuid
 import time
 import logging
 from pathlib import Path
-from PIL import Image
-import io
+from typing import List, Optional
 
 from . import __version__, __description__
 from .models import (
     UploadResponse, OCRRequest, OCRResponse,
+    BatchOCRRequest, BatchOCRFileResult, BatchOCRResponse,
+    OCRJobResponse, OCRJobStatusResponse,
     GeminiRequest, GeminiResponse,
     GenerateMarkdownRequest, GenerateMarkdownResponse,
-    StatusResponse, MetadataFields
+    StatusResponse
 )
-from .services_simple import SimpleOCRService
+from .ocr_pool import get_ocr_pool, get_preload_languages
+from .executor import get_ocr_executor, QueueFullError
+from .pipeline import run_ocr_file, run_ocr_batch, lookup_cached_result
+from .result_cache import get_result_cache
+from .parallel import get_page_parallelism, preload_parallel_processors, shutdown_parallel_processors
+from .jobs import get_job_manager, JOB_COMPLETED, JOB_FAILED
+from .document_store import get_document_store
+from .janitor import get_janitor
+from .health import get_health_checker
 from .gemini_service import get_gemini_service
+from .llm_cache import get_llm_cache
+from .upload_limit import UploadSizeLimitMiddleware, too_large_detail
 from .utils import (
-    convert_pdf_to_images,
-    validate_file_type,
-    clean_text,
-    reconstruct_layout_for_txt
+    sniff_file_type,
+    reconstruct_layout_for_txt,
+    simplify_layout_info
 )
 
 # Configure logging
@@ -55,11 +68,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def get_max_upload_size() -> int:
+    """單一上傳檔案的大小上限（位元組）"""
+    return int(os.getenv("MAX_UPLOAD_SIZE", 52428800))  # 50MB
+
+
+# 上傳大小限制：在接收 multipart 內容前依 Content-Length 拒絕過大的請求
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/api/upload": get_max_upload_size,
+        "/api/batch-ocr/upload": lambda: get_max_upload_size() * get_batch_max_files(),
+    },
+)
+
 # 設定目錄
 UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "./uploads"))
 TEMP_DIR = Path(os.getenv("TEMP_DIR", "./temp"))
 STATIC_DIR = Path("./static")
 
+# 上傳檔案分塊寫入磁碟的區塊大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 批次中延後送出的組遇到佇列已滿時的重試次數，仍失敗時該組檔案各自標示錯誤
+BATCH_RETRY_ATTEMPTS = 5
+
 UPLOAD_DIR.mkdir(exist_ok=True)
 TEMP_DIR.mkdir(exist_ok=True)
 
@@ -67,9 +100,6 @@ TEMP_DIR.mkdir(exist_ok=True)
 if STATIC_DIR.exists():
     app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
-# 儲存處理中的檔案資料
-file_data_store = {}
-
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -104,21 +134,114 @@ async def guide():
 @app.get("/api/status", response_model=StatusResponse)
 async def get_status():
     """獲取系統狀態"""
-    # 不觸發 OCR 服務初始化，只檢查是否可用
-    ocr_available = True  # 假設 OCR 可用，避免每次檢查都初始化
+    # 使用快取的就緒檢查結果，不觸發 OCR 服務初始化
+    ocr_available = get_health_checker().get_readiness()["checks"]["ocr_engines"]["ok"]
     
     try:
         gemini_service = get_gemini_service()
         gemini_available = gemini_service.is_available()
+        gemini_info = gemini_service.get_info()
     except:
         gemini_available = False
+        gemini_info = None
     
     return StatusResponse(
         status="running",
         message="系統運行中",
         version=__version__,
         ocr_available=ocr_available,
-        gemini_available=gemini_available
+        gemini_available=gemini_available,
+        ocr_pool=get_ocr_pool().get_stats(),
+        ocr_queue=get_ocr_executor().get_stats(),
+        ocr_jobs=get_job_manager().get_stats(),
+        ocr_cache=get_result_cache().get_stats(),
+        llm_cache=get_llm_cache().get_stats(),
+        documents=get_document_store().get_stats(),
+        janitor=get_janitor().get_stats(),
+        gemini=gemini_info
+    )
+
+
+async def save_upload(file: UploadFile) -> dict:
+    """
+    將上傳檔案分塊寫入磁碟並建立文件記錄
+
+    Returns:
+        文件記錄
+
+    Raises:
+        HTTPException: 檔案類型不支援 (400) 或檔案太大 (413)
+    """
+    # 檢查單一檔案大小（整個請求的上限已由 UploadSizeLimitMiddleware 在接收前檢查）
+    max_size = get_max_upload_size()
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=413, detail=too_large_detail(max_size))
+    
+    # 生成唯一 ID
+    file_id = str(uuid.uuid4())
+    
+    # 依第一個區塊的 magic bytes 判斷檔案類型
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    sniffed = sniff_file_type(chunk)
+    if sniffed is None:
+        logger.error(f"檔案類型驗證失敗: {file.filename}, {file.content_type}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支援的檔案類型: {file.content_type} (檔案: {file.filename})"
+        )
+    file_type, file_ext = sniffed
+    
+    # 分塊寫入磁碟並同時計算雜湊（大小未知時，超過上限即中止）
+    partial_path = UPLOAD_DIR / f"{file_id}.part"
+    saved_path = UPLOAD_DIR / f"{file_id}.{file_ext}"
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, 'wb') as f:
+            while chunk:
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=too_large_detail(max_size))
+                digest.update(chunk)
+                await f.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        os.replace(partial_path, saved_path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+    
+    # 儲存檔案資訊
+    record = get_document_store().create(
+        file_id,
+        filename=file.filename,
+        file_type=file_type,
+        file_path=str(saved_path),
+        upload_time=time.time(),
+        sha256=digest.hexdigest()
+    )
+    
+    logger.info(f"✓ 檔案上傳成功: {file.filename} (ID: {file_id})")
+    return record
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    存活檢查：只確認行程與事件迴圈仍在回應，不檢查任何依賴
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    就緒檢查：OCR 引擎已載入、工作佇列未滿且磁碟空間足夠時回應 200，否則回應 503
+    （檢查結果快取數秒，探測不會增加負載）
+    """
+    readiness = get_health_checker().get_readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content=readiness
     )
 
 
@@ -130,53 +253,13 @@ async def upload_file(file: UploadFile = File(...)):
     try:
         logger.info(f"收到上傳請求: {file.filename}, 類型: {file.content_type}")
         
-        # 驗證檔案類型
-        if not validate_file_type(file.filename, file.content_type):
-            logger.error(f"檔案類型驗證失敗: {file.filename}, {file.content_type}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"不支援的檔案類型: {file.content_type} (檔案: {file.filename})"
-            )
-        
-        # 生成唯一 ID
-        file_id = str(uuid.uuid4())
-        
-        # 讀取檔案內容
-        content = await file.read()
-        
-        # 檢查檔案大小
-        max_size = int(os.getenv("MAX_UPLOAD_SIZE", 52428800))  # 50MB
-        if len(content) > max_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"檔案太大（最大 {max_size / 1024 / 1024:.1f}MB）"
-            )
-        
-        # 保存檔案
-        file_ext = file.filename.rsplit('.', 1)[-1].lower()
-        saved_path = UPLOAD_DIR / f"{file_id}.{file_ext}"
-        
-        async with aiofiles.open(saved_path, 'wb') as f:
-            await f.write(content)
-        
-        # 儲存檔案資訊
-        file_data_store[file_id] = {
-            "filename": file.filename,
-            "file_type": file.content_type,
-            "file_path": str(saved_path),
-            "upload_time": time.time(),
-            "raw_text": None,
-            "layout_info": None,
-            "processed_text": None
-        }
-        
-        logger.info(f"✓ 檔案上傳成功: {file.filename} (ID: {file_id})")
+        record = await save_upload(file)
         
         return UploadResponse(
             success=True,
-            file_id=file_id,
+            file_id=record["file_id"],
             filename=file.filename,
-            file_type=file.content_type,
+            file_type=record["file_type"],
             message="檔案上傳成功"
         )
         
@@ -196,10 +279,9 @@ async def process_ocr(request: OCRRequest):
         file_id = request.file_id
         
         # 檢查檔案是否存在
-        if file_id not in file_data_store:
+        file_info = get_document_store().get(file_id)
+        if file_info is None:
             raise HTTPException(status_code=404, detail="檔案不存在")
-        
-        file_info = file_data_store[file_id]
         file_path = Path(file_info["file_path"])
         
         if not file_path.exists():
@@ -207,75 +289,56 @@ async def process_ocr(request: OCRRequest):
         
         start_time = time.time()
         
-        # 獲取 OCR 服務（使用 CPU 模式確保穩定性）
-        logger.info(f"正在獲取 OCR 服務: 語言={request.language}")
-        ocr_service = SimpleOCRService(lang=request.language, use_gpu=False)
-        logger.info("✓ OCR 服務已準備就緒")
-        
         # 記錄處理開始
         logger.info(f"開始處理檔案: {file_info['filename']} ({file_info['file_type']})")
         
-        # 讀取檔案
-        async with aiofiles.open(file_path, 'rb') as f:
-            file_content = await f.read()
-        
-        # 根據檔案類型處理
-        images = []
-        
-        if file_info["file_type"] == "application/pdf":
-            logger.info(f"處理 PDF 檔案: {file_info['filename']}")
-            images = convert_pdf_to_images(file_content)
-            logger.info(f"PDF 轉換完成，共 {len(images)} 頁")
-        else:
-            logger.info(f"處理圖像檔案: {file_info['filename']}")
-            image = Image.open(io.BytesIO(file_content)).convert('RGB')
-            images = [image]
-            logger.info("圖像載入完成")
-        
-        if not images:
-            raise HTTPException(status_code=500, detail="無法從檔案中提取圖像")
-        
-        logger.info(f"開始 OCR 辨識 ({len(images)} 張圖像)...")
+        # 重複上傳的檔案直接使用快取結果，不必進入 OCR 佇列（讀取磁碟在執行緒中進行，不阻塞事件迴圈）
+        result = None
+        if file_info.get("sha256"):
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, lookup_cached_result, file_info["sha256"], request.language
+            )
         
-        # 執行 OCR
+        # 在 OCR 執行器中處理，避免阻塞事件迴圈
         try:
-            logger.info("開始執行 OCR 辨識...")
-            raw_text, all_layouts = ocr_service.process_images(images)
-            logger.info(f"OCR 辨識完成，辨識出 {len(raw_text)} 個字元")
-        except Exception as e:
-            logger.error(f"OCR 處理過程中發生錯誤: {str(e)}")
-            import traceback
-            logger.error(f"詳細錯誤: {traceback.format_exc()}")
-            # 返回部分結果而不是完全失敗
-            raw_text = f"[OCR 處理失敗: {str(e)}]"
-            all_layouts = [[] for _ in images]
+            if result is None:
+                result = await get_ocr_executor().run(
+                    run_ocr_file,
+                    str(file_path),
+                    file_info["file_type"],
+                    request.language,
+                    None,
+                    None,
+                    file_info.get("sha256"),
+                    cache_checked=bool(file_info.get("sha256"))
+                )
+        except QueueFullError as e:
+            logger.warning(f"OCR 工作佇列已滿，拒絕請求 (file_id: {file_id})")
+            raise HTTPException(
+                status_code=503,
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
+            )
         
         processing_time = time.time() - start_time
         
         # 儲存結果
-        file_data_store[file_id]["raw_text"] = raw_text
-        file_data_store[file_id]["layout_info"] = all_layouts
+        get_document_store().update(
+            file_id,
+            raw_text=result["raw_text"],
+            layout_info=result["layout_info"]
+        )
         
         logger.info(f"✓ OCR 辨識完成，耗時 {processing_time:.2f} 秒")
         
-        # 將佈局資訊簡化（避免回應過大）
-        simplified_layout = []
-        for page_idx, page_layout in enumerate(all_layouts[:5]):  # 最多返回 5 頁
-            for item in page_layout[:10]:  # 每頁最多返回 10 條
-                simplified_layout.append({
-                    "page": page_idx,
-                    "text": item["text"],
-                    "confidence": item["confidence"],
-                    "bbox": item.get("bbox", []),
-                    "y_position": item.get("y_position", 0),
-                    "x_position": item.get("x_position", 0)
-                })
-        
         return OCRResponse(
             success=True,
             file_id=file_id,
-            raw_text=raw_text,
-            layout_info=simplified_layout,
+            raw_text=result["raw_text"],
+            # 將佈局資訊簡化（避免回應過大）
+            layout_info=simplify_layout_info(result["layout_info"]),
+            page_errors=result["page_errors"],
+            cached=result["cached"],
             message="OCR 辨識完成",
             processing_time=processing_time
         )
@@ -287,32 +350,471 @@ async def process_ocr(request: OCRRequest):
         raise HTTPException(status_code=500, detail=f"OCR 處理失敗: {str(e)}")
 
 
-@app.post("/api/enhance-with-gemini", response_model=GeminiResponse)
-async def enhance_with_gemini(request: GeminiRequest):
+def get_batch_max_files() -> int:
+    """單次批次 OCR 的檔案數量上限"""
+    return int(os.getenv("OCR_BATCH_MAX_FILES", "100"))
+
+
+async def run_batch_ocr(file_infos: List[Optional[dict]], language: str, start_time: float) -> BatchOCRResponse:
     """
-    使用 Gemini 處理文字
+    批次執行 OCR 並儲存結果
+
+    檔案平均分給執行器的各個工作，每組共用同一個引擎依序處理，
+    避免每個小檔案各自排隊與取出引擎的開銷。
+
+    Args:
+        file_infos: 文件記錄列表，無效的檔案為 None（結果中標示錯誤）
+        language: OCR 語言
+        start_time: 批次開始時間（包含上傳時間）
     """
+    results: List[Optional[dict]] = [None] * len(file_infos)
+    valid = [
+        idx for idx, info in enumerate(file_infos)
+        if info is not None and Path(info["file_path"]).exists()
+    ]
+    
+    executor = get_ocr_executor()
+    group_count = min(len(valid), executor.max_workers)
+    groups = [valid[i::group_count] for i in range(group_count)]
+    
+    def group_files(group: List[int]) -> List[dict]:
+        return [
+            {
+                "file_path": file_infos[idx]["file_path"],
+                "file_type": file_infos[idx]["file_type"],
+                "file_sha256": file_infos[idx].get("sha256")
+            }
+            for idx in group
+        ]
+    
+    # 准入檢查：第一組被拒絕時回應 503，之後被拒絕的組等前面的組完成後再送出
+    submitted, futures, deferred = [], [], []
+    for group in groups:
+        try:
+            futures.append(executor.submit(run_ocr_batch, group_files(group), language))
+            submitted.append(group)
+        except QueueFullError as e:
+            if not futures:
+                logger.warning(f"OCR 工作佇列已滿，拒絕批次請求 ({len(valid)} 個檔案)")
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(e),
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+            deferred.append(group)
+    
+    async def run_deferred(group: List[int]) -> List[dict]:
+        """延後送出的組：佇列已滿時依 Retry-After 退避重試"""
+        for attempt in range(1, BATCH_RETRY_ATTEMPTS + 1):
+            try:
+                return await executor.run(run_ocr_batch, group_files(group), language)
+            except QueueFullError as e:
+                if attempt == BATCH_RETRY_ATTEMPTS:
+                    raise
+                logger.info(f"OCR 工作佇列已滿，{e.retry_after} 秒後重試批次分組 ({len(group)} 個檔案)")
+                await asyncio.sleep(e.retry_after)
+    
+    # 單一分組失敗（佇列持續已滿、工作行程異常）只影響該組檔案，已完成的組照常回傳
+    group_results = list(await asyncio.gather(*futures, return_exceptions=True))
+    for group in deferred:
+        try:
+            group_results.append(await run_deferred(group))
+        except Exception as e:
+            group_results.append(e)
+        submitted.append(group)
+    
+    for group, outputs in zip(submitted, group_results):
+        if isinstance(outputs, BaseException):
+            logger.error(f"批次分組處理失敗 ({len(group)} 個檔案): {str(outputs)}")
+            error = str(outputs) if isinstance(outputs, QueueFullError) else f"OCR 處理失敗: {str(outputs)}"
+            outputs = [{"error": error, "processing_time": 0.0} for _ in group]
+        for idx, output in zip(group, outputs):
+            results[idx] = output
+    
+    file_results = []
+    total_pages = 0
+    for info, result in zip(file_infos, results):
+        if info is None or result is None:
+            file_results.append(BatchOCRFileResult(
+                file_id=info["file_id"] if info else None,
+                filename=info["filename"] if info else None,
+                success=False,
+                error="檔案不存在" if info is None else "檔案已被刪除"
+            ))
+            continue
+        
+        if "error" in result:
+            file_results.append(BatchOCRFileResult(
+                file_id=info["file_id"],
+                filename=info["filename"],
+                success=False,
+                error=result["error"],
+                processing_time=result["processing_time"]
+            ))
+            continue
+        
+        get_document_store().update(
+            info["file_id"],
+            raw_text=result["raw_text"],
+            layout_info=result["layout_info"]
+        )
+        total_pages += len(result["layout_info"])
+        file_results.append(BatchOCRFileResult(
+            file_id=info["file_id"],
+            filename=info["filename"],
+            success=True,
+            raw_text=result["raw_text"],
+            layout_info=simplify_layout_info(result["layout_info"]),
+            page_errors=result["page_errors"],
+            cached=result["cached"],
+            processing_time=result["processing_time"]
+        ))
+    
+    processing_time = time.time() - start_time
+    succeeded = sum(1 for result in file_results if result.success)
+    logger.info(
+        f"✓ 批次 OCR 完成：{succeeded}/{len(file_results)} 個檔案，{total_pages} 頁，"
+        f"耗時 {processing_time:.2f} 秒"
+    )
+    
+    return BatchOCRResponse(
+        success=succeeded == len(file_results),
+        results=file_results,
+        total_files=len(file_results),
+        succeeded=succeeded,
+        failed=len(file_results) - succeeded,
+        total_pages=total_pages,
+        processing_time=processing_time,
+        pages_per_second=total_pages / processing_time if processing_time > 0 else 0.0
+    )
+
+
+def check_batch_size(count: int):
+    """檢查批次檔案數量"""
+    max_files = get_batch_max_files()
+    if count > max_files:
+        raise HTTPException(status_code=400, detail=f"單次批次最多 {max_files} 個檔案")
+
+
+@app.post("/api/batch-ocr", response_model=BatchOCRResponse)
+async def batch_ocr(request: BatchOCRRequest):
+    """
+    批次辨識多個已上傳的檔案
+    """
+    check_batch_size(len(request.file_ids))
+    start_time = time.time()
+    
     try:
-        gemini_service = get_gemini_service()
+        file_infos = [get_document_store().get(file_id) for file_id in request.file_ids]
+        response = await run_batch_ocr(file_infos, request.language, start_time)
+        # 不存在的檔案保留請求中的 file_id
+        for file_id, result in zip(request.file_ids, response.results):
+            result.file_id = file_id
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批次 OCR 處理失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批次 OCR 處理失敗: {str(e)}")
+
+
+@app.post("/api/batch-ocr/upload", response_model=BatchOCRResponse)
+async def batch_ocr_upload(files: List[UploadFile] = File(...), language: str = Form("en")):
+    """
+    上傳並批次辨識多個檔案（單一檔案上傳失敗時只在該檔案的結果中標示錯誤）
+    """
+    check_batch_size(len(files))
+    start_time = time.time()
+    
+    try:
+        file_infos = []
+        upload_errors = {}
+        for idx, file in enumerate(files):
+            try:
+                file_infos.append(await save_upload(file))
+            except HTTPException as e:
+                file_infos.append(None)
+                upload_errors[idx] = e.detail
         
-        if not gemini_service.is_available():
+        response = await run_batch_ocr(file_infos, language, start_time)
+        for idx, error in upload_errors.items():
+            response.results[idx].filename = files[idx].filename
+            response.results[idx].error = error
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批次 OCR 處理失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批次 OCR 處理失敗: {str(e)}")
+
+
+def encode_event(event: dict) -> bytes:
+    """將串流事件編碼為一行 NDJSON"""
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/api/process-ocr/stream")
+async def process_ocr_stream(request: OCRRequest):
+    """
+    執行 OCR 辨識並以 NDJSON 逐頁串流結果
+    
+    每行一個 JSON 事件：
+    - {"type": "page", "page": 1, "total_pages": N, "text": ..., "layout": [...], "status": "ok"}
+    - {"type": "done", "file_id": ..., "raw_text": ..., "processing_time": ...}
+    - {"type": "error", "detail": ...}
+    """
+    file_id = request.file_id
+    
+    # 檢查檔案是否存在
+    file_info = get_document_store().get(file_id)
+    if file_info is None:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    file_path = Path(file_info["file_path"])
+    
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="檔案已被刪除")
+    
+    start_time = time.time()
+    loop = asyncio.get_running_loop()
+    page_queue: asyncio.Queue = asyncio.Queue()
+    executor = get_ocr_executor()
+    
+    def on_page(page: dict):
+        # 由工作執行緒呼叫，轉交給事件迴圈
+        loop.call_soon_threadsafe(page_queue.put_nowait, page)
+    
+    # 行程池無法即時回傳逐頁結果：僅在 thread 模式逐頁串流，
+    # process 模式由工作行程附上每頁的完整結果（包含文字），於完成後依序送出
+    streaming = executor.mode == "thread"
+    
+    # 重複上傳的檔案直接重播快取結果，不必進入 OCR 佇列（讀取磁碟在執行緒中進行，不阻塞事件迴圈）
+    cached, cached_pages = None, []
+    if file_info.get("sha256"):
+        cached = await loop.run_in_executor(
+            None, lookup_cached_result, file_info["sha256"], request.language, None, cached_pages.append
+        )
+    
+    # 准入檢查須在開始串流前完成，才能回應 503
+    ocr_future = None
+    if cached is None:
+        try:
+            ocr_future = executor.submit(
+                run_ocr_file,
+                str(file_path),
+                file_info["file_type"],
+                request.language,
+                None,
+                on_page if streaming else None,
+                file_info.get("sha256"),
+                return_pages=not streaming,
+                cache_checked=bool(file_info.get("sha256"))
+            )
+        except QueueFullError as e:
+            logger.warning(f"OCR 工作佇列已滿，拒絕請求 (file_id: {file_id})")
             raise HTTPException(
                 status_code=503,
-                detail="Gemini API 不可用，請檢查 API Key 設定"
+                detail=str(e),
+                headers={"Retry-After": str(e.retry_after)}
             )
         
+        ocr_future.add_done_callback(lambda _: page_queue.put_nowait(None))
+    
+    async def event_stream():
+        logger.info(f"開始串流 OCR 結果: {file_info['filename']}")
+        
+        if ocr_future is None:
+            result = cached
+            for page in cached_pages:
+                yield encode_event({"type": "page", **page})
+        else:
+            while True:
+                page = await page_queue.get()
+                if page is None:
+                    break
+                yield encode_event({"type": "page", **page})
+            
+            try:
+                result = ocr_future.result()
+            except Exception as e:
+                logger.error(f"OCR 串流處理失敗: {str(e)}")
+                yield encode_event({"type": "error", "detail": f"OCR 處理失敗: {str(e)}"})
+                return
+            
+            if not streaming:
+                for page in result["pages"]:
+                    yield encode_event({"type": "page", **page})
+        
+        processing_time = time.time() - start_time
+        
+        # 儲存結果
+        get_document_store().update(
+            file_id,
+            raw_text=result["raw_text"],
+            layout_info=result["layout_info"]
+        )
+        
+        logger.info(f"✓ OCR 串流完成，耗時 {processing_time:.2f} 秒")
+        
+        yield encode_event({
+            "type": "done",
+            "file_id": file_id,
+            "raw_text": result["raw_text"],
+            "page_errors": result["page_errors"],
+            "cached": result["cached"],
+            "processing_time": processing_time
+        })
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/api/jobs", response_model=OCRJobResponse)
+async def create_ocr_job(request: OCRRequest):
+    """
+    建立 OCR 背景工作（立即返回 job_id）
+    """
+    try:
+        file_id = request.file_id
+        
+        # 檢查檔案是否存在
+        file_info = get_document_store().get(file_id)
+        if file_info is None:
+            raise HTTPException(status_code=404, detail="檔案不存在")
+        file_path = Path(file_info["file_path"])
+        
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="檔案已被刪除")
+        
+        async def store_result(job: dict):
+            # 工作完成後寫回檔案資料，供 generate-markdown 使用
+            get_document_store().update(
+                file_id,
+                raw_text=job["raw_text"],
+                layout_info=job["layout_info"]
+            )
+        
+        job = get_job_manager().create_job(
+            file_id=file_id,
+            file_path=str(file_path),
+            file_type=file_info["file_type"],
+            language=request.language,
+            on_complete=store_result,
+            file_sha256=file_info.get("sha256")
+        )
+        
+        return OCRJobResponse(
+            success=True,
+            job_id=job["job_id"],
+            file_id=file_id,
+            status=job["status"],
+            message="OCR 工作已建立"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"建立 OCR 工作失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"建立 OCR 工作失敗: {str(e)}")
+
+
+@app.get("/api/jobs/{job_id}", response_model=OCRJobStatusResponse)
+async def get_ocr_job(job_id: str):
+    """
+    查詢 OCR 背景工作進度
+    """
+    job = get_job_manager().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    
+    return OCRJobStatusResponse(**{
+        key: job[key] for key in OCRJobStatusResponse.model_fields
+    })
+
+
+@app.get("/api/jobs/{job_id}/result", response_model=OCRResponse)
+async def get_ocr_job_result(job_id: str):
+    """
+    獲取 OCR 背景工作結果
+    """
+    job = get_job_manager().get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在")
+    
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"OCR 處理失敗: {job['error']}")
+    
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"工作尚未完成 (狀態: {job['status']})")
+    
+    return OCRResponse(
+        success=True,
+        file_id=job["file_id"],
+        raw_text=job["raw_text"],
+        layout_info=simplify_layout_info(job["layout_info"]),
+        page_errors=job["page_errors"],
+        cached=job["cached"],
+        message="OCR 辨識完成",
+        processing_time=job["finished_at"] - job["started_at"]
+    )
+
+
+def get_available_gemini_service(request: GeminiRequest):
+    """取得可用的 Gemini 服務，並確認要儲存結果的文件存在"""
+    gemini_service = get_gemini_service()
+    
+    if not gemini_service.is_available():
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini API 不可用，請檢查 API Key 設定"
+        )
+    
+    if request.file_id and get_document_store().get(request.file_id) is None:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    
+    return gemini_service
+
+
+def store_processed_text(request: GeminiRequest, processed_text: str):
+    """儲存 Gemini 處理結果（供生成 Markdown 使用）"""
+    if request.file_id:
+        get_document_store().update(request.file_id, processed_text=processed_text)
+
+
+@app.post("/api/enhance-with-gemini", response_model=GeminiResponse)
+async def enhance_with_gemini(request: GeminiRequest):
+    """
+    使用 Gemini 處理文字
+    """
+    try:
+        gemini_service = get_available_gemini_service(request)
+        
         start_time = time.time()
         
         logger.info(f"使用 Gemini 處理文字 (類型: {request.prompt_type})...")
         
-        # 處理文字
-        processed_text = gemini_service.process_text(
-            text=request.text,
-            prompt_type=request.prompt_type,
-            custom_prompt=request.custom_prompt,
-            system_instruction=request.system_instruction
+        # 相同內容與提示詞的結果直接使用快取，不必再次呼叫 Gemini
+        cache_key = gemini_service.response_cache_key(
+            request.text,
+            request.prompt_type,
+            request.custom_prompt,
+            request.system_instruction
         )
+        # 快取讀寫磁碟，在執行緒中進行，不阻塞事件迴圈
+        loop = asyncio.get_running_loop()
+        processed_text = None
+        if not request.bypass_cache:
+            processed_text = await loop.run_in_executor(None, get_llm_cache().get_response, cache_key)
+        cached = processed_text is not None
         
+        if not cached:
+            processed_text = await gemini_service.process_text_async(
+                text=request.text,
+                prompt_type=request.prompt_type,
+                custom_prompt=request.custom_prompt,
+                system_instruction=request.system_instruction
+            )
+            await loop.run_in_executor(None, get_llm_cache().put_response, cache_key, processed_text)
+        
+        store_processed_text(request, processed_text)
         processing_time = time.time() - start_time
         
         logger.info(f"✓ Gemini 處理完成，耗時 {processing_time:.2f} 秒")
@@ -322,7 +824,8 @@ async def enhance_with_gemini(request: GeminiRequest):
             processed_text=processed_text,
             message="Gemini 處理完成",
             model_used=gemini_service.model_name,
-            processing_time=processing_time
+            processing_time=processing_time,
+            cached=cached
         )
         
     except HTTPException:
@@ -332,6 +835,71 @@ async def enhance_with_gemini(request: GeminiRequest):
         raise HTTPException(status_code=500, detail=f"Gemini 處理失敗: {str(e)}")
 
 
+@app.post("/api/enhance-with-gemini/stream")
+async def enhance_with_gemini_stream(request: GeminiRequest):
+    """
+    使用 Gemini 處理文字並以 NDJSON 串流生成的文字
+    
+    每行一個 JSON 事件：
+    - {"type": "delta", "text": ...}（新生成的文字片段）
+    - {"type": "done", "processed_text": ..., "model_used": ..., "cached": ..., "processing_time": ...}
+    - {"type": "error", "detail": ...}
+    """
+    gemini_service = get_available_gemini_service(request)
+    start_time = time.time()
+    
+    cache_key = gemini_service.response_cache_key(
+        request.text,
+        request.prompt_type,
+        request.custom_prompt,
+        request.system_instruction
+    )
+    # 快取讀寫磁碟，在執行緒中進行，不阻塞事件迴圈
+    loop = asyncio.get_running_loop()
+    cached_text = None
+    if not request.bypass_cache:
+        cached_text = await loop.run_in_executor(None, get_llm_cache().get_response, cache_key)
+    
+    async def event_stream():
+        logger.info(f"使用 Gemini 串流處理文字 (類型: {request.prompt_type})...")
+        
+        if cached_text is not None:
+            processed_text = cached_text
+            yield encode_event({"type": "delta", "text": cached_text})
+        else:
+            pieces = []
+            try:
+                async for piece in gemini_service.process_text_stream(
+                    text=request.text,
+                    prompt_type=request.prompt_type,
+                    custom_prompt=request.custom_prompt,
+                    system_instruction=request.system_instruction
+                ):
+                    pieces.append(piece)
+                    yield encode_event({"type": "delta", "text": piece})
+            except Exception as e:
+                logger.error(f"Gemini 串流處理失敗: {str(e)}")
+                yield encode_event({"type": "error", "detail": f"Gemini 處理失敗: {str(e)}"})
+                return
+            processed_text = "".join(pieces)
+            await loop.run_in_executor(None, get_llm_cache().put_response, cache_key, processed_text)
+        
+        store_processed_text(request, processed_text)
+        processing_time = time.time() - start_time
+        
+        logger.info(f"✓ Gemini 串流處理完成，耗時 {processing_time:.2f} 秒")
+        
+        yield encode_event({
+            "type": "done",
+            "processed_text": processed_text,
+            "model_used": gemini_service.model_name,
+            "cached": cached_text is not None,
+            "processing_time": processing_time
+        })
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
 @app.post("/api/generate-markdown", response_model=GenerateMarkdownResponse)
 async def generate_markdown(request: GenerateMarkdownRequest):
     """
@@ -341,10 +909,16 @@ async def generate_markdown(request: GenerateMarkdownRequest):
         file_id = request.file_id
         
         # 檢查檔案是否存在
-        if file_id not in file_data_store:
+        file_info = get_document_store().get(file_id)
+        if file_info is None:
             raise HTTPException(status_code=404, detail="檔案不存在")
         
-        file_info = file_data_store[file_id]
+        # 未提供內容時，使用已儲存的 Gemini 處理結果或 OCR 文字
+        content = request.content
+        if content is None:
+            content = file_info.get("processed_text") or file_info.get("raw_text")
+        if content is None:
+            raise HTTPException(status_code=400, detail="尚無可用的內容，請先執行 OCR 或 Gemini 處理")
         
         # 構建 Markdown 內容
         markdown_lines = []
@@ -355,7 +929,7 @@ async def generate_markdown(request: GenerateMarkdownRequest):
             markdown_lines.append(frontmatter)
         
         # 添加主要內容
-        markdown_lines.append(request.content)
+        markdown_lines.append(content)
         
         markdown_content = "\n".join(markdown_lines)
         
@@ -370,11 +944,14 @@ async def generate_markdown(request: GenerateMarkdownRequest):
             txt_content = reconstruct_layout_for_txt(all_layout)
         else:
             # 如果沒有佈局資訊，使用原始文字
-            txt_content = file_info.get("raw_text", request.content)
+            txt_content = file_info.get("raw_text", content)
         
         # 保存生成的內容
-        file_data_store[file_id]["markdown_content"] = markdown_content
-        file_data_store[file_id]["txt_content"] = txt_content
+        get_document_store().update(
+            file_id,
+            markdown_content=markdown_content,
+            txt_content=txt_content
+        )
         
         logger.info(f"✓ Markdown 生成完成 (file_id: {file_id})")
         
@@ -399,11 +976,10 @@ async def download_file(file_id: str, format: str, filename: str = None):
     """
     try:
         # 檢查檔案是否存在
-        if file_id not in file_data_store:
+        file_info = get_document_store().get(file_id)
+        if file_info is None:
             raise HTTPException(status_code=404, detail="檔案不存在")
         
-        file_info = file_data_store[file_id]
-        
         # 檢查格式
         if format not in ["md", "txt"]:
             raise HTTPException(status_code=400, detail="不支援的格式")
@@ -453,11 +1029,10 @@ async def cleanup_file(file_id: str):
     清理檔案（刪除上傳的檔案和臨時檔案）
     """
     try:
-        if file_id not in file_data_store:
+        file_info = get_document_store().get(file_id)
+        if file_info is None:
             raise HTTPException(status_code=404, detail="檔案不存在")
         
-        file_info = file_data_store[file_id]
-        
         # 刪除上傳的檔案
         file_path = Path(file_info["file_path"])
         if file_path.exists():
@@ -469,8 +1044,8 @@ async def cleanup_file(file_id: str):
             if temp_file.exists():
                 temp_file.unlink()
         
-        # 從記憶體中刪除
-        del file_data_store[file_id]
+        # 從文件儲存中刪除
+        get_document_store().delete(file_id)
         
         logger.info(f"✓ 檔案清理完成 (file_id: {file_id})")
         
@@ -483,6 +1058,11 @@ async def cleanup_file(file_id: str):
         raise HTTPException(status_code=500, detail=f"清理失敗: {str(e)}")
 
 
+# 啟動時的引擎預先載入工作
+_preload_future: Optional[asyncio.Future] = None
+_parallel_preload_future: Optional[asyncio.Future] = None
+
+
 # 應用啟動時的初始化
 @app.on_event("startup")
 async def startup_event():
@@ -492,20 +1072,23 @@ async def startup_event():
     logger.info(f"版本: {__version__}")
     logger.info("=" * 60)
     
-    # 初始化 OCR 服務
-    try:
-        default_lang = os.getenv("DEFAULT_OCR_LANGUAGE", "en")
-        logger.info("正在初始化 OCR 服務...")
-        ocr_service = SimpleOCRService(lang=default_lang, use_gpu=False)
-        # 強制觸發 OCR 引擎初始化
-        logger.info("正在觸發 OCR 引擎初始化...")
-        ocr_service._initialize_engine()
-        logger.info(f"✓ OCR 服務已初始化 (語言: {default_lang}, CPU 模式)")
-    except Exception as e:
-        logger.error(f"✗ OCR 服務初始化失敗: {str(e)}")
-        logger.error(f"錯誤詳情: {str(e)}")
-        import traceback
-        logger.error(f"詳細錯誤: {traceback.format_exc()}")
+    # 在背景平行預熱所有設定的語言，載入完成前 /readyz 回應 503
+    global _preload_future, _parallel_preload_future
+    preload_languages = get_preload_languages()
+    logger.info(f"正在預先載入 OCR 引擎 (語言: {', '.join(preload_languages)})...")
+    loop = asyncio.get_running_loop()
+    executor = get_ocr_executor()
+    if executor.mode == "process":
+        # OCR 在工作行程中執行，由各工作行程初始化時載入引擎
+        _preload_future = loop.run_in_executor(None, executor.warm_up)
+    else:
+        _preload_future = loop.run_in_executor(None, get_ocr_pool().preload, preload_languages)
+    
+    # 多頁平行處理的行程池也預先啟動，第一份多頁文件不必等待工作行程載入模型
+    if get_page_parallelism() > 1:
+        _parallel_preload_future = loop.run_in_executor(
+            None, preload_parallel_processors, preload_languages
+        )
     
     # 初始化 Gemini 服務
     try:
@@ -517,6 +1100,9 @@ async def startup_event():
     except Exception as e:
         logger.warning(f"⚠ Gemini 服務初始化警告: {str(e)}")
     
+    # 啟動背景清理（過期記錄、舊檔案與磁碟預算）
+    get_janitor().start()
+    
     logger.info("=" * 60)
     logger.info("✓ 應用啟動完成")
     logger.info("=" * 60)
@@ -527,6 +1113,14 @@ async def shutdown_event():
     """應用關閉事件"""
     logger.info("應用正在關閉...")
     
+    # 取消背景工作並關閉 OCR 執行器
+    await get_janitor().stop()
+    await get_job_manager().shutdown()
+    get_ocr_executor().shutdown()
+    shutdown_parallel_processors()
+    await get_gemini_service().close()
+    get_document_store().close()
+    
     # 清理臨時檔案
     try:
         for file_path in TEMP_DIR.glob("*"):
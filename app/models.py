@@ -88,10 +88,68 @@ class OCRResponse(BaseModel):
         default=[],
         description="文字位置資訊，用於重建佈局"
     )
+    page_errors: Optional[List[Dict[str, Any]]] = Field(
+        default=[],
+        description="逾時或失敗的頁面：page, status (timeout / error), error, timeout {scope, limit_seconds}"
+    )
+    cached: bool = Field(default=False, description="結果是否來自 OCR 結果快取")
     message: str
     processing_time: Optional[float] = None
 
 
+class BatchOCRRequest(BaseModel):
+    """批次 OCR 辨識請求（已上傳的檔案）"""
+    file_ids: List[str] = Field(..., min_length=1, description="要辨識的檔案 ID 列表")
+    language: str = Field(default="en", description="OCR 語言：en, ch_tra, ch_sim 等")
+
+
+class BatchOCRFileResult(BaseModel):
+    """批次 OCR 中單一檔案的結果"""
+    file_id: Optional[str] = None
+    filename: Optional[str] = None
+    success: bool
+    raw_text: str = ""
+    layout_info: Optional[List[Dict[str, Any]]] = Field(default=[], description="文字位置資訊")
+    page_errors: Optional[List[Dict[str, Any]]] = Field(default=[], description="逾時或失敗的頁面")
+    cached: bool = False
+    error: Optional[str] = None
+    processing_time: Optional[float] = None
+
+
+class BatchOCRResponse(BaseModel):
+    """批次 OCR 辨識回應"""
+    success: bool
+    results: List[BatchOCRFileResult]
+    total_files: int
+    succeeded: int
+    failed: int
+    total_pages: int = Field(default=0, description="所有檔案的總頁數")
+    processing_time: float = Field(..., description="整批處理耗時（秒）")
+    pages_per_second: float = Field(default=0.0, description="整批處理的每秒頁數")
+
+
+class OCRJobResponse(BaseModel):
+    """OCR 背景工作建立回應"""
+    success: bool
+    job_id: str
+    file_id: str
+    status: str
+    message: str
+
+
+class OCRJobStatusResponse(BaseModel):
+    """OCR 背景工作狀態"""
+    job_id: str
+    file_id: str
+    status: str = Field(..., description="工作狀態：queued, running, completed, failed")
+    current_page: int = Field(default=0, description="已完成頁數")
+    total_pages: int = Field(default=0, description="總頁數（開始處理後才會得知）")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+
 class GeminiRequest(BaseModel):
     """Gemini 處理請求"""
     text: str = Field(..., description="要處理的文字")
@@ -101,6 +159,8 @@ class GeminiRequest(BaseModel):
     )
     custom_prompt: Optional[str] = Field(None, description="自訂提示詞")
     system_instruction: Optional[str] = Field(None, description="系統指令")
+    bypass_cache: bool = Field(default=False, description="略過回應快取，重新呼叫 Gemini（新結果仍會寫入快取）")
+    file_id: Optional[str] = Field(None, description="文件 ID（提供時儲存處理結果，供生成 Markdown 使用）")
 
 
 class GeminiResponse(BaseModel):
@@ -112,12 +172,13 @@ class GeminiResponse(BaseModel):
     message: str
     model_used: Optional[str] = None
     processing_time: Optional[float] = None
+    cached: bool = Field(default=False, description="結果是否來自回應快取")
 
 
 class GenerateMarkdownRequest(BaseModel):
     """生成 Markdown 請求"""
     file_id: str
-    content: str = Field(..., description="主要內容")
+    content: Optional[str] = Field(None, description="主要內容（未提供時使用已儲存的 Gemini 處理結果或 OCR 文字）")
     include_metadata: bool = Field(default=False, description="是否包含 Metadata")
     metadata: Optional[MetadataFields] = None
 
@@ -144,4 +205,12 @@ class StatusResponse(BaseModel):
     version: str
     ocr_available: bool
     gemini_available: bool
+    ocr_pool: Optional[Dict[str, Any]] = Field(None, description="OCR 引擎池統計")
+    ocr_queue: Optional[Dict[str, Any]] = Field(None, description="OCR 工作佇列統計（佇列深度、等待時間）")
+    ocr_jobs: Optional[Dict[str, Any]] = Field(None, description="OCR 背景工作統計")
+    ocr_cache: Optional[Dict[str, Any]] = Field(None, description="OCR 結果快取統計（命中 / 未命中次數）")
+    llm_cache: Optional[Dict[str, Any]] = Field(None, description="Gemini 回應快取統計（命中 / 未命中次數）")
+    documents: Optional[Dict[str, Any]] = Field(None, description="文件儲存統計")
+    janitor: Optional[Dict[str, Any]] = Field(None, description="背景清理統計（淘汰檔案數、釋放空間）")
+    gemini: Optional[Dict[str, Any]] = Field(None, description="Gemini 服務資訊（模型、逾時與分段設定）")
 
@@ -0,0 +1,237 @@
+"""
+OCR engine pool
+Shares initialized PaddleOCR engines across requests, keyed by mapped language
+"""
+
+import threading
+import time
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .services_simple import SimpleOCRService, map_language
+
+logger = logging.getLogger(__name__)
+
+
+class OCREnginePool:
+    """OCR 引擎池（每個語言最多保留 size_per_language 個已初始化的引擎）"""
+
+    def __init__(self, size_per_language: int = 1, use_gpu: bool = False):
+        """
+        初始化引擎池
+
+        Args:
+            size_per_language: 每個語言的引擎實例上限
+            use_gpu: 是否使用 GPU（目前固定使用 CPU）
+        """
+        self.size_per_language = max(1, size_per_language)
+        self.use_gpu = use_gpu
+
+        self._condition = threading.Condition()
+        self._idle: Dict[str, List[SimpleOCRService]] = {}
+        self._created: Dict[str, int] = {}
+        self._in_use: Dict[str, int] = {}
+        # 預先載入狀態：語言 -> loading / ready / failed
+        self._preload: Dict[str, str] = {}
+        self._preload_errors: Dict[str, str] = {}
+
+        self._stats = {
+            "checkouts": 0,
+            "engines_created": 0,
+            "init_failures": 0,
+            "waits": 0,
+            "total_wait_time": 0.0
+        }
+
+    def checkout(self, lang: str, timeout: Optional[float] = None) -> SimpleOCRService:
+        """
+        取出一個已初始化的 OCR 引擎（必要時建立新引擎或等待歸還）
+
+        Args:
+            lang: 語言代碼（ch_tra / ch_sim 共用 ch 引擎）
+            timeout: 等待可用引擎的最長秒數，None 表示無限等待
+
+        Returns:
+            SimpleOCRService 實例，使用完畢後必須呼叫 checkin()
+        """
+        key = map_language(lang)
+        start_time = time.monotonic()
+        waited = False
+
+        with self._condition:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    service = idle.pop()
+                    self._mark_checked_out(key, start_time, waited)
+                    return service
+
+                if self._created.get(key, 0) < self.size_per_language:
+                    # 先佔用名額，在鎖外初始化引擎
+                    self._created[key] = self._created.get(key, 0) + 1
+                    break
+
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.monotonic() - start_time)
+                    if remaining <= 0:
+                        raise TimeoutError(f"等待 OCR 引擎逾時 (語言: {key})")
+                waited = True
+                self._condition.wait(remaining)
+
+        try:
+            service = SimpleOCRService(lang=lang, use_gpu=self.use_gpu)
+            service._initialize_engine()
+        except Exception:
+            with self._condition:
+                self._created[key] -= 1
+                self._stats["init_failures"] += 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._stats["engines_created"] += 1
+            self._mark_checked_out(key, start_time, waited)
+            created = self._created[key]
+
+        logger.info(f"✓ 新增 OCR 引擎至引擎池 (語言: {key}, 數量: {created}/{self.size_per_language})")
+        return service
+
+    def checkin(self, service: SimpleOCRService):
+        """
+        歸還 OCR 引擎
+
+        Args:
+            service: 由 checkout() 取得的服務實例
+        """
+        key = service.lang
+        with self._condition:
+            self._in_use[key] = max(0, self._in_use.get(key, 0) - 1)
+            self._idle.setdefault(key, []).append(service)
+            self._condition.notify()
+
+    @contextmanager
+    def engine(self, lang: str, timeout: Optional[float] = None):
+        """以 with 語法取出並自動歸還 OCR 引擎"""
+        service = self.checkout(lang, timeout=timeout)
+        try:
+            yield service
+        finally:
+            self.checkin(service)
+
+    def warm_up(self, lang: str):
+        """預先建立並初始化指定語言的引擎"""
+        with self.engine(lang):
+            pass
+
+    def preload(self, languages: List[str]) -> Dict[str, str]:
+        """
+        平行預先載入多個語言的引擎（ch_tra / ch_sim 只載入一次 ch）
+
+        Args:
+            languages: 語言代碼列表
+
+        Returns:
+            各語言的載入狀態（ready / failed）
+        """
+        keys = list(dict.fromkeys(map_language(lang) for lang in languages))
+        if not keys:
+            return {}
+
+        with self._condition:
+            for key in keys:
+                self._preload[key] = "loading"
+                self._preload_errors.pop(key, None)
+
+        def load(key: str):
+            start_time = time.monotonic()
+            try:
+                self.warm_up(key)
+            except Exception as e:
+                logger.error(f"✗ OCR 引擎預先載入失敗 (語言: {key}): {str(e)}")
+                with self._condition:
+                    self._preload[key] = "failed"
+                    self._preload_errors[key] = str(e)
+                return
+            with self._condition:
+                self._preload[key] = "ready"
+            logger.info(f"✓ OCR 引擎預先載入完成 (語言: {key}, 耗時 {time.monotonic() - start_time:.1f} 秒)")
+
+        with ThreadPoolExecutor(max_workers=len(keys), thread_name_prefix="ocr-preload") as executor:
+            list(executor.map(load, keys))
+
+        return self.get_preload_status()["languages"]
+
+    def get_preload_status(self) -> dict:
+        """
+        預先載入狀態
+
+        Returns:
+            {"ready": 所有預先載入的語言皆已就緒, "languages": {語言: 狀態}, "errors": {語言: 錯誤訊息}}
+        """
+        with self._condition:
+            languages = dict(self._preload)
+            errors = dict(self._preload_errors)
+        return {
+            "ready": bool(languages) and all(state == "ready" for state in languages.values()),
+            "languages": languages,
+            "errors": errors
+        }
+
+    def get_stats(self) -> dict:
+        """獲取引擎池統計資訊"""
+        with self._condition:
+            languages = {
+                key: {
+                    "created": created,
+                    "idle": len(self._idle.get(key, [])),
+                    "in_use": self._in_use.get(key, 0)
+                }
+                for key, created in self._created.items()
+            }
+            stats = dict(self._stats)
+
+        stats["size_per_language"] = self.size_per_language
+        stats["preload"] = self.get_preload_status()
+        stats["languages"] = languages
+        stats["avg_wait_time"] = (
+            stats["total_wait_time"] / stats["waits"] if stats["waits"] else 0.0
+        )
+        return stats
+
+    def _mark_checked_out(self, key: str, start_time: float, waited: bool):
+        """更新取出統計（呼叫端須持有鎖）"""
+        self._in_use[key] = self._in_use.get(key, 0) + 1
+        self._stats["checkouts"] += 1
+        if waited:
+            self._stats["waits"] += 1
+            self._stats["total_wait_time"] += time.monotonic() - start_time
+
+
+# 全域引擎池實例
+_ocr_pool: Optional[OCREnginePool] = None
+
+
+def get_ocr_pool() -> OCREnginePool:
+    """
+    獲取或創建 OCR 引擎池（單例模式）
+
+    Returns:
+        OCREnginePool 實例
+    """
+    global _ocr_pool
+
+    if _ocr_pool is None:
+        size = int(os.getenv("OCR_POOL_SIZE", "1"))
+        _ocr_pool = OCREnginePool(size_per_language=size, use_gpu=False)
+
+    return _ocr_pool
+
+
+def get_preload_languages() -> List[str]:
+    """啟動時預先載入的語言（PRELOAD_LANGUAGES，以逗號分隔，預設為 DEFAULT_OCR_LANGUAGE）"""
+    value = os.getenv("PRELOAD_LANGUAGES") or os.getenv("DEFAULT_OCR_LANGUAGE", "en")
+    return [lang.strip() for lang in value.split(",") if lang.strip()]
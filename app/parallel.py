@@ -0,0 +1,456 @@
+"""
+Page-parallel OCR
+Spreads the pages of one document across a process pool; every worker process
+holds its own preloaded PaddleOCR engine
+"""
+
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .deadline import Deadline
+from .result_cache import OCRResultCache, make_page_cache_key
+from .utils import PageImage, TextLayerPage, get_page_source
+from .services_simple import (
+    SimpleOCRService, MAX_OCR_PAGES, DEFAULT_PAGE_TIMEOUT, collect_pages, map_language
+)
+
+logger = logging.getLogger(__name__)
+
+# 工作行程內的 OCR 服務（每個行程各自持有一個引擎）
+_worker_service: Optional[SimpleOCRService] = None
+
+
+def _init_worker(lang: str):
+    """工作行程初始化：預先載入並預熱 OCR 引擎"""
+    global _worker_service
+    _worker_service = SimpleOCRService(lang=lang, use_gpu=False)
+    _worker_service._initialize_engine()
+
+
+def _ocr_page_in_worker(image: PageImage) -> Tuple[str, List[dict]]:
+    """在工作行程中辨識單頁"""
+    return _worker_service.process_image(image)
+
+
+def _worker_ready() -> int:
+    """預熱用：工作行程初始化（載入引擎）完成後回報行程 ID"""
+    time.sleep(0.05)  # 讓其他仍在初始化的工作行程也能取得預熱工作
+    return os.getpid()
+
+
+def _succeeded(future: Future) -> bool:
+    """future 是否已成功完成"""
+    return future.done() and not future.cancelled() and future.exception() is None
+
+
+class ParallelPageProcessor:
+    """以行程池平行處理單份文件的多個頁面"""
+
+    def __init__(
+        self,
+        lang: str,
+        workers: int = 2,
+        page_timeout: float = DEFAULT_PAGE_TIMEOUT,
+        initializer: Callable = _init_worker,
+        page_fn: Callable = _ocr_page_in_worker
+    ):
+        """
+        初始化平行處理器
+
+        Args:
+            lang: 語言代碼
+            workers: 工作行程數量（每個行程各載入一個引擎）
+            page_timeout: 等待單頁結果的最長秒數
+            initializer: 工作行程初始化函數，以 lang 為參數
+            page_fn: 在工作行程中處理單頁的函數
+        """
+        self.lang = map_language(lang)
+        self.workers = max(1, workers)
+        self.page_timeout = page_timeout
+        self.initializer = initializer
+        self.page_fn = page_fn
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # 同一時間只有一份文件使用行程池，逾時重建行程池只會影響該文件本身
+        self._run_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """
+        延遲建立行程池
+
+        使用 spawn 啟動工作行程：服務行程中已有預先載入的 Paddle 引擎與多個背景執行緒
+        （OCR 工作池、背景清理等），fork 會複製這些狀態與可能被持有的鎖。
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer,
+                    initargs=(self.lang,)
+                )
+                logger.info(f"✓ 平行 OCR 行程池已建立 (語言: {self.lang}, 行程數: {self.workers})")
+            return self._executor
+
+    def _restart(self):
+        """終止卡住或崩潰的工作行程並重建行程池"""
+        with self._executor_lock:
+            executor = self._executor
+            self._executor = None
+        if executor is None:
+            return
+
+        # ProcessPoolExecutor 沒有公開的終止介面，直接結束底層行程
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        logger.warning(f"平行 OCR 行程池已重建 (語言: {self.lang})")
+
+    def warm_up(self):
+        """
+        預先啟動所有工作行程，並等待每個行程載入引擎（第一份多頁文件不必等待模型載入）
+
+        Raises:
+            BrokenProcessPool: 工作行程初始化失敗（行程池會重建，之後的文件重新嘗試）
+        """
+        executor = self._get_executor()
+        pids = set()
+        try:
+            # 沒有閒置工作行程時每次送出都會啟動新行程；持續送出直到每個行程都回報過
+            while len(pids) < self.workers:
+                futures = [executor.submit(_worker_ready) for _ in range(self.workers)]
+                pids.update(future.result() for future in futures)
+        except Exception:
+            self._restart()
+            raise
+        logger.info(f"✓ 平行 OCR 行程池已預熱 (語言: {self.lang}, 行程數: {len(pids)})")
+
+    def _cancel_outstanding(self, futures: Dict[int, Future]):
+        """
+        取消尚未完成的頁面
+
+        尚未開始的頁面直接取消；已在工作行程中執行的頁面無法取消，重建行程池終止它們，
+        避免文件結束後仍佔用工作行程，拖慢下一份文件。已完成的頁面保留供呼叫端使用。
+        """
+        running = False
+        for idx, future in list(futures.items()):
+            if future.done():
+                continue
+            if not future.cancel():
+                running = True
+            del futures[idx]
+        if running:
+            self._restart()
+
+    def _submit(self, pending: Dict[int, PageImage], futures: Dict[int, Future], indices: List[int]):
+        """將指定頁面送入行程池"""
+        executor = self._get_executor()
+        for idx in indices:
+            futures[idx] = executor.submit(self.page_fn, pending[idx])
+
+    def iter_pages(
+        self,
+        images: Iterable[Union[PageImage, TextLayerPage, None]],
+        deadline: Optional[Deadline] = None,
+        page_cache: Optional[OCRResultCache] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        平行辨識所有頁面，並依頁碼順序產生結果
+
+        頁面以滑動視窗送入行程池（最多 workers x 2 頁在處理中），
+        逐頁渲染的來源不會一次展開，記憶體用量與文件頁數無關。
+        多份文件同時呼叫時依序使用行程池，單頁逾時而重建行程池不會中斷其他文件的頁面。
+
+        Args:
+            images: 支援 len() 的頁面圖像序列（PIL Image 或 BGR 陣列），
+                    已有文字層的頁面為 TextLayerPage（不 OCR），渲染失敗的頁面為 None
+            deadline: 整份文件的截止時間
+            page_cache: 單頁結果快取，只有未命中的頁面送入行程池
+
+        Yields:
+            與 SimpleOCRService.iter_pages 相同格式的頁面結果
+        """
+        deadline = deadline or Deadline()
+        total = min(len(images), MAX_OCR_PAGES)
+        if total == 0:
+            return
+
+        # 等待其他文件用完行程池（最多等到文件截止時間；逾時後只產生快取、文字層與逾時頁面）
+        acquired = False
+        while not acquired and not deadline.expired():
+            remaining = deadline.remaining()
+            acquired = self._run_lock.acquire(timeout=-1 if remaining is None else remaining)
+        try:
+            yield from self._iter_pages(images, total, deadline, page_cache)
+        finally:
+            if acquired:
+                self._run_lock.release()
+
+    def _iter_pages(
+        self,
+        images: Iterable[Union[PageImage, TextLayerPage, None]],
+        total: int,
+        deadline: Deadline,
+        page_cache: Optional[OCRResultCache]
+    ) -> Iterator[Dict[str, Any]]:
+        """iter_pages 的主體（呼叫端須持有 _run_lock，或文件已超過截止時間）"""
+        source = enumerate(itertools.islice(images, total))
+        window = self.workers * 2
+
+        # 尚未產生結果的頁面（工作行程重建後重新送出時使用）
+        pending: Dict[int, PageImage] = {}
+        futures: Dict[int, Future] = {}
+        page_keys: Dict[int, Tuple[str, Optional[float]]] = {}
+        cached_pages: Dict[int, Dict[str, Any]] = {}
+        text_pages: Dict[int, TextLayerPage] = {}
+        render_failed = set()
+
+        def fill():
+            """從來源取出頁面，直到處理中的頁面達到視窗大小"""
+            while len(pending) < window:
+                try:
+                    idx, image = next(source)
+                except StopIteration:
+                    return
+                if image is None:
+                    render_failed.add(idx)
+                    continue
+                if isinstance(image, TextLayerPage):
+                    text_pages[idx] = image
+                    continue
+                if page_cache is not None:
+                    page_source = get_page_source(images, idx)
+                    zoom = page_source[1] if page_source else None
+                    page_keys[idx] = (make_page_cache_key(image, self.lang, page_source), zoom)
+                    cached = page_cache.get_page(*page_keys[idx])
+                    if cached is not None:
+                        cached_pages[idx] = cached
+                        continue
+                pending[idx] = image
+                if not deadline.expired():
+                    self._submit(pending, futures, [idx])
+
+        for idx in range(total):
+            fill()
+
+            page = {
+                "page": idx + 1,
+                "total_pages": total,
+                "text": "",
+                "layout": [],
+                "status": "ok",
+                "error": None,
+                "cached": False,
+                "source": "ocr"
+            }
+
+            if idx in text_pages:
+                text_page = text_pages.pop(idx)
+                page.update(text=text_page.text, layout=text_page.layout, source="text_layer")
+                yield page
+                continue
+
+            if idx in cached_pages:
+                cached = cached_pages.pop(idx)
+                page.update(text=cached["text"], layout=cached["layout"], cached=True)
+                logger.info(f"✓ 第 {idx + 1} 頁使用快取結果")
+                yield page
+                continue
+
+            if idx in render_failed:
+                page["status"] = "error"
+                page["error"] = f"第 {idx + 1} 頁處理失敗: 頁面無法渲染"
+                yield page
+                continue
+
+            # 整份文件已超過時限時，先停止其餘處理中的頁面，再產生逾時頁面
+            if deadline.expired():
+                self._cancel_outstanding(futures)
+
+            future = futures.pop(idx, None)
+            pending.pop(idx, None)
+
+            # 整份文件已超過時限時，尚未完成的頁面直接標記逾時
+            if future is None or (deadline.expired() and not _succeeded(future)):
+                page["status"] = "timeout"
+                page["error"] = f"第 {idx + 1} 頁未處理：文件處理超過時限 ({deadline.seconds:.0f} 秒)"
+                page["timeout"] = {"scope": "document", "limit_seconds": deadline.seconds}
+                logger.error(page["error"])
+                yield page
+                continue
+
+            timeout = deadline.limit(self.page_timeout)
+            try:
+                text, layout = future.result(timeout=timeout)
+                page["text"] = text
+                page["layout"] = layout
+                logger.info(f"✓ 第 {idx + 1} 頁處理完成，辨識出 {len(text)} 個字元")
+
+                if idx in page_keys:
+                    page_key, zoom = page_keys[idx]
+                    page_cache.put_page(page_key, page, zoom)
+            except (FuturesTimeoutError, BrokenProcessPool) as e:
+                if isinstance(e, BrokenProcessPool):
+                    page["status"] = "error"
+                    page["error"] = f"第 {idx + 1} 頁處理失敗: 工作行程異常結束"
+                elif deadline.expired():
+                    page["status"] = "timeout"
+                    page["error"] = f"第 {idx + 1} 頁處理超時（文件時限 {deadline.seconds:.0f} 秒）"
+                    page["timeout"] = {"scope": "document", "limit_seconds": deadline.seconds}
+                else:
+                    page["status"] = "timeout"
+                    page["error"] = f"第 {idx + 1} 頁處理超時（單頁時限 {self.page_timeout:.0f} 秒）"
+                    page["timeout"] = {"scope": "page", "limit_seconds": self.page_timeout}
+                logger.error(page["error"])
+
+                # 終止卡住或崩潰的工作行程，並在時限內重新送出尚未成功完成的後續頁面
+                self._restart()
+                retry = [i for i in pending if not (i in futures and _succeeded(futures[i]))]
+                if retry and not deadline.expired():
+                    self._submit(pending, futures, retry)
+            except Exception as e:
+                error_msg = f"第 {idx + 1} 頁處理失敗: {str(e)}"
+                logger.error(error_msg)
+                page["status"] = "error"
+                page["error"] = error_msg
+
+            yield page
+
+    def process_images(
+        self,
+        images: Iterable[Union[PageImage, TextLayerPage, None]],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        page_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        deadline: Optional[Deadline] = None,
+        page_cache: Optional[OCRResultCache] = None
+    ) -> Tuple[str, List[List[dict]]]:
+        """
+        平行處理多張圖像（回傳格式與 SimpleOCRService.process_images 相同）
+        """
+        return collect_pages(
+            self.iter_pages(images, deadline=deadline, page_cache=page_cache),
+            progress_callback,
+            page_callback
+        )
+
+    def shutdown(self):
+        """關閉行程池"""
+        with self._executor_lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 每個語言一個平行處理器
+_parallel_processors: Dict[str, ParallelPageProcessor] = {}
+_parallel_processors_lock = threading.Lock()
+
+# 啟動時預先啟動的行程池狀態（語言 -> loading / ready / failed）
+_parallel_preload: Dict[str, str] = {}
+_parallel_preload_errors: Dict[str, str] = {}
+
+
+def get_page_timeout() -> float:
+    """單頁 OCR 逾時秒數設定"""
+    return float(os.getenv("OCR_PAGE_TIMEOUT", str(DEFAULT_PAGE_TIMEOUT)))
+
+
+def get_page_parallelism() -> int:
+    """頁面平行度設定（1 表示逐頁處理）"""
+    return max(1, int(os.getenv("OCR_PAGE_PARALLELISM", "1")))
+
+
+def get_parallel_processor(lang: str) -> ParallelPageProcessor:
+    """
+    獲取或創建指定語言的平行處理器
+
+    Args:
+        lang: 語言代碼
+
+    Returns:
+        ParallelPageProcessor 實例
+    """
+    key = map_language(lang)
+
+    with _parallel_processors_lock:
+        if key not in _parallel_processors:
+            _parallel_processors[key] = ParallelPageProcessor(
+                lang=key,
+                workers=get_page_parallelism(),
+                page_timeout=get_page_timeout()
+            )
+        return _parallel_processors[key]
+
+
+def preload_parallel_processors(languages: List[str]) -> Dict[str, str]:
+    """
+    平行預先啟動多個語言的平行處理器行程池（OCR_PAGE_PARALLELISM > 1 時於啟動時呼叫）
+
+    Args:
+        languages: 語言代碼列表
+
+    Returns:
+        各語言的預熱狀態（ready / failed）
+    """
+    keys = list(dict.fromkeys(map_language(lang) for lang in languages))
+    if not keys:
+        return {}
+
+    with _parallel_processors_lock:
+        for key in keys:
+            _parallel_preload[key] = "loading"
+            _parallel_preload_errors.pop(key, None)
+
+    def load(key: str):
+        start_time = time.monotonic()
+        try:
+            get_parallel_processor(key).warm_up()
+        except Exception as e:
+            logger.error(f"✗ 平行 OCR 行程池預熱失敗 (語言: {key}): {str(e)}")
+            with _parallel_processors_lock:
+                _parallel_preload[key] = "failed"
+                _parallel_preload_errors[key] = str(e) or type(e).__name__
+            return
+        with _parallel_processors_lock:
+            _parallel_preload[key] = "ready"
+        logger.info(f"✓ 平行 OCR 行程池預熱完成 (語言: {key}, 耗時 {time.monotonic() - start_time:.1f} 秒)")
+
+    with ThreadPoolExecutor(max_workers=len(keys), thread_name_prefix="ocr-parallel-preload") as executor:
+        list(executor.map(load, keys))
+
+    return get_parallel_preload_status()["languages"]
+
+
+def get_parallel_preload_status() -> dict:
+    """
+    平行處理器行程池的預熱狀態
+
+    Returns:
+        {"ready": 所有預熱的語言皆已就緒, "languages": {語言: 狀態}, "errors": {語言: 錯誤訊息}}
+    """
+    with _parallel_processors_lock:
+        languages = dict(_parallel_preload)
+        errors = dict(_parallel_preload_errors)
+    return {
+        "ready": bool(languages) and all(state == "ready" for state in languages.values()),
+        "languages": languages,
+        "errors": errors
+    }
+
+
+def shutdown_parallel_processors():
+    """關閉所有平行處理器"""
+    with _parallel_processors_lock:
+        for processor in _parallel_processors.values():
+            processor.shutdown()
+        _parallel_processors.clear()
+        _parallel_preload.clear()
+        _parallel_preload_errors.clear()
@@ -0,0 +1,270 @@
+"""
+OCR processing pipeline
+CPU-bound document stages, executed inside the OCR worker executor
+"""
+
+from contextlib import nullcontext
+from PIL import Image
+from typing import Any, Callable, Dict, List, Optional, Union
+import logging
+import os
+import time
+
+from .ocr_pool import get_ocr_pool
+from .deadline import Deadline
+from .parallel import get_page_parallelism, get_page_timeout, get_parallel_processor
+from .result_cache import get_result_cache, get_engine_version, hash_file, make_cache_key
+from .services_simple import MAX_OCR_PAGES, collect_pages, map_language
+from .utils import (
+    PDFPageSource, PageImage, DEFAULT_PDF_DPI, DEFAULT_PIXEL_BUDGET,
+    RENDER_MODE_FIXED, RENDER_MODE_ADAPTIVE
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_prefetch_pages() -> int:
+    """PDF 預先渲染的頁數設定"""
+    return max(0, int(os.getenv("PDF_PREFETCH_PAGES", "1")))
+
+
+def get_render_mode() -> str:
+    """PDF 渲染模式設定（fixed / adaptive）"""
+    mode = os.getenv("PDF_RENDER_MODE", RENDER_MODE_FIXED)
+    if mode not in (RENDER_MODE_FIXED, RENDER_MODE_ADAPTIVE):
+        logger.warning(f"不支援的 PDF 渲染模式: {mode}，改用 {RENDER_MODE_FIXED}")
+        return RENDER_MODE_FIXED
+    return mode
+
+
+def get_pixel_budget() -> int:
+    """adaptive 渲染模式的每頁平均像素預算設定"""
+    return int(os.getenv("PDF_PIXEL_BUDGET", str(DEFAULT_PIXEL_BUDGET)))
+
+
+def use_text_layer() -> bool:
+    """是否優先使用 PDF 內嵌文字層（品質足夠的頁面略過 OCR）"""
+    return os.getenv("PDF_TEXT_LAYER", "True").lower() in ("true", "1", "yes")
+
+
+def get_render_settings() -> str:
+    """影響 OCR 結果的渲染設定與頁數上限（結果快取鍵的一部分）"""
+    settings = f"dpi={DEFAULT_PDF_DPI}|max_pages={MAX_OCR_PAGES}"
+    mode = get_render_mode()
+    if mode == RENDER_MODE_ADAPTIVE:
+        settings += f"|mode={mode}|budget={get_pixel_budget()}"
+    if use_text_layer():
+        settings += "|text_layer"
+    return settings
+
+
+def load_document_images(file_path: str, file_type: str) -> Union[PDFPageSource, List[PageImage]]:
+    """
+    將上傳的檔案轉換為圖像序列（直接從檔案讀取，不先將整個檔案載入記憶體）
+
+    Args:
+        file_path: 上傳檔案路徑
+        file_type: MIME 類型
+
+    Returns:
+        支援 len() 的頁面圖像序列（PDF 在 OCR 時逐頁渲染為 BGR 陣列，圖像檔為 PIL Image 列表）
+    """
+    if file_type == "application/pdf":
+        images = PDFPageSource(
+            file_path,
+            max_pages=MAX_OCR_PAGES,
+            prefetch_pages=get_prefetch_pages(),
+            render_mode=get_render_mode(),
+            pixel_budget=get_pixel_budget(),
+            text_layer=use_text_layer()
+        )
+    else:
+        with Image.open(file_path) as image:
+            images = [image.convert('RGB')]
+        logger.info("圖像載入完成")
+    return images
+
+
+def get_document_timeout() -> float:
+    """整份文件 OCR 逾時秒數設定（0 表示不限制）"""
+    return float(os.getenv("OCR_DOCUMENT_TIMEOUT", "300"))
+
+
+def get_cache_key(file_sha256: str, language: str) -> str:
+    """OCR 結果的快取鍵（檔案雜湊 + 語言 + 渲染設定與頁數上限 + 引擎版本）"""
+    return make_cache_key(
+        file_sha256,
+        map_language(language),
+        get_render_settings(),
+        get_engine_version()
+    )
+
+
+def lookup_cached_result(
+    file_sha256: str,
+    language: str,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    page_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    查詢 OCR 結果快取，命中時依序重播每頁結果給回呼
+
+    Args:
+        file_sha256: 檔案內容的 SHA-256
+        language: OCR 語言
+
+    Returns:
+        與 run_ocr_file 相同格式的結果，未命中時為 None
+    """
+    pages = get_result_cache().get(get_cache_key(file_sha256, language))
+    if pages is None:
+        return None
+
+    raw_text, all_layouts = collect_pages(pages, progress_callback, page_callback)
+    logger.info(f"✓ OCR 結果快取命中 (sha256: {file_sha256[:12]}..., 語言: {language})")
+    return {
+        "raw_text": raw_text,
+        "layout_info": all_layouts,
+        "page_errors": [],
+        "cached": True
+    }
+
+
+def run_ocr_file(
+    file_path: str,
+    file_type: str,
+    language: str,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    page_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    file_sha256: Optional[str] = None,
+    ocr_service=None,
+    return_pages: bool = False,
+    cache_checked: bool = False
+) -> Dict[str, Any]:
+    """
+    讀取檔案並執行 OCR（於執行器的工作執行緒或行程中執行）
+
+    Args:
+        file_path: 上傳檔案路徑
+        file_type: MIME 類型
+        language: OCR 語言
+        progress_callback: 每頁完成後的進度回呼（僅 thread 模式可用）
+        page_callback: 每頁完成後以該頁結果呼叫（僅 thread 模式可用）
+        file_sha256: 上傳時已計算的檔案雜湊，未提供時分塊讀取檔案計算
+        ocr_service: 呼叫端已取出的引擎（批次處理共用），未提供時從引擎池取出
+        return_pages: 結果中附上每頁的完整結果（process 模式無法使用 page_callback 時，供呼叫端於完成後逐頁送出）
+        cache_checked: 呼叫端送出工作前已查詢過結果快取且未命中（不重複查詢，也不重複計入未命中次數）
+
+    Returns:
+        {"raw_text": 合併的文字, "layout_info": 每頁的佈局資訊,
+         "page_errors": 逾時或失敗頁面的 {page, status, error, timeout},
+         "cached": 是否來自結果快取}，return_pages 時另有 "pages": 每頁的結果字典
+    """
+    # 文件時限從讀取檔案開始計算，包含 PDF 轉換時間
+    deadline = Deadline(get_document_timeout())
+
+    pages = []
+    page_errors = []
+
+    def on_page(page: Dict[str, Any]):
+        pages.append(page)
+        if page["status"] != "ok":
+            page_errors.append({
+                key: page.get(key) for key in ("page", "status", "error", "timeout")
+            })
+        if page_callback is not None:
+            page_callback(page)
+
+    # 相同內容、語言與設定的檔案直接使用快取結果
+    file_sha256 = file_sha256 or hash_file(file_path)
+    cached = None if cache_checked else lookup_cached_result(file_sha256, language, progress_callback, on_page)
+    if cached is not None:
+        if return_pages:
+            cached["pages"] = pages
+        return cached
+
+    images = load_document_images(file_path, file_type)
+
+    if not images:
+        raise ValueError("無法從檔案中提取圖像")
+
+    logger.info(f"開始 OCR 辨識 ({len(images)} 張圖像)...")
+
+    try:
+        if get_page_parallelism() > 1 and len(images) > 1:
+            # 多頁文件分散到行程池平行處理
+            raw_text, all_layouts = get_parallel_processor(language).process_images(
+                images,
+                progress_callback=progress_callback,
+                page_callback=on_page,
+                deadline=deadline,
+                page_cache=get_result_cache()
+            )
+        else:
+            # 從引擎池取出已初始化的引擎，避免每次請求重新載入模型
+            engine = nullcontext(ocr_service) if ocr_service is not None else get_ocr_pool().engine(language)
+            with engine as ocr_service:
+                raw_text, all_layouts = ocr_service.process_images(
+                    images,
+                    progress_callback=progress_callback,
+                    page_callback=on_page,
+                    page_timeout=get_page_timeout(),
+                    deadline=deadline,
+                    page_cache=get_result_cache()
+                )
+        logger.info(f"OCR 辨識完成，辨識出 {len(raw_text)} 個字元")
+
+        # 只快取所有頁面都成功的結果，逾時或失敗的頁面下次重新辨識
+        if not page_errors:
+            get_result_cache().put(get_cache_key(file_sha256, language), pages)
+    except Exception as e:
+        logger.error(f"OCR 處理過程中發生錯誤: {str(e)}")
+        import traceback
+        logger.error(f"詳細錯誤: {traceback.format_exc()}")
+        # 返回部分結果而不是完全失敗
+        raw_text = f"[OCR 處理失敗: {str(e)}]"
+        all_layouts = [[] for _ in range(len(images))]
+
+    result = {
+        "raw_text": raw_text,
+        "layout_info": all_layouts,
+        "page_errors": page_errors,
+        "cached": False
+    }
+    if return_pages:
+        result["pages"] = pages
+    return result
+
+
+def run_ocr_batch(files: List[Dict[str, Any]], language: str) -> List[Dict[str, Any]]:
+    """
+    以同一個引擎依序處理多個檔案（於執行器的工作執行緒或行程中執行）
+
+    整批只從引擎池取出一次引擎；單一檔案失敗不影響其他檔案。
+
+    Args:
+        files: [{"file_path": 路徑, "file_type": MIME 類型, "file_sha256": 雜湊（可省略）}]
+        language: OCR 語言
+
+    Returns:
+        與 files 順序相同的結果列表：run_ocr_file 的結果加上 processing_time，
+        失敗的檔案為 {"error": 錯誤訊息, "processing_time": 秒數}
+    """
+    results = []
+    with get_ocr_pool().engine(language) as ocr_service:
+        for file in files:
+            start_time = time.time()
+            try:
+                result = run_ocr_file(
+                    file["file_path"],
+                    file["file_type"],
+                    language,
+                    file_sha256=file.get("file_sha256"),
+                    ocr_service=ocr_service
+                )
+            except Exception as e:
+                logger.error(f"批次 OCR 檔案處理失敗 ({file['file_path']}): {str(e)}")
+                result = {"error": str(e)}
+            result["processing_time"] = time.time() - start_time
+            results.append(result)
+    return results
@@ -0,0 +1,376 @@
+"""
+OCR result cache
+Content-addressed on-disk cache of OCR results with LRU eviction, keyed by
+file hash, language, render settings and engine version; single pages are
+cached separately by the source PDF page content (or the page image hash for
+image uploads). The size index is re-synced from disk periodically so several
+worker processes sharing the directory stay under one size limit
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .utils import PageImage
+
+logger = logging.getLogger(__name__)
+
+# 索引與磁碟同步的間隔秒數（其他行程寫入的項目在同步後才計入大小上限）
+INDEX_SYNC_INTERVAL = 10
+
+
+def hash_bytes(data: bytes) -> str:
+    """計算內容的 SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分塊計算檔案內容的 SHA-256（不將整個檔案讀入記憶體）"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_image(image: PageImage) -> str:
+    """計算渲染後頁面圖像的 SHA-256（包含格式與尺寸）"""
+    if isinstance(image, np.ndarray):
+        header = f"bgr|{image.shape[1]}x{image.shape[0]}|"
+        data = np.ascontiguousarray(image)
+    else:
+        header = f"{image.mode}|{image.width}x{image.height}|"
+        data = image.tobytes()
+    digest = hashlib.sha256(header.encode("utf-8"))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_engine_version() -> str:
+    """OCR 引擎版本（升級引擎後舊的快取自動失效）"""
+    try:
+        from importlib.metadata import version
+        return f"paddleocr-{version('paddleocr')}"
+    except Exception:
+        return "paddleocr-unknown"
+
+
+def make_cache_key(file_sha256: str, language: str, render_settings: str, engine_version: str) -> str:
+    """
+    組合快取鍵
+
+    Args:
+        file_sha256: 檔案內容的 SHA-256
+        language: 對應後的 OCR 語言（ch_tra / ch_sim 共用 ch）
+        render_settings: 影響辨識結果的渲染設定（例如 DPI）
+        engine_version: OCR 引擎版本
+
+    Returns:
+        固定長度的快取鍵
+    """
+    raw = "|".join([file_sha256, language, render_settings, engine_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def make_page_cache_key(image: PageImage, language: str, source: Optional[Tuple[str, float]] = None) -> str:
+    """
+    單頁結果的快取鍵
+
+    Args:
+        image: 頁面圖像
+        language: 對應後的 OCR 語言
+        source: PDF 頁面的 (來源雜湊, 縮放係數)；提供時以來源內容為鍵（縮放係數不影響命中），
+                否則以頁面圖像雜湊為鍵（已涵蓋渲染設定）
+
+    Returns:
+        固定長度的快取鍵
+    """
+    if source is not None:
+        return make_cache_key(source[0], language, "pdf-page", get_engine_version())
+    return make_cache_key(hash_image(image), language, "page", get_engine_version())
+
+
+def _scale_bbox(bbox: Any, factor: float) -> Any:
+    """縮放 bbox 座標（[x0, y0, x1, y1] 或四個頂點）"""
+    if isinstance(bbox, (list, tuple)):
+        return [_scale_bbox(value, factor) for value in bbox]
+    return bbox * factor
+
+
+def scale_layout(layout: List[Dict[str, Any]], factor: float) -> List[Dict[str, Any]]:
+    """將佈局資訊的像素座標依縮放比例換算"""
+    scaled = []
+    for entry in layout:
+        entry = dict(entry)
+        for field in ("bbox", "x_position", "y_position"):
+            if field in entry:
+                entry[field] = _scale_bbox(entry[field], factor)
+        scaled.append(entry)
+    return scaled
+
+
+class OCRResultCache:
+    """OCR 結果磁碟快取（總大小超過上限時淘汰最久未使用的項目）"""
+
+    # 日誌中的快取內容名稱（子類別覆寫）
+    label = "OCR 結果"
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, ttl: float = 0):
+        """
+        初始化快取
+
+        Args:
+            cache_dir: 快取目錄
+            max_bytes: 快取總大小上限（位元組），0 表示停用快取
+            ttl: 項目寫入後的有效秒數，0 表示不過期
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max(0, max_bytes)
+        self.ttl = max(0.0, ttl)
+        self.enabled = self.max_bytes > 0
+
+        self._lock = threading.Lock()
+        # key -> 檔案大小，依最近使用時間排序（最舊的在前）
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._synced_at = 0.0
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "page_hits": 0,
+            "page_misses": 0,
+            "page_stores": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _load_index(self):
+        """從磁碟建立索引"""
+        with self._lock:
+            self._sync_index()
+
+        if self._index:
+            logger.info(f"✓ {self.label}快取已載入 {len(self._index)} 個項目 ({self._total_bytes / 1024 / 1024:.1f}MB)")
+
+    def _sync_index(self):
+        """
+        從磁碟重建索引，以檔案修改時間作為最近使用時間（呼叫端須持有鎖）
+
+        同一目錄可能由多個行程共用，讀取時更新的修改時間讓各行程得到一致的使用順序。
+        """
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        self._index.clear()
+        self._total_bytes = 0
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+        self._synced_at = time.time()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        讀取快取的整份文件結果
+
+        Args:
+            key: make_cache_key() 產生的快取鍵
+
+        Returns:
+            頁面結果列表，未命中時為 None
+        """
+        return self._read(key, "hits", "misses")
+
+    def get_page(self, key: str, zoom: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        讀取快取的單頁結果
+
+        Args:
+            key: make_page_cache_key() 產生的快取鍵
+            zoom: 目前的渲染縮放係數；與寫入時不同時，佈局座標依比例換算
+
+        Returns:
+            頁面結果（text, layout），未命中時為 None
+        """
+        pages = self._read(key, "page_hits", "page_misses")
+        if not pages:
+            return None
+        page = pages[0]
+        cached_zoom = page.pop("zoom", None)
+        if zoom and cached_zoom and abs(zoom - cached_zoom) > 1e-9:
+            page["layout"] = scale_layout(page["layout"], zoom / cached_zoom)
+        return page
+
+    def _read(self, key: str, hit_stat: str, miss_stat: str) -> Optional[List[Dict[str, Any]]]:
+        """讀取快取項目並更新統計與使用順序"""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            pages = data["pages"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._stats[miss_stat] += 1
+                self._forget(key)
+            return None
+
+        if self.ttl and time.time() - data.get("created_at", 0) > self.ttl:
+            with self._lock:
+                self._stats[miss_stat] += 1
+                self._stats["expired"] += 1
+                self._forget(key)
+            path.unlink(missing_ok=True)
+            return None
+
+        with self._lock:
+            self._stats[hit_stat] += 1
+            if key in self._index:
+                self._index.move_to_end(key)
+
+        # 更新修改時間，讓重啟後重建的索引保留使用順序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return pages
+
+    def put(self, key: str, pages: List[Dict[str, Any]]):
+        """
+        寫入整份文件結果，必要時淘汰最久未使用的項目
+
+        Args:
+            key: make_cache_key() 產生的快取鍵
+            pages: 頁面結果列表
+        """
+        self._write(key, pages, "stores")
+
+    def put_page(self, key: str, page: Dict[str, Any], zoom: Optional[float] = None):
+        """
+        寫入單頁結果（只保留 text、layout 與渲染時的縮放係數）
+
+        Args:
+            key: make_page_cache_key() 產生的快取鍵
+            page: 頁面結果
+            zoom: 渲染縮放係數（以來源內容為鍵時，讀取端據此換算佈局座標）
+        """
+        entry = {"text": page["text"], "layout": page["layout"]}
+        if zoom:
+            entry["zoom"] = zoom
+        self._write(key, [entry], "page_stores")
+
+    def _write(self, key: str, pages: List[Dict[str, Any]], store_stat: str):
+        """寫入快取項目，必要時淘汰最久未使用的項目"""
+        if not self.enabled:
+            return
+
+        data = json.dumps(
+            {"created_at": time.time(), "pages": pages},
+            ensure_ascii=False
+        ).encode("utf-8")
+
+        if len(data) > self.max_bytes:
+            logger.warning(f"{self.label}過大 ({len(data)} bytes)，不寫入快取")
+            return
+
+        # 先寫入暫存檔再改名，避免其他執行緒/行程讀到寫一半的檔案
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入{self.label}快取失敗: {str(e)}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            # 定期從磁碟重建索引，把其他行程寫入的項目計入大小上限
+            if time.time() - self._synced_at >= INDEX_SYNC_INTERVAL:
+                self._sync_index()
+            self._forget(key)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._stats[store_stat] += 1
+            self._evict()
+
+    def _forget(self, key: str):
+        """從索引移除項目（呼叫端須持有鎖）"""
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self):
+        """淘汰最久未使用的項目直到低於大小上限（呼叫端須持有鎖）"""
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self._stats["evictions"] += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def get_stats(self) -> dict:
+        """獲取快取統計資訊"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            })
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+# 全域快取實例
+_result_cache: Optional[OCRResultCache] = None
+
+
+def get_result_cache() -> OCRResultCache:
+    """
+    獲取或創建 OCR 結果快取（單例模式）
+
+    Returns:
+        OCRResultCache 實例
+    """
+    global _result_cache
+
+    if _result_cache is None:
+        _result_cache = OCRResultCache(
+            cache_dir=os.getenv("OCR_CACHE_DIR", "./cache/ocr"),
+            max_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+        )
+
+    return _result_cache
@@ -6,9 +6,11 @@ PaddleOCR 核心服務
 import paddleocr
 import numpy as np
 from PIL import Image
-from typing import List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Optional
 import logging
-import time
+
+from .deadline import Deadline, DeadlineExceeded, run_with_timeout
+from .services_simple import DEFAULT_PAGE_TIMEOUT, ENGINE_RECOVERY_GRACE, collect_pages
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +42,8 @@ class OCRService:
         self.lang = self.lang_mapping.get(lang, lang)
         self.use_gpu = use_gpu
         self.ocr_engine = None
+        # 逾時頁面留下的 (引擎, 仍在執行的執行緒)
+        self._abandoned = None
         # 延遲初始化，只在第一次使用時才初始化
     
     def _initialize_engine(self):
@@ -114,6 +118,7 @@ class OCRService:
         if new_lang != self.lang:
             logger.info(f"切換 OCR 語言: {self.lang} -> {new_lang}")
             self.lang = new_lang
+            self._abandoned = None
             self._initialize_engine()
     
     def process_image(
@@ -337,76 +342,136 @@ class OCRService:
             # 返回空結果而不是拋出異常，避免整個服務崩潰
             return "", []
     
-    def process_images(
+    def _ensure_engine(self, deadline: Deadline):
+        """
+        確保有可用的引擎
+
+        上一頁逾時時，先在 ENGINE_RECOVERY_GRACE 秒內（不超過文件剩餘時間）等待放棄的執行緒結束，
+        結束後沿用原本的引擎，只有仍未結束時才重新載入 PaddleOCR。
+        """
+        if self.ocr_engine is not None:
+            return
+        
+        if self._abandoned is not None:
+            engine, worker = self._abandoned
+            self._abandoned = None
+            worker.join(deadline.limit(ENGINE_RECOVERY_GRACE))
+            if not worker.is_alive():
+                logger.info("逾時的頁面已結束，沿用原本的 OCR 引擎")
+                self.ocr_engine = engine
+                return
+            logger.warning(f"逾時的頁面仍在執行，放棄原本的 OCR 引擎並重新初始化 (語言: {self.lang})")
+        
+        logger.info("OCR 引擎未初始化，正在初始化...")
+        self._initialize_engine()
+    
+    def iter_pages(
         self,
         images: List[Image.Image],
-        use_cls: bool = True
-    ) -> Tuple[str, List[List[dict]]]:
+        use_cls: bool = True,
+        page_timeout: Optional[float] = DEFAULT_PAGE_TIMEOUT,
+        deadline: Optional[Deadline] = None
+    ) -> Iterator[Dict[str, Any]]:
         """
-        處理多張圖像
+        逐頁處理圖像，每完成一頁就產生該頁結果
         
         Args:
             images: PIL Image 物件列表
             use_cls: 是否使用角度分類
+            page_timeout: 單頁逾時秒數，None 表示不限制
+            deadline: 整份文件的截止時間
             
-        Returns:
-            (合併的文字, 每頁的佈局資訊)
+        Yields:
+            頁面結果字典（與 SimpleOCRService.iter_pages 相同）：page, total_pages, text, layout,
+            status (ok / timeout / error), error，逾時頁面另有 timeout: {"scope": "page" / "document", "limit_seconds": ...}
         """
-        # 確保 OCR 引擎已初始化（只初始化一次）
-        if self.ocr_engine is None:
-            logger.info("OCR 引擎未初始化，正在初始化...")
-            self._initialize_engine()
-        else:
-            logger.info("OCR 引擎已初始化，直接使用")
-        
-        all_text = []
-        all_layouts = []
-        
-        start_time = time.time()
+        deadline = deadline or Deadline()
+        total = len(images)
         
         for i, image in enumerate(images, 1):
-            logger.info(f"處理第 {i}/{len(images)} 張圖像...")
+            page = {
+                "page": i,
+                "total_pages": total,
+                "text": "",
+                "layout": [],
+                "status": "ok",
+                "error": None,
+                "cached": False,
+                "source": "ocr"
+            }
+            
+            # 整份文件已超過時限時，剩餘頁面直接標記逾時
+            if deadline.expired():
+                page["status"] = "timeout"
+                page["error"] = f"第 {i} 頁未處理：文件處理超過時限 ({deadline.seconds:.0f} 秒)"
+                page["timeout"] = {"scope": "document", "limit_seconds": deadline.seconds}
+                logger.error(page["error"])
+                yield page
+                continue
+            
+            logger.info(f"處理第 {i}/{total} 張圖像...")
             logger.info(f"圖像尺寸: {image.size}, 模式: {image.mode}")
             
             try:
-                # 添加超時機制，避免單頁處理時間過長
-                import signal
+                self._ensure_engine(deadline)
                 
-                def timeout_handler(signum, frame):
-                    raise TimeoutError(f"第 {i} 頁處理超時")
+                # 不使用 SIGALRM，可在工作執行緒中運作
+                timeout = deadline.limit(page_timeout)
+                text, layout = run_with_timeout(self.process_image, timeout, image, use_cls)
                 
-                # 設定 30 秒超時
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(30)
+                page["text"] = text
+                page["layout"] = layout
+                logger.info(f"✓ 第 {i} 頁處理完成，辨識出 {len(text)} 個字元")
                 
-                try:
-                    text, layout = self.process_image(image, use_cls)
-                    signal.alarm(0)  # 取消超時
-                    
-                    all_text.append(f"--- 第 {i} 頁 ---\n{text}")
-                    all_layouts.append(layout)
-                    logger.info(f"✓ 第 {i} 頁處理完成，辨識出 {len(text)} 個字元")
-                    
-                except TimeoutError as te:
-                    signal.alarm(0)  # 取消超時
-                    error_msg = f"第 {i} 頁處理超時: {str(te)}"
-                    logger.error(error_msg)
-                    all_text.append(f"--- 第 {i} 頁 ---\n[錯誤: {error_msg}]")
-                    all_layouts.append([])
+            except DeadlineExceeded as e:
+                document_limited = page_timeout is None or (
+                    deadline.seconds is not None and timeout < page_timeout
+                )
+                scope = "document" if document_limited else "page"
+                limit = deadline.seconds if document_limited else page_timeout
+                page["status"] = "timeout"
+                page["error"] = f"第 {i} 頁處理超時（{'文件' if document_limited else '單頁'}時限 {limit:.0f} 秒）"
+                page["timeout"] = {"scope": scope, "limit_seconds": limit}
+                logger.error(page["error"])
+                # 逾時的執行緒仍在使用引擎，下一頁開始前再決定沿用或重建
+                self._abandoned = (self.ocr_engine, e.worker)
+                self.ocr_engine = None
                 
             except Exception as e:
                 error_msg = f"第 {i} 頁處理失敗: {str(e)}"
                 logger.error(error_msg)
                 import traceback
                 logger.error(f"詳細錯誤: {traceback.format_exc()}")
-                all_text.append(f"--- 第 {i} 頁 ---\n[錯誤: {error_msg}]")
-                all_layouts.append([])
-        
-        processing_time = time.time() - start_time
-        logger.info(f"✓ 處理完成，耗時 {processing_time:.2f} 秒")
+                page["status"] = "error"
+                page["error"] = error_msg
+            
+            yield page
+    
+    def process_images(
+        self,
+        images: List[Image.Image],
+        use_cls: bool = True,
+        page_timeout: Optional[float] = DEFAULT_PAGE_TIMEOUT,
+        deadline: Optional[Deadline] = None,
+        page_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Tuple[str, List[List[dict]]]:
+        """
+        處理多張圖像
         
-        combined_text = "\n\n".join(all_text)
-        return combined_text, all_layouts
+        Args:
+            images: PIL Image 物件列表
+            use_cls: 是否使用角度分類
+            page_timeout: 單頁逾時秒數
+            deadline: 整份文件的截止時間
+            page_callback: 每頁完成後以該頁結果字典呼叫（可取得逾時頁面的 timeout 資訊）
+            
+        Returns:
+            (合併的文字, 每頁的佈局資訊)
+        """
+        return collect_pages(
+            self.iter_pages(images, use_cls=use_cls, page_timeout=page_timeout, deadline=deadline),
+            page_callback=page_callback
+        )
     
     def get_info(self) -> dict:
         """獲取服務資訊"""
@@ -5,14 +5,90 @@ Focused on handling PaddleOCR 3.3.0 standard output format
 
 import paddleocr
 import numpy as np
-from PIL import Image
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Callable, Iterable, Iterator, Optional, Union
+import itertools
 import logging
+import os
 import time
 
+from .deadline import Deadline, DeadlineExceeded, run_with_timeout
+from .result_cache import OCRResultCache, make_page_cache_key
+from .utils import PageImage, TextLayerPage, describe_image, get_page_source, to_bgr_array
+
 logger = logging.getLogger(__name__)
 
 
+# Language code mapping (PaddleOCR 3.3.0 version)
+LANG_MAPPING = {
+    'en': 'en',
+    'ch_tra': 'ch',  # Traditional Chinese
+    'ch_sim': 'ch',  # Simplified Chinese (both use ch)
+    'japan': 'japan',
+    'korean': 'korean',
+    'french': 'french',
+    'german': 'german',
+    'spanish': 'spanish'
+}
+
+
+def map_language(lang: str) -> str:
+    """將使用者語言代碼轉換為 PaddleOCR 語言代碼"""
+    return LANG_MAPPING.get(lang, lang)
+
+
+# 單份文件最多處理的頁數（PDF 逐頁渲染，記憶體用量不隨頁數增加）
+MAX_OCR_PAGES = int(os.getenv("OCR_MAX_PAGES", "100"))
+
+# 單頁 OCR 預設逾時秒數
+DEFAULT_PAGE_TIMEOUT = 60
+
+# 頁面逾時後，等待放棄的執行緒結束以沿用原本引擎的最長秒數（超過才重新載入 PaddleOCR）
+ENGINE_RECOVERY_GRACE = 5
+
+
+def format_page_text(page: Dict[str, Any]) -> str:
+    """將單頁結果格式化為帶頁碼標記的文字"""
+    body = f"[錯誤: {page['error']}]" if page.get("error") else page["text"]
+    return f"--- 第 {page['page']} 頁 ---\n{body}"
+
+
+def collect_pages(
+    pages: Iterable[Dict[str, Any]],
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    page_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Tuple[str, List[List[dict]]]:
+    """
+    將逐頁結果合併為整份文件的文字與佈局資訊
+    
+    Args:
+        pages: 依頁碼順序產生的頁面結果
+        progress_callback: 每頁完成後呼叫 progress_callback(已完成頁數, 總頁數)
+        page_callback: 每頁完成後以該頁結果字典呼叫（用於串流回應）
+        
+    Returns:
+        (合併的文字, 每頁的佈局資訊)
+    """
+    all_text = []
+    all_layouts = []
+    
+    start_time = time.time()
+    
+    for page in pages:
+        all_text.append(format_page_text(page))
+        all_layouts.append(page["layout"])
+        
+        if page_callback is not None:
+            page_callback(page)
+        if progress_callback is not None:
+            progress_callback(page["page"], page["total_pages"])
+    
+    processing_time = time.time() - start_time
+    logger.info(f"✓ 處理完成，耗時 {processing_time:.2f} 秒")
+    
+    combined_text = "\n\n".join(all_text)
+    return combined_text, all_layouts
+
+
 class SimpleOCRService:
     """Simplified OCR service class"""
     
@@ -24,22 +100,14 @@ class SimpleOCRService:
             lang: Language code (en, ch_tra, ch_sim, etc.)
             use_gpu: Whether to use GPU/MPS acceleration (disabled by default for stability)
         """
-        # Language code mapping (PaddleOCR 3.3.0 version)
-        self.lang_mapping = {
-            'en': 'en',
-            'ch_tra': 'ch',  # Traditional Chinese
-            'ch_sim': 'ch',  # Simplified Chinese (both use ch)
-            'japan': 'japan',
-            'korean': 'korean',
-            'french': 'french',
-            'german': 'german',
-            'spanish': 'spanish'
-        }
+        self.lang_mapping = LANG_MAPPING
         
         self.original_lang = lang
-        self.lang = self.lang_mapping.get(lang, lang)
+        self.lang = map_language(lang)
         self.use_gpu = use_gpu
         self.ocr_engine = None
+        # 逾時頁面仍在使用的 (引擎, 執行緒)，下一頁開始前決定沿用或重建
+        self._abandoned = None
         # 延遲初始化，只在第一次使用時才初始化
     
     def _initialize_engine(self):
@@ -78,12 +146,12 @@ class SimpleOCRService:
             logger.error(f"詳細錯誤: {traceback.format_exc()}")
             raise RuntimeError(f"無法初始化 PaddleOCR: {str(e)}")
     
-    def process_image(self, image: Image.Image) -> Tuple[str, List[dict]]:
+    def process_image(self, image: PageImage) -> Tuple[str, List[dict]]:
         """
         處理單張圖像
         
         Args:
-            image: PIL Image 物件
+            image: PIL Image 物件，或 BGR 格式的 NumPy 陣列（直接交給引擎，不再轉換）
             
         Returns:
             (純文字, 佈局資訊列表)
@@ -92,9 +160,8 @@ class SimpleOCRService:
             raise RuntimeError("OCR 引擎未初始化")
         
         try:
-            # 轉換 PIL Image 為 NumPy array (BGR 格式)
-            image_np = np.array(image.convert('RGB'))
-            image_bgr = image_np[:, :, ::-1]  # RGB -> BGR
+            # 轉換為 NumPy array (BGR 格式)
+            image_bgr = to_bgr_array(image)
             
             # 執行 OCR
             logger.info("正在執行 OCR...")
@@ -265,80 +332,179 @@ class SimpleOCRService:
             # 返回空結果而不是拋出異常，避免整個服務崩潰
             return "", []
     
-    def process_images(self, images: List[Image.Image]) -> Tuple[str, List[List[dict]]]:
+    def iter_pages(
+        self,
+        images: Iterable[Union[PageImage, TextLayerPage, None]],
+        page_timeout: Optional[float] = DEFAULT_PAGE_TIMEOUT,
+        deadline: Optional[Deadline] = None,
+        page_cache: Optional[OCRResultCache] = None
+    ) -> Iterator[Dict[str, Any]]:
         """
-        處理多張圖像
+        逐頁處理圖像，每完成一頁就產生該頁結果
         
         Args:
-            images: PIL Image 物件列表
+            images: 支援 len() 的頁面圖像序列（PIL Image 或 BGR 陣列，例如 PDFPageSource 逐頁渲染），
+                    已有文字層的頁面為 TextLayerPage（不 OCR），渲染失敗的頁面為 None
+            page_timeout: 單頁逾時秒數，None 表示不限制
+            deadline: 整份文件的截止時間
+            page_cache: 單頁結果快取，內容未變的頁面不重新辨識
             
-        Returns:
-            (合併的文字, 每頁的佈局資訊)
+        Yields:
+            頁面結果字典：page, total_pages, text, layout, status (ok / timeout / error), error, cached,
+            source (ocr / text_layer)，
+            逾時頁面另有 timeout: {"scope": "page" / "document", "limit_seconds": ...}
         """
-        # 確保 OCR 引擎已初始化（只初始化一次）
-        if self.ocr_engine is None:
-            logger.info("OCR 引擎未初始化，正在初始化...")
-            self._initialize_engine()
-        else:
-            logger.info("OCR 引擎已初始化，直接使用")
-        
-        all_text = []
-        all_layouts = []
+        deadline = deadline or Deadline()
         
-        start_time = time.time()
-        
-        # 限制處理的圖像數量，避免記憶體問題
-        max_images = min(len(images), 5)  # 最多處理 5 張圖像
+        # 限制處理的圖像數量
+        max_images = min(len(images), MAX_OCR_PAGES)
         if len(images) > max_images:
             logger.warning(f"圖像數量 ({len(images)}) 超過限制 ({max_images})，僅處理前 {max_images} 張")
         
-        for i, image in enumerate(images[:max_images], 1):
+        # 逐頁取用，處理完的頁面不再保留
+        for i, image in enumerate(itertools.islice(images, max_images), 1):
+            page = {
+                "page": i,
+                "total_pages": max_images,
+                "text": "",
+                "layout": [],
+                "status": "ok",
+                "error": None,
+                "cached": False,
+                "source": "ocr"
+            }
+            
+            if image is None:
+                page["status"] = "error"
+                page["error"] = f"第 {i} 頁處理失敗: 頁面無法渲染"
+                yield page
+                continue
+            
+            # 內嵌文字層品質足夠的頁面不需要 OCR
+            if isinstance(image, TextLayerPage):
+                page.update(text=image.text, layout=image.layout, source="text_layer")
+                yield page
+                continue
+            
+            # 內容未變的頁面直接使用快取結果
+            page_key = None
+            if page_cache is not None:
+                page_source = get_page_source(images, i - 1)
+                zoom = page_source[1] if page_source else None
+                page_key = make_page_cache_key(image, self.lang, page_source)
+                cached = page_cache.get_page(page_key, zoom)
+                if cached is not None:
+                    page.update(text=cached["text"], layout=cached["layout"], cached=True)
+                    logger.info(f"✓ 第 {i} 頁使用快取結果")
+                    yield page
+                    continue
+            
+            # 整份文件已超過時限時，剩餘頁面直接標記逾時
+            if deadline.expired():
+                page["status"] = "timeout"
+                page["error"] = f"第 {i} 頁未處理：文件處理超過時限 ({deadline.seconds:.0f} 秒)"
+                page["timeout"] = {"scope": "document", "limit_seconds": deadline.seconds}
+                logger.error(page["error"])
+                yield page
+                continue
+            
             logger.info(f"處理第 {i}/{max_images} 張圖像...")
-            logger.info(f"圖像尺寸: {image.size}, 模式: {image.mode}")
+            logger.info(f"圖像尺寸: {describe_image(image)}")
             
             try:
-                # 添加超時機制
-                import signal
+                self._ensure_engine(deadline)
                 
-                def timeout_handler(signum, frame):
-                    raise TimeoutError(f"第 {i} 頁處理超時")
+                timeout = deadline.limit(page_timeout)
+                text, layout = run_with_timeout(self.process_image, timeout, image)
                 
-                # 設定 60 秒超時
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(60)
+                page["text"] = text
+                page["layout"] = layout
+                logger.info(f"✓ 第 {i} 頁處理完成，辨識出 {len(text)} 個字元")
                 
-                try:
-                    text, layout = self.process_image(image)
-                    signal.alarm(0)  # 取消超時
-                    
-                    all_text.append(f"--- 第 {i} 頁 ---\n{text}")
-                    all_layouts.append(layout)
-                    logger.info(f"✓ 第 {i} 頁處理完成，辨識出 {len(text)} 個字元")
-                    
-                except TimeoutError as te:
-                    signal.alarm(0)  # 取消超時
-                    error_msg = f"第 {i} 頁處理超時: {str(te)}"
-                    logger.error(error_msg)
-                    all_text.append(f"--- 第 {i} 頁 ---\n[錯誤: {error_msg}]")
-                    all_layouts.append([])
+                if page_key is not None:
+                    page_cache.put_page(page_key, page, zoom)
                 
-                # 清理記憶體
-                import gc
-                gc.collect()
+            except DeadlineExceeded as e:
+                document_limited = page_timeout is None or (
+                    deadline.seconds is not None and timeout < page_timeout
+                )
+                scope = "document" if document_limited else "page"
+                limit = deadline.seconds if document_limited else page_timeout
+                error_msg = f"第 {i} 頁處理超時（{'文件' if document_limited else '單頁'}時限 {limit:.0f} 秒）"
+                logger.error(error_msg)
+                page["status"] = "timeout"
+                page["error"] = error_msg
+                page["timeout"] = {"scope": scope, "limit_seconds": limit}
+                # 逾時的執行緒仍在使用引擎，下一頁開始前再決定沿用或重建
+                self._abandoned = (self.ocr_engine, e.worker)
+                self.ocr_engine = None
                 
             except Exception as e:
                 error_msg = f"第 {i} 頁處理失敗: {str(e)}"
                 logger.error(error_msg)
                 import traceback
                 logger.error(f"詳細錯誤: {traceback.format_exc()}")
-                all_text.append(f"--- 第 {i} 頁 ---\n[錯誤: {error_msg}]")
-                all_layouts.append([])
+                page["status"] = "error"
+                page["error"] = error_msg
+            
+            # 清理記憶體（釋放已處理的頁面）
+            image = None
+            import gc
+            gc.collect()
+            
+            yield page
+    
+    def _ensure_engine(self, deadline: Deadline):
+        """
+        確保有可用的引擎
         
-        processing_time = time.time() - start_time
-        logger.info(f"✓ 處理完成，耗時 {processing_time:.2f} 秒")
+        上一頁逾時時，先在 ENGINE_RECOVERY_GRACE 秒內（不超過文件剩餘時間）等待放棄的執行緒結束，
+        結束後沿用原本的引擎，只有仍未結束時才重新載入 PaddleOCR，避免連續逾時時引擎不斷累積。
+        """
+        if self.ocr_engine is not None:
+            return
+        
+        if self._abandoned is not None:
+            engine, worker = self._abandoned
+            self._abandoned = None
+            worker.join(deadline.limit(ENGINE_RECOVERY_GRACE))
+            if not worker.is_alive():
+                logger.info("逾時的頁面已結束，沿用原本的 OCR 引擎")
+                self.ocr_engine = engine
+                return
+            logger.warning(f"逾時的頁面仍在執行，放棄原本的 OCR 引擎並重新初始化 (語言: {self.lang})")
+        
+        logger.info("OCR 引擎未初始化，正在初始化...")
+        self._initialize_engine()
+    
+    def process_images(
+        self,
+        images: Iterable[Union[PageImage, TextLayerPage, None]],
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        page_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        page_timeout: Optional[float] = DEFAULT_PAGE_TIMEOUT,
+        deadline: Optional[Deadline] = None,
+        page_cache: Optional[OCRResultCache] = None
+    ) -> Tuple[str, List[List[dict]]]:
+        """
+        處理多張圖像
         
-        combined_text = "\n\n".join(all_text)
-        return combined_text, all_layouts
+        Args:
+            images: 頁面圖像列表（PIL Image 或 BGR 陣列）
+            progress_callback: 每頁完成後呼叫 progress_callback(已完成頁數, 總頁數)
+            page_callback: 每頁完成後以該頁結果字典呼叫（用於串流回應）
+            page_timeout: 單頁逾時秒數
+            deadline: 整份文件的截止時間
+            page_cache: 單頁結果快取
+            
+        Returns:
+            (合併的文字, 每頁的佈局資訊)
+        """
+        return collect_pages(
+            self.iter_pages(images, page_timeout=page_timeout, deadline=deadline, page_cache=page_cache),
+            progress_callback,
+            page_callback
+        )
     
     def get_info(self) -> dict:
         """獲取服務資訊"""
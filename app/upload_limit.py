@@ -0,0 +1,69 @@
+"""
+Upload size limit
+ASGI middleware that refuses oversized upload requests from the Content-Length
+header before the multipart body is received, and stops bodies without a
+declared length as soon as they cross the limit
+"""
+
+import logging
+from typing import Callable, Dict
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# multipart 邊界與各欄位標頭預留的位元組數
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def too_large_detail(limit: int) -> str:
+    """請求內容過大的錯誤訊息"""
+    return f"檔案太大（最大 {limit / 1024 / 1024:.1f}MB）"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    上傳請求大小限制
+
+    FastAPI 在呼叫端點前就會接收並暫存整個 multipart 內容，端點內的大小檢查無法節省頻寬與磁碟，
+    因此在中介層依 Content-Length 直接拒絕；未提供 Content-Length（分塊傳輸）時，
+    邊接收邊累計，超過上限時中止解析並回應 413。
+    """
+
+    def __init__(self, app, limits: Dict[str, Callable[[], int]]):
+        """
+        Args:
+            app: ASGI 應用
+            limits: 路徑 → 回傳該路徑檔案內容上限（位元組）的函數，請求內容另外容許 MULTIPART_OVERHEAD
+        """
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.limits:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits[scope["path"]]()
+        body_limit = limit + MULTIPART_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > body_limit:
+            logger.warning(f"拒絕過大的上傳請求: {scope['path']} ({int(content_length)} 位元組)")
+            response = JSONResponse({"detail": too_large_detail(limit)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > body_limit:
+                    # 於解析請求內容時拋出，由 FastAPI 轉為 413 回應
+                    raise HTTPException(status_code=413, detail=too_large_detail(limit))
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -4,17 +4,614 @@ Mainly handles PDF to image conversion and other preprocessing tasks
 """
 
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import hashlib
 import io
 import logging
+import os
+import queue
+import re
+import threading
 
 logger = logging.getLogger(__name__)
 
+# PDF 渲染解析度（影響 OCR 結果，同時是結果快取鍵的一部分）
+DEFAULT_PDF_DPI = 100  # Significantly reduced DPI for faster processing
+
+# 渲染後頁面的最長邊上限（像素），節省記憶體
+MAX_RENDER_SIZE = 1200
+
+# PDF 渲染模式：fixed 固定 DPI；adaptive 依頁面字級調整每頁縮放，並受整份文件的像素預算限制
+RENDER_MODE_FIXED = "fixed"
+RENDER_MODE_ADAPTIVE = "adaptive"
+
+# adaptive 模式：小字渲染後的目標高度（像素）與縮放範圍
+ADAPTIVE_TARGET_TEXT_PX = 20
+ADAPTIVE_MIN_ZOOM = 1.0  # 72 DPI
+ADAPTIVE_MAX_ZOOM = 300 / 72  # 300 DPI
+ADAPTIVE_MAX_RENDER_SIZE = 2400
+
+# adaptive 模式：每頁平均像素預算（整份文件共用，稀疏頁面省下的預算留給密集頁面）
+DEFAULT_PIXEL_BUDGET = 1_500_000
+
+# 文字層快速路徑：可直接使用內嵌文字的門檻
+TEXT_LAYER_MIN_CHARS = 20  # 文字層字元數下限
+TEXT_LAYER_MIN_VALID_RATIO = 0.9  # 可讀字元（非替代字元、控制字元、私用區）比例下限
+TEXT_LAYER_MAX_IMAGE_COVERAGE = 0.5  # 圖片覆蓋頁面面積比例上限（超過時可能是掃描頁面）
+
+# 檔案開頭的 magic bytes -> (MIME 類型, 副檔名)
+FILE_SIGNATURES = (
+    (b"%PDF-", ("application/pdf", "pdf")),
+    (b"\x89PNG\r\n\x1a\n", ("image/png", "png")),
+    (b"\xff\xd8\xff", ("image/jpeg", "jpg")),
+    (b"BM", ("image/bmp", "bmp")),
+    (b"II*\x00", ("image/tiff", "tiff")),
+    (b"MM\x00*", ("image/tiff", "tiff")),
+)
+
+# PDF 規範允許檔頭前有少量其他資料
+PDF_HEADER_SEARCH_BYTES = 1024
+
+
+class TextLayerPage:
+    """直接從 PDF 文字層取得的頁面結果（不需 OCR）"""
+
+    def __init__(self, text: str, layout: List[dict]):
+        self.text = text
+        self.layout = layout
+
+# 頁面圖像：PIL Image 或 BGR 格式的 NumPy 陣列 (高, 寬, 3)
+PageImage = Union[Image.Image, np.ndarray]
+
+# PDF 來源：檔案內容，或檔案路徑（由 MuPDF 依需要從檔案讀取，不必整份載入記憶體）
+PDFSource = Union[bytes, str, os.PathLike]
+
+# PDF 物件中的間接參照（例如 "12 0 R"），計算內容雜湊時忽略各文件不同的物件編號
+PDF_XREF_REFERENCE = re.compile(r"\b\d+\s+\d+\s+R\b")
+
+# PyMuPDF 不保證多執行緒安全，所有渲染呼叫依序進行（單頁渲染僅需數十毫秒）
+_render_lock = threading.Lock()
+
+
+def get_render_zoom(page: "fitz.Page", dpi: int = DEFAULT_PDF_DPI, max_size: int = MAX_RENDER_SIZE) -> float:
+    """
+    計算頁面的渲染縮放係數，直接以不超過 max_size 的尺寸渲染（不必先渲染再縮小）
+
+    Args:
+        page: PyMuPDF 頁面
+        dpi: 渲染解析度
+        max_size: 最長邊上限（像素）
+
+    Returns:
+        縮放係數
+    """
+    zoom = dpi / 72  # 72 是 PDF 的預設 DPI
+    longest = max(page.rect.width, page.rect.height)
+    if longest * zoom > max_size:
+        zoom = max_size / longest
+    return zoom
+
+
+def estimate_text_size(page: "fitz.Page", content: Optional[dict] = None) -> Optional[float]:
+    """
+    從文字層估計頁面上需要辨識的小字字級（以字元數加權的第 25 百分位數）
+
+    Args:
+        page: PyMuPDF 頁面
+        content: 已讀取的 page.get_text("dict") 結果，None 時重新讀取
+
+    Returns:
+        字級（點），沒有文字層（例如掃描頁面）時為 None
+    """
+    if content is None:
+        content = page.get_text("dict")
+    sizes = []
+    for block in content.get("blocks", []):
+        for line in block.get("lines", []):
+            for span in line.get("spans", []):
+                chars = len(span.get("text", "").strip())
+                if chars > 0 and span.get("size", 0) > 0:
+                    sizes.append((span["size"], chars))
+
+    total_chars = sum(chars for _, chars in sizes)
+    if total_chars == 0:
+        return None
+
+    sizes.sort()
+    threshold = total_chars * 0.25
+    seen = 0
+    for size, chars in sizes:
+        seen += chars
+        if seen >= threshold:
+            return size
+    return sizes[-1][0]
+
+
+def estimate_image_zoom(page: "fitz.Page", content: Optional[dict] = None) -> Optional[float]:
+    """
+    從頁面中面積最大的圖片估計掃描解析度對應的縮放係數（以高於原始解析度渲染不會增加資訊）
+
+    Args:
+        page: PyMuPDF 頁面
+        content: 已讀取的 page.get_text("dict") 結果，None 時重新讀取
+
+    Returns:
+        縮放係數，頁面沒有圖片時為 None
+    """
+    if content is None:
+        content = page.get_text("dict")
+    largest_area, zoom = 0.0, None
+    for block in content.get("blocks", []):
+        if block.get("type") != 1 or not block.get("width"):
+            continue
+        x0, y0, x1, y1 = block["bbox"]
+        area = max(0.0, x1 - x0) * max(0.0, y1 - y0)
+        if area > largest_area:
+            largest_area, zoom = area, block["width"] / max(x1 - x0, 1)
+    return zoom
+
+
+def plan_render_zooms(
+    page_metrics: List[Tuple[float, float, Optional[float], Optional[float]]],
+    dpi: int = DEFAULT_PDF_DPI,
+    pixel_budget: int = DEFAULT_PIXEL_BUDGET
+) -> List[float]:
+    """
+    adaptive 模式：依各頁字級（掃描頁面依圖片解析度）決定縮放係數，總像素數不超過 pixel_budget x 頁數
+
+    Args:
+        page_metrics: 需要渲染的每頁 (寬, 高, 字級, 圖片縮放係數)，單位為點；
+            字級 None 表示沒有文字層，圖片縮放係數 None 表示沒有圖片
+        dpi: 兩者皆無的頁面使用的解析度
+        pixel_budget: 每頁平均像素預算
+
+    Returns:
+        每頁的縮放係數
+    """
+    zooms = []
+    for width, height, text_size, image_zoom in page_metrics:
+        if text_size:
+            zoom = ADAPTIVE_TARGET_TEXT_PX / text_size
+        elif image_zoom:
+            zoom = image_zoom
+        else:
+            zoom = dpi / 72
+        zoom = min(max(zoom, ADAPTIVE_MIN_ZOOM), ADAPTIVE_MAX_ZOOM)
+        zoom = min(zoom, ADAPTIVE_MAX_RENDER_SIZE / max(width, height, 1))
+        zooms.append(zoom)
+
+    # 超過整份文件的像素預算時等比例縮小所有頁面
+    total_pixels = sum(width * height * zoom ** 2 for (width, height, *_), zoom in zip(page_metrics, zooms))
+    budget = pixel_budget * len(page_metrics)
+    if total_pixels > budget > 0:
+        scale = (budget / total_pixels) ** 0.5
+        zooms = [zoom * scale for zoom in zooms]
+
+    return zooms
+
+
+def _hash_pdf_resource(document: fitz.Document, xref: int) -> bytes:
+    """PDF 資源物件（圖片、表單、字型、註解）的內容雜湊"""
+    digest = hashlib.sha256(PDF_XREF_REFERENCE.sub("R", document.xref_object(xref, compressed=True)).encode("utf-8"))
+    if document.xref_is_stream(xref):
+        digest.update(document.xref_stream_raw(xref) or b"")
+    elif document.xref_get_key(xref, "Type")[1] == "/Font":
+        digest.update(document.extract_font(xref)[3] or b"")
+    return digest.digest()
+
+
+def hash_pdf_page(page: "fitz.Page", render_settings: str, resource_hashes: Dict[int, bytes]) -> str:
+    """
+    計算 PDF 頁面來源內容的 SHA-256（內容串流與引用的圖片、表單、字型、註解，加上渲染設定）
+
+    與渲染後的圖像無關：adaptive 模式下縮放係數隨整份文件的像素預算改變時，內容未變的頁面雜湊不變。
+
+    Args:
+        page: PyMuPDF 頁面
+        render_settings: 影響渲染結果、但與其他頁面無關的設定（例如 DPI 與渲染模式）
+        resource_hashes: 同一份文件中已計算的資源雜湊（xref → 雜湊），多頁共用的資源只讀取一次
+
+    Returns:
+        十六進位雜湊字串
+    """
+    document = page.parent
+    digest = hashlib.sha256(f"pdf-page|{render_settings}|{tuple(page.rect)}|{page.rotation}|".encode("utf-8"))
+    digest.update(page.read_contents())
+
+    resources = []
+    for xref, smask, *_, name, _, _ in page.get_images(full=True):
+        resources.append((name, xref))
+        if smask:
+            resources.append((f"{name}/SMask", smask))
+    resources += [(name, xref) for xref, name, *_ in page.get_xobjects()]
+    resources += [(name, xref) for xref, _, _, _, name, *_ in page.get_fonts(full=True)]
+    resources += [(f"annot{i}", annot.xref) for i, annot in enumerate(page.annots())]
+
+    for name, xref in sorted(resources):
+        if xref not in resource_hashes:
+            resource_hashes[xref] = _hash_pdf_resource(document, xref)
+        digest.update(name.encode("utf-8"))
+        digest.update(resource_hashes[xref])
+    return digest.hexdigest()
+
+
+def _is_valid_char(char: str) -> bool:
+    """文字層字元是否可讀（排除替代字元、控制字元與私用區字元）"""
+    code = ord(char)
+    if char == "\ufffd" or 0xE000 <= code <= 0xF8FF:
+        return False
+    return char.isprintable()
+
+
+def extract_text_layer(page: "fitz.Page", zoom: float, content: Optional[dict] = None) -> Optional[TextLayerPage]:
+    """
+    讀取頁面內嵌的文字層，品質足夠時轉換為與 OCR 相同格式的文字與佈局資訊
+
+    Args:
+        page: PyMuPDF 頁面
+        zoom: 渲染縮放係數（bbox 轉換為與渲染圖像相同的像素座標）
+        content: 已讀取的 page.get_text("dict") 結果，None 時重新讀取
+
+    Returns:
+        TextLayerPage；文字過少、亂碼過多或頁面主要是圖片時為 None（改用 OCR）
+    """
+    if content is None:
+        content = page.get_text("dict")
+    page_area = max(page.rect.width * page.rect.height, 1)
+
+    lines = []
+    image_area = 0.0
+    for block in content.get("blocks", []):
+        if block.get("type") == 1:
+            x0, y0, x1, y1 = block["bbox"]
+            image_area += max(0.0, x1 - x0) * max(0.0, y1 - y0)
+            continue
+        for line in block.get("lines", []):
+            text = "".join(span.get("text", "") for span in line.get("spans", [])).strip()
+            if text:
+                lines.append((text, line["bbox"]))
+
+    chars = [char for text, _ in lines for char in text if not char.isspace()]
+    if len(chars) < TEXT_LAYER_MIN_CHARS:
+        return None
+    if sum(_is_valid_char(char) for char in chars) / len(chars) < TEXT_LAYER_MIN_VALID_RATIO:
+        return None
+    if image_area / page_area > TEXT_LAYER_MAX_IMAGE_COVERAGE:
+        return None
+
+    layout = []
+    for text, (x0, y0, x1, y1) in lines:
+        bbox = [x0 * zoom, y0 * zoom, x1 * zoom, y1 * zoom]
+        layout.append({
+            "text": text,
+            "bbox": bbox,
+            "confidence": 1.0,
+            "y_position": (bbox[1] + bbox[3]) / 2,
+            "x_position": (bbox[0] + bbox[2]) / 2
+        })
+
+    text_lines = [entry["text"] for entry in layout]
+    layout.sort(key=lambda x: (x["y_position"], x["x_position"]))
+    return TextLayerPage("\n".join(text_lines), layout)
+
+
+def render_page_to_array(page: "fitz.Page", zoom: float) -> np.ndarray:
+    """
+    將 PDF 頁面渲染為 BGR 格式的 NumPy 陣列
+
+    直接讀取 pixmap 的 samples 緩衝區（依 stride 建立檢視），
+    RGB -> BGR 的通道反轉是唯一一次整頁複製，不經過 PNG 編碼/解碼。
+
+    Args:
+        page: PyMuPDF 頁面
+        zoom: 縮放係數
+
+    Returns:
+        連續記憶體的 uint8 陣列 (高, 寬, 3)
+    """
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csRGB, alpha=False)
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    rgb = rows[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    # 複製到獨立的記憶體，pixmap 釋放後陣列仍然有效
+    return np.ascontiguousarray(rgb[:, :, ::-1])
+
+
+def to_bgr_array(image: PageImage) -> np.ndarray:
+    """將頁面圖像轉換為 OCR 引擎使用的 BGR 陣列（已是陣列時不複製）"""
+    if isinstance(image, np.ndarray):
+        return image
+    return np.array(image.convert('RGB'))[:, :, ::-1]
+
+
+def describe_image(image: PageImage) -> str:
+    """頁面圖像的尺寸與格式描述（用於日誌）"""
+    if isinstance(image, np.ndarray):
+        return f"{image.shape[1]}x{image.shape[0]}, BGR 陣列"
+    return f"{image.width}x{image.height}, 模式: {image.mode}"
+
+
+def open_pdf(pdf: PDFSource) -> fitz.Document:
+    """
+    開啟 PDF（呼叫端須持有 _render_lock）
+
+    Args:
+        pdf: 檔案內容或檔案路徑
+
+    Returns:
+        fitz.Document
+    """
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(os.fspath(pdf), filetype="pdf")
+
+
+def iter_pdf_pages(
+    pdf: PDFSource,
+    dpi: int = DEFAULT_PDF_DPI,
+    max_pages: Optional[int] = None,
+    render_mode: str = RENDER_MODE_FIXED,
+    pixel_budget: int = DEFAULT_PIXEL_BUDGET,
+    text_layer: bool = False,
+    page_sources: Optional[Dict[int, Tuple[str, float]]] = None
+) -> Iterator[Union[np.ndarray, TextLayerPage, None]]:
+    """
+    逐頁渲染 PDF，每次只持有一頁的陣列
+
+    Args:
+        pdf: PDF 檔案內容或檔案路徑
+        dpi: 渲染解析度（fixed 模式，以及 adaptive 模式下沒有文字與圖片的頁面）
+        max_pages: 最多處理的頁數，None 表示全部
+        render_mode: fixed 或 adaptive
+        pixel_budget: adaptive 模式中需要渲染的頁面的每頁平均像素預算
+        text_layer: 是否優先使用內嵌文字層（品質足夠的頁面不渲染、不 OCR）
+        page_sources: 傳入時記錄每個渲染頁面的 (來源雜湊, 縮放係數)，頁碼從 0 起算（單頁結果快取使用）
+
+    Yields:
+        BGR 格式的 NumPy 陣列；使用文字層的頁面為 TextLayerPage；渲染失敗的頁面為 None（頁碼不變）
+
+    Raises:
+        ValueError: PDF 無法開啟
+    """
+    try:
+        with _render_lock:
+            pdf_document = open_pdf(pdf)
+    except Exception as e:
+        logger.error(f"PDF 開啟失敗: {str(e)}")
+        raise ValueError(f"無法處理 PDF 檔案: {str(e)}")
+
+    try:
+        total_pages = len(pdf_document)
+        pages_to_process = total_pages if max_pages is None else min(total_pages, max_pages)
+
+        if pages_to_process < total_pages:
+            logger.warning(f"PDF 頁數 ({total_pages}) 超過限制 ({max_pages})，僅處理前 {max_pages} 頁")
+
+        zooms = None
+        text_pages: Dict[int, TextLayerPage] = {}
+        if render_mode == RENDER_MODE_ADAPTIVE:
+            # 先讀取各頁內容（不渲染）：使用文字層的頁面不佔像素預算，其餘頁面依字級或圖片解析度分配預算
+            rendered, metrics = [], []
+            with _render_lock:
+                for page_num in range(pages_to_process):
+                    page = pdf_document[page_num]
+                    content = page.get_text("dict")
+                    text_page = extract_text_layer(page, get_render_zoom(page, dpi), content) if text_layer else None
+                    if text_page is not None:
+                        text_pages[page_num] = text_page
+                        continue
+                    rendered.append(page_num)
+                    metrics.append((
+                        page.rect.width,
+                        page.rect.height,
+                        estimate_text_size(page, content),
+                        estimate_image_zoom(page, content)
+                    ))
+            zooms = dict(zip(rendered, plan_render_zooms(metrics, dpi, pixel_budget)))
+            if zooms:
+                logger.info(
+                    f"adaptive 渲染：{len(zooms)} 頁需渲染，縮放係數 "
+                    f"{min(zooms.values()):.2f} ~ {max(zooms.values()):.2f}"
+                )
+
+        render_settings = f"dpi={dpi}|mode={render_mode}"
+        resource_hashes: Dict[int, bytes] = {}
+        for page_num in range(pages_to_process):
+            try:
+                item = text_pages.pop(page_num, None)
+                if item is None:
+                    with _render_lock:
+                        page = pdf_document[page_num]
+                        zoom = zooms[page_num] if zooms is not None else get_render_zoom(page, dpi)
+                        if zooms is None and text_layer:
+                            item = extract_text_layer(page, zoom)
+                        if item is None:
+                            item = render_page_to_array(page, zoom)
+                            if page_sources is not None:
+                                try:
+                                    page_hash = hash_pdf_page(page, render_settings, resource_hashes)
+                                    page_sources[page_num] = (page_hash, zoom)
+                                except Exception as hash_error:
+                                    logger.warning(f"第 {page_num + 1} 頁來源雜湊計算失敗，不使用單頁快取: {str(hash_error)}")
+                if isinstance(item, TextLayerPage):
+                    logger.info(f"✓ 第 {page_num + 1} 頁使用文字層（{len(item.layout)} 行），略過 OCR")
+                else:
+                    logger.info(f"✓ 第 {page_num + 1} 頁渲染完成，尺寸: {item.shape[1]}x{item.shape[0]}")
+            except Exception as page_error:
+                logger.error(f"第 {page_num + 1} 頁渲染失敗: {str(page_error)}")
+                item = None
+            yield item
+    finally:
+        with _render_lock:
+            pdf_document.close()
+
+
+def count_pdf_pages(pdf: PDFSource) -> int:
+    """
+    讀取 PDF 頁數（不渲染）
+
+    Raises:
+        ValueError: PDF 無法開啟
+    """
+    try:
+        with _render_lock:
+            with open_pdf(pdf) as pdf_document:
+                return len(pdf_document)
+    except Exception as e:
+        logger.error(f"PDF 開啟失敗: {str(e)}")
+        raise ValueError(f"無法處理 PDF 檔案: {str(e)}")
+
+
+def prefetch(iterable: Iterable, depth: int = 1) -> Iterator:
+    """
+    在背景執行緒中提前產生最多 depth 個項目（例如在 OCR 第 N 頁時渲染第 N+1 頁）
+
+    消費端提早結束時會通知背景執行緒停止，並關閉來源產生器。
+
+    Args:
+        iterable: 來源
+        depth: 預先產生的項目數量，0 表示不預取
+
+    Yields:
+        來源的項目（順序不變）
+    """
+    if depth <= 0:
+        yield from iterable
+        return
+
+    items: "queue.Queue" = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        source = iter(iterable)
+        try:
+            for item in source:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except BaseException as e:
+            put(("error", e))
+        finally:
+            if hasattr(source, "close"):
+                source.close()
+
+    producer = threading.Thread(target=produce, name="page-prefetch", daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+class PDFPageSource:
+    """
+    延遲渲染的 PDF 頁面序列
+
+    len() 為要處理的頁數；迭代時逐頁渲染並預取少量頁面，
+    已處理的頁面不會被保留，記憶體用量與文件頁數無關。
+    """
+
+    def __init__(
+        self,
+        pdf: PDFSource,
+        dpi: int = DEFAULT_PDF_DPI,
+        max_pages: Optional[int] = None,
+        prefetch_pages: int = 1,
+        render_mode: str = RENDER_MODE_FIXED,
+        pixel_budget: int = DEFAULT_PIXEL_BUDGET,
+        text_layer: bool = False
+    ):
+        """
+        Args:
+            pdf: PDF 檔案內容或檔案路徑（路徑可避免將整份文件讀入記憶體）
+            dpi: 渲染解析度
+            max_pages: 最多處理的頁數，None 表示全部
+            prefetch_pages: 預先渲染的頁數
+            render_mode: fixed 或 adaptive
+            pixel_budget: adaptive 模式的每頁平均像素預算
+            text_layer: 是否優先使用內嵌文字層
+
+        Raises:
+            ValueError: PDF 無法開啟
+        """
+        self.pdf = pdf
+        self.dpi = dpi
+        self.prefetch_pages = prefetch_pages
+        self.render_mode = render_mode
+        self.pixel_budget = pixel_budget
+        self.text_layer = text_layer
+        # 已渲染頁面的 (來源雜湊, 縮放係數)，迭代時由渲染執行緒在產生該頁之前寫入
+        self.page_sources: Dict[int, Tuple[str, float]] = {}
+
+        total_pages = count_pdf_pages(pdf)
+        self.max_pages = total_pages if max_pages is None else min(total_pages, max_pages)
+        logger.info(f"PDF 總頁數: {total_pages}，將逐頁渲染 {self.max_pages} 頁 (模式: {render_mode}, DPI: {dpi})")
+
+    def __len__(self) -> int:
+        return self.max_pages
+
+    def __iter__(self) -> Iterator[Union[np.ndarray, TextLayerPage, None]]:
+        pages = iter_pdf_pages(
+            self.pdf, self.dpi, self.max_pages,
+            self.render_mode, self.pixel_budget, self.text_layer,
+            self.page_sources
+        )
+        return prefetch(pages, self.prefetch_pages)
+
+
+def get_page_source(images: Iterable, index: int) -> Optional[Tuple[str, float]]:
+    """
+    取得頁面的 (來源雜湊, 縮放係數)
+
+    Args:
+        images: 頁面圖像序列（PDFPageSource 迭代時記錄來源雜湊）
+        index: 頁碼（從 0 起算，該頁須已產生）
+
+    Returns:
+        (來源雜湊, 縮放係數)，非 PDF 來源時為 None
+    """
+    return getattr(images, "page_sources", {}).get(index)
+
+
+def convert_pdf_to_arrays(
+    pdf_bytes: PDFSource,
+    dpi: int = DEFAULT_PDF_DPI,
+    max_pages: int = 10
+) -> List[np.ndarray]:
+    """
+    將 PDF 一次轉換為 BGR 陣列列表（可直接交給 OCR 引擎）
+
+    Args:
+        pdf_bytes: PDF 檔案內容或檔案路徑
+        dpi: 渲染解析度
+        max_pages: 最多處理的頁數
+
+    Returns:
+        BGR 格式的 NumPy 陣列列表（略過渲染失敗的頁面）
+    """
+    return [array for array in iter_pdf_pages(pdf_bytes, dpi, max_pages) if array is not None]
+
 
 def convert_pdf_to_images(
     pdf_bytes: bytes,
-    dpi: int = 100,  # Significantly reduced DPI for faster processing
+    dpi: int = DEFAULT_PDF_DPI,
     max_pages: int = 10  # Significantly reduced maximum page limit
 ) -> List[Image.Image]:
     """
@@ -188,6 +785,54 @@ def reconstruct_layout_for_txt(layout_info: List[dict], page_width: int = 100) -
     return "\n".join(lines)
 
 
+def simplify_layout_info(
+    all_layouts: List[List[dict]],
+    max_pages: int = 5,
+    max_items_per_page: int = 10
+) -> List[dict]:
+    """
+    將每頁的佈局資訊簡化為扁平列表（避免 API 回應過大）
+    
+    Args:
+        all_layouts: 每頁的佈局資訊
+        max_pages: 最多返回的頁數
+        max_items_per_page: 每頁最多返回的項目數
+        
+    Returns:
+        帶有 page 欄位的佈局資訊列表
+    """
+    simplified_layout = []
+    for page_idx, page_layout in enumerate(all_layouts[:max_pages]):
+        for item in page_layout[:max_items_per_page]:
+            simplified_layout.append({
+                "page": page_idx,
+                "text": item["text"],
+                "confidence": item["confidence"],
+                "bbox": item.get("bbox", []),
+                "y_position": item.get("y_position", 0),
+                "x_position": item.get("x_position", 0)
+            })
+    return simplified_layout
+
+
+def sniff_file_type(header: bytes) -> Optional[Tuple[str, str]]:
+    """
+    依檔案開頭的 magic bytes 判斷檔案類型
+
+    Args:
+        header: 檔案開頭的內容（至少數個位元組）
+
+    Returns:
+        (MIME 類型, 副檔名)，不支援的類型為 None
+    """
+    for signature, file_type in FILE_SIGNATURES:
+        if header.startswith(signature):
+            return file_type
+    if b"%PDF-" in header[:PDF_HEADER_SEARCH_BYTES]:
+        return "application/pdf", "pdf"
+    return None
+
+
 def validate_file_type(filename: str, content_type: str) -> bool:
     """
     驗證檔案類型
@@ -0,0 +1,68 @@
+"""
+效能測試共用工具
+"""
+
+import os
+import sys
+import time
+from typing import Callable, List
+
+from PIL import Image, ImageDraw
+
+# 讓腳本可以直接以 python benchmarks/xxx.py 執行
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def print_separator(char="=", length=60):
+    """列印分隔線"""
+    print(char * length)
+
+
+def print_section(title):
+    """列印章節標題"""
+    print_separator()
+    print(f"  {title}")
+    print_separator()
+
+
+def create_text_page(page_number: int, width: int = 1000, height: int = 1300, lines: int = 40) -> Image.Image:
+    """創建一張含多行文字的測試頁面"""
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for line in range(lines):
+        draw.text(
+            (60, 60 + line * 30),
+            f"Page {page_number} line {line + 1}: The quick brown fox jumps over the lazy dog.",
+            fill="black"
+        )
+    return image
+
+
+def create_sample_pdf(path: str, pages: int = 10, lines: int = 40) -> str:
+    """創建一份含文字層的測試 PDF"""
+    import fitz  # PyMuPDF
+
+    document = fitz.open()
+    for page_number in range(1, pages + 1):
+        page = document.new_page()
+        for line in range(lines):
+            page.insert_text(
+                (50, 60 + line * 18),
+                f"Page {page_number} line {line + 1}: The quick brown fox jumps over the lazy dog.",
+                fontsize=9
+            )
+    document.save(path)
+    document.close()
+    return path
+
+
+def time_call(fn: Callable, repeat: int = 1) -> List[float]:
+    """重複執行函數並回傳每次的耗時（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start_time)
+    return timings
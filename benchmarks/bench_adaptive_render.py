@@ -0,0 +1,144 @@
+"""
+adaptive PDF 渲染效能測試
+比較 fixed（固定 100 DPI）與 adaptive（依字級調整、受像素預算限制）兩種渲染模式的
+總像素數、渲染耗時，以及（加上 --ocr 時）OCR 耗時與相對於文字層的辨識準確度
+
+用法:
+    python benchmarks/bench_adaptive_render.py
+    python benchmarks/bench_adaptive_render.py --corpus ./papers --ocr --lang en
+"""
+
+import argparse
+import difflib
+import glob
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import fitz  # PyMuPDF
+
+from _common import print_section
+
+from app.utils import (
+    DEFAULT_PIXEL_BUDGET, RENDER_MODE_ADAPTIVE, RENDER_MODE_FIXED, iter_pdf_pages
+)
+
+# 合成語料：(名稱, 字級, 行數)，涵蓋小字表格、參考文獻、內文與投影片
+SYNTHETIC_PAGES = [
+    ("table", 6, 90),
+    ("references", 7.5, 75),
+    ("body", 10, 50),
+    ("body", 11, 45),
+    ("slide", 28, 6),
+]
+
+
+def create_corpus(directory: str) -> List[str]:
+    """產生含不同字級頁面的合成 PDF 語料"""
+    paths = []
+    for name, size, lines in SYNTHETIC_PAGES:
+        document = fitz.open()
+        for page_number in range(1, 3):
+            page = document.new_page()
+            for line in range(lines):
+                y = 40 + line * size * 1.25
+                if y > page.rect.height - 30:
+                    break
+                page.insert_text(
+                    (36, y),
+                    f"{name} {page_number}.{line + 1}: Recall 0.{line:02d} Precision 1.{line:02d} The quick brown fox",
+                    fontsize=size
+                )
+        path = os.path.join(directory, f"{name}_{size}.pdf")
+        document.save(path)
+        document.close()
+        paths.append(path)
+    return paths
+
+
+def normalize(text: str) -> str:
+    """去除頁碼標記與空白差異"""
+    text = re.sub(r"--- 第 \d+ 頁 ---", " ", text)
+    return " ".join(text.split())
+
+
+def text_layer(pdf_bytes: bytes) -> List[str]:
+    """以 PDF 文字層作為準確度基準"""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as document:
+        return [page.get_text() for page in document]
+
+
+def run_mode(pdf_bytes: bytes, mode: str, pixel_budget: int, service=None) -> Dict[str, float]:
+    """以指定模式渲染（及辨識）一份 PDF"""
+    stats = {"pixels": 0, "render": 0.0, "ocr": 0.0, "accuracy": 0.0}
+    truths = text_layer(pdf_bytes)
+    scores = []
+
+    pages = iter_pdf_pages(pdf_bytes, render_mode=mode, pixel_budget=pixel_budget)
+    for idx in range(len(truths)):
+        start_time = time.perf_counter()
+        array = next(pages)
+        stats["render"] += time.perf_counter() - start_time
+        stats["pixels"] += array.shape[0] * array.shape[1]
+
+        if service is not None:
+            start_time = time.perf_counter()
+            text, _ = service.process_image(array)
+            stats["ocr"] += time.perf_counter() - start_time
+            scores.append(difflib.SequenceMatcher(None, normalize(truths[idx]), normalize(text)).ratio())
+
+    if scores:
+        stats["accuracy"] = sum(scores) / len(scores)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="adaptive PDF 渲染效能測試")
+    parser.add_argument("--corpus", help="PDF 語料目錄（未指定時產生合成語料）")
+    parser.add_argument("--pixel-budget", type=int, default=DEFAULT_PIXEL_BUDGET, help="每頁平均像素預算")
+    parser.add_argument("--ocr", action="store_true", help="同時執行 OCR 並計算準確度（需要 PaddleOCR 模型）")
+    parser.add_argument("--lang", default="en", help="OCR 語言")
+    args = parser.parse_args()
+
+    service = None
+    if args.ocr:
+        from app.services_simple import SimpleOCRService
+        service = SimpleOCRService(lang=args.lang)
+        service._initialize_engine()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = sorted(glob.glob(os.path.join(args.corpus, "*.pdf"))) if args.corpus else create_corpus(tmp_dir)
+        corpus: List[Tuple[str, bytes]] = []
+        for path in paths:
+            with open(path, "rb") as f:
+                corpus.append((os.path.basename(path), f.read()))
+
+    print_section(f"adaptive PDF 渲染效能測試（{len(corpus)} 份文件，預算 {args.pixel_budget / 1e6:.1f}MP/頁）")
+
+    totals = {}
+    for mode in (RENDER_MODE_FIXED, RENDER_MODE_ADAPTIVE):
+        total = {"pixels": 0, "render": 0.0, "ocr": 0.0, "accuracy": 0.0}
+        for name, pdf_bytes in corpus:
+            stats = run_mode(pdf_bytes, mode, args.pixel_budget, service)
+            for key in ("pixels", "render", "ocr"):
+                total[key] += stats[key]
+            total["accuracy"] += stats["accuracy"] / len(corpus)
+
+            line = f"{mode:<9} {name:<22} {stats['pixels'] / 1e6:7.2f} MP  渲染 {stats['render'] * 1000:7.1f} ms"
+            if service is not None:
+                line += f"  OCR {stats['ocr']:6.2f} 秒  準確度 {stats['accuracy']:.3f}"
+            print(line)
+        totals[mode] = total
+
+    print_section("總計")
+    for mode, total in totals.items():
+        line = f"{mode:<9} {total['pixels'] / 1e6:8.2f} MP  渲染 {total['render'] * 1000:8.1f} ms"
+        if service is not None:
+            line += f"  OCR {total['ocr']:7.2f} 秒  平均準確度 {total['accuracy']:.3f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+頁面平行 OCR 效能測試
+比較逐頁處理（單一引擎）與行程池平行處理的整份文件耗時
+
+用法:
+    python benchmarks/bench_page_parallel.py --pages 10 --workers 2 4 8
+    python benchmarks/bench_page_parallel.py --pdf paper.pdf --workers 4
+"""
+
+import argparse
+
+from _common import create_text_page, print_section, time_call
+
+from app.parallel import ParallelPageProcessor
+from app.services_simple import SimpleOCRService
+from app.utils import convert_pdf_to_arrays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="頁面平行 OCR 效能測試")
+    parser.add_argument("--pdf", help="測試用 PDF（未指定時使用合成頁面）")
+    parser.add_argument("--pages", type=int, default=10, help="合成頁面數量")
+    parser.add_argument("--lang", default="en", help="OCR 語言")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4], help="平行行程數")
+    parser.add_argument("--repeat", type=int, default=3, help="每種設定重複次數")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            images = convert_pdf_to_arrays(f.read())
+    else:
+        images = [create_text_page(i) for i in range(1, args.pages + 1)]
+
+    print_section(f"頁面平行 OCR 效能測試（{len(images)} 頁）")
+
+    # 逐頁處理（引擎預先初始化，不計入耗時）
+    service = SimpleOCRService(lang=args.lang)
+    service._initialize_engine()
+    serial = min(time_call(lambda: service.process_images(images), args.repeat))
+    print(f"逐頁處理:        {serial:8.2f} 秒")
+
+    for workers in args.workers:
+        processor = ParallelPageProcessor(args.lang, workers=workers, page_timeout=600)
+        try:
+            # 先處理一次讓每個工作行程完成引擎預熱
+            processor.process_images(images[:workers])
+            parallel = min(time_call(lambda: processor.process_images(images), args.repeat))
+        finally:
+            processor.shutdown()
+        print(f"平行處理 x{workers:<3}:  {parallel:8.2f} 秒  (加速 {serial / parallel:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
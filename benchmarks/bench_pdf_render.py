@@ -0,0 +1,68 @@
+"""
+PDF 頁面渲染效能測試
+比較 PNG 編碼/解碼路徑（convert_pdf_to_images + PIL -> BGR 轉換）與
+直接讀取 pixmap 緩衝區的 BGR 陣列路徑（convert_pdf_to_arrays）的每頁耗時
+
+用法:
+    python benchmarks/bench_pdf_render.py --pages 20
+    python benchmarks/bench_pdf_render.py --pdf paper.pdf --repeat 5
+"""
+
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from _common import create_sample_pdf, print_section, time_call
+
+from app.utils import convert_pdf_to_arrays, convert_pdf_to_images, DEFAULT_PDF_DPI
+
+
+def render_via_png(pdf_bytes: bytes, max_pages: int):
+    """原本的路徑：PNG 往返後再轉換為 OCR 引擎使用的 BGR 陣列"""
+    return [
+        np.array(image.convert('RGB'))[:, :, ::-1]
+        for image in convert_pdf_to_images(pdf_bytes, max_pages=max_pages)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 頁面渲染效能測試")
+    parser.add_argument("--pdf", help="測試用 PDF（未指定時產生含文字層的合成 PDF）")
+    parser.add_argument("--pages", type=int, default=10, help="合成 PDF 頁數 / 最多渲染頁數")
+    parser.add_argument("--repeat", type=int, default=5, help="重複次數（取最小值）")
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = create_sample_pdf(os.path.join(tmp_dir, "sample.pdf"), pages=args.pages)
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+
+    before_pages = render_via_png(pdf_bytes, args.pages)
+    after_pages = convert_pdf_to_arrays(pdf_bytes, max_pages=args.pages)
+    page_count = len(after_pages)
+
+    print_section(f"PDF 頁面渲染效能測試（{page_count} 頁，DPI {DEFAULT_PDF_DPI}）")
+
+    before = min(time_call(lambda: render_via_png(pdf_bytes, args.pages), args.repeat))
+    after = min(time_call(lambda: convert_pdf_to_arrays(pdf_bytes, max_pages=args.pages), args.repeat))
+
+    print(f"PNG 往返 + BGR 轉換:  {before / page_count * 1000:8.2f} ms/頁")
+    print(f"直接渲染為 BGR 陣列:   {after / page_count * 1000:8.2f} ms/頁  (加速 {before / after:.2f}x)")
+
+    # 兩種路徑的輸出應一致（頁面未超過最長邊上限時逐像素相同）
+    for idx, (old, new) in enumerate(zip(before_pages, after_pages), 1):
+        if old.shape != new.shape:
+            print(f"第 {idx} 頁尺寸不同: {old.shape} vs {new.shape}")
+        elif not np.array_equal(old, new):
+            diff = np.abs(old.astype(np.int16) - new.astype(np.int16)).max()
+            print(f"第 {idx} 頁像素不同（最大差異 {diff}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -301,7 +301,7 @@ async function startOCR() {
         // 心跳檢測 - 每30秒檢查一次後端狀態
         heartbeatInterval = setInterval(async () => {
             try {
-                const statusResponse = await fetch('/api/status');
+                const statusResponse = await fetch('/healthz');
                 if (statusResponse.ok) {
                     console.log('✓ 後端服務正常運行');
                 } else {
@@ -312,7 +312,7 @@ async function startOCR() {
             }
         }, 30000); // 每30秒檢查一次
         
-        const response = await fetch('/api/process-ocr', {
+        const response = await fetch('/api/process-ocr/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -325,27 +325,52 @@ async function startOCR() {
             signal: controller.signal
         });
         
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || 'OCR 處理失敗');
+        }
+        
+        // 逐頁讀取 NDJSON 串流，每完成一頁就立即顯示
+        const ocrOutput = document.getElementById('ocr-output');
+        const pageTexts = [];
+        let data = null;
+        
+        ocrOutput.value = '';
+        document.getElementById('result-section').classList.remove('hidden');
+        
+        await readNdjsonStream(response, (event) => {
+            if (event.type === 'page') {
+                clearInterval(progressInterval);
+                const body = event.error ? `[錯誤: ${event.error}]` : (event.text || '');
+                pageTexts.push(`--- 第 ${event.page} 頁 ---\n${body}`);
+                ocrOutput.value = pageTexts.join('\n\n');
+                progressFill.style.width = `${Math.round(event.page / event.total_pages * 100)}%`;
+                progressText.textContent = `已完成第 ${event.page}/${event.total_pages} 頁`;
+            } else if (event.type === 'done') {
+                data = event;
+            } else if (event.type === 'error') {
+                throw new Error(event.detail || 'OCR 處理失敗');
+            }
+        });
+        
         clearTimeout(timeoutId);
         if (heartbeatInterval) {
             clearInterval(heartbeatInterval); // 清除心跳檢測
         }
         
-        const data = await response.json();
-        
         clearInterval(progressInterval);
         progressFill.style.width = '100%';
         progressText.textContent = '處理完成！';
         
-        if (response.ok && data.success) {
+        if (data) {
             appState.ocrRawText = data.raw_text;
             
             // 顯示結果
-            document.getElementById('ocr-output').value = data.raw_text;
+            ocrOutput.value = data.raw_text;
             document.getElementById('processing-time').textContent = `${data.processing_time.toFixed(2)} 秒`;
             document.getElementById('char-count').textContent = data.raw_text.length.toLocaleString();
             
             // 顯示結果區域
-            document.getElementById('result-section').classList.remove('hidden');
             document.getElementById('metadata-section').classList.remove('hidden');
             document.getElementById('ai-section').classList.remove('hidden');
             
@@ -355,7 +380,7 @@ async function startOCR() {
             // 滾動到結果區
             document.getElementById('result-section').scrollIntoView({ behavior: 'smooth' });
         } else {
-            throw new Error(data.detail || 'OCR 處理失敗');
+            throw new Error('OCR 串流意外中斷');
         }
     } catch (error) {
         clearInterval(progressInterval);
@@ -386,6 +411,32 @@ async function startOCR() {
     }
 }
 
+// 讀取 NDJSON 串流回應，每解析出一行就呼叫 onEvent
+async function readNdjsonStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        
+        for (const line of lines) {
+            if (line.trim()) {
+                onEvent(JSON.parse(line));
+            }
+        }
+    }
+    
+    if (buffer.trim()) {
+        onEvent(JSON.parse(buffer));
+    }
+}
+
 // ============================================================================
 // Metadata 管理
 // ============================================================================
@@ -512,7 +563,7 @@ async function processWithAI() {
             customPrompt = document.getElementById('prompt-text').value;
         }
         
-        const response = await fetch('/api/enhance-with-gemini', {
+        const response = await fetch('/api/enhance-with-gemini/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -520,19 +571,43 @@ async function processWithAI() {
             body: JSON.stringify({
                 text: appState.ocrRawText,
                 prompt_type: promptType,
-                custom_prompt: customPrompt
+                custom_prompt: customPrompt,
+                file_id: appState.currentFileId
             })
         });
         
-        const data = await response.json();
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || 'AI 處理失敗');
+        }
         
-        if (response.ok && data.success) {
-            appState.processedText = data.processed_text;
-            await generateFinalMarkdown();
-            showToast('AI 處理完成！', 'success');
-        } else {
-            throw new Error(data.detail || 'AI 處理失敗');
+        // 逐段讀取 NDJSON 串流，模型每產生一段文字就立即顯示
+        const aiOutput = document.getElementById('ai-output');
+        let data = null;
+        
+        aiOutput.value = '';
+        aiOutput.classList.remove('hidden');
+        
+        await readNdjsonStream(response, (event) => {
+            if (event.type === 'delta') {
+                progress.classList.add('hidden');
+                aiOutput.value += event.text;
+                aiOutput.scrollTop = aiOutput.scrollHeight;
+            } else if (event.type === 'done') {
+                data = event;
+            } else if (event.type === 'error') {
+                throw new Error(event.detail || 'AI 處理失敗');
+            }
+        });
+        
+        if (!data) {
+            throw new Error('Gemini 串流意外中斷');
         }
+        
+        appState.processedText = data.processed_text;
+        aiOutput.value = data.processed_text;
+        await generateFinalMarkdown();
+        showToast('AI 處理完成！', 'success');
     } catch (error) {
         showToast(`AI 處理失敗: ${error.message}`, 'error');
         console.error(error);
@@ -744,6 +819,10 @@ async function restartProcess() {
     appState.markdownContent = null;
     appState.txtContent = null;
     
+    const aiOutput = document.getElementById('ai-output');
+    aiOutput.value = '';
+    aiOutput.classList.add('hidden');
+    
     // 隱藏所有區塊
     document.querySelectorAll('.section').forEach(section => {
         if (section.id !== 'upload-section') {
@@ -7,6 +7,19 @@ from PIL import Image
 import numpy as np
 
 
+@pytest.fixture(autouse=True)
+def isolated_storage(monkeypatch, tmp_path):
+    """文件記錄與快取的單例改用臨時目錄，避免測試寫入專案目錄"""
+    from app import document_store, llm_cache, result_cache
+
+    monkeypatch.setenv("DOCUMENT_STORE_PATH", str(tmp_path / "data" / "documents.db"))
+    monkeypatch.setenv("OCR_CACHE_DIR", str(tmp_path / "cache" / "ocr"))
+    monkeypatch.setenv("LLM_CACHE_DIR", str(tmp_path / "cache" / "llm"))
+    monkeypatch.setattr(document_store, "_document_store", None)
+    monkeypatch.setattr(result_cache, "_result_cache", None)
+    monkeypatch.setattr(llm_cache, "_llm_cache", None)
+
+
 def create_test_image(width=800, height=400):
     """創建一個測試圖像"""
     # 創建白色背景
@@ -129,6 +142,1666 @@ async def test_api_status_endpoint():
     assert "gemini_available" in data
 
 
+def test_ocr_engine_pool_shares_engines(monkeypatch):
+    """測試 OCR 引擎池依語言共用引擎"""
+    from app.ocr_pool import OCREnginePool
+    from app.services_simple import SimpleOCRService
+    
+    def fake_initialize(self):
+        self.ocr_engine = object()
+    
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", fake_initialize)
+    
+    pool = OCREnginePool(size_per_language=1)
+    
+    with pool.engine("ch_tra") as first:
+        assert first.lang == "ch"
+        # 名額已滿時應該等待逾時
+        with pytest.raises(TimeoutError):
+            pool.checkout("ch_sim", timeout=0.01)
+    
+    # ch_tra 與 ch_sim 共用同一個 ch 引擎
+    with pool.engine("ch_sim") as second:
+        assert second is first
+    
+    stats = pool.get_stats()
+    assert stats["engines_created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["languages"]["ch"] == {"created": 1, "idle": 1, "in_use": 0}
+
+
+@pytest.mark.asyncio
+async def test_ocr_executor_rejects_when_queue_full():
+    """測試 OCR 執行器在佇列已滿時快速拒絕"""
+    import asyncio
+    import threading
+    from app.executor import OCRExecutor, QueueFullError
+    
+    executor = OCRExecutor(max_workers=1, max_queue=1, mode="thread")
+    release = threading.Event()
+    
+    running = asyncio.ensure_future(executor.run(release.wait, 5))
+    queued = asyncio.ensure_future(executor.run(lambda: "done"))
+    await asyncio.sleep(0.05)
+    
+    with pytest.raises(QueueFullError) as exc_info:
+        await executor.run(lambda: None)
+    assert exc_info.value.retry_after >= 1
+    assert executor.get_stats()["queue_depth"] == 1
+    
+    release.set()
+    assert await running is True
+    assert await queued == "done"
+    
+    stats = executor.get_stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["queue_depth"] == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_executor_spawns_and_warms_every_worker(monkeypatch):
+    """測試 process 模式以 spawn 啟動工作行程，並在預熱時啟動所有行程"""
+    import os
+    from app.executor import OCRExecutor
+    from app.health import HealthChecker
+    
+    # 工作行程繼承環境變數；不預先載入語言，避免測試下載模型
+    monkeypatch.setenv("PRELOAD_LANGUAGES", ",")
+    executor = OCRExecutor(max_workers=2, max_queue=1, mode="process")
+    monkeypatch.setattr("app.health.get_ocr_executor", lambda: executor)
+    
+    try:
+        assert HealthChecker([])._check_engines()["ok"] is False
+        status = executor.warm_up()
+        assert status["ready"] is True
+        assert HealthChecker([])._check_engines()["ok"] is True
+        
+        pool = executor._get_executor()
+        assert pool._mp_context.get_start_method() == "spawn"
+        assert len(pool._processes) == 2
+        assert await executor.run(os.getpid) != os.getpid()
+    finally:
+        # 等待工作行程結束，避免影響後續測試的時序
+        executor.shutdown(wait=True)
+
+
+@pytest.mark.asyncio
+async def test_ocr_job_reports_progress_and_result(monkeypatch):
+    """測試 OCR 背景工作的進度與結果"""
+    import asyncio
+    from app import jobs
+    
+    def fake_run_ocr_file(file_path, file_type, language, progress_callback=None, *args, **kwargs):
+        for page in (1, 2):
+            if progress_callback:
+                progress_callback(page, 2)
+        return {"raw_text": "--- 第 1 頁 ---\nhello", "layout_info": [[], []], "page_errors": [], "cached": False}
+    
+    monkeypatch.setattr(jobs, "run_ocr_file", fake_run_ocr_file)
+    
+    completed = []
+    
+    async def on_complete(job):
+        completed.append(job["job_id"])
+    
+    manager = jobs.OCRJobManager(max_concurrent=1)
+    job = manager.create_job("file-1", "/tmp/none.pdf", "application/pdf", "en", on_complete)
+    assert job["status"] == jobs.JOB_QUEUED
+    
+    for _ in range(100):
+        if manager.get_job(job["job_id"])["status"] == jobs.JOB_COMPLETED:
+            break
+        await asyncio.sleep(0.01)
+    
+    job = manager.get_job(job["job_id"])
+    assert job["status"] == jobs.JOB_COMPLETED
+    assert job["current_page"] == job["total_pages"] == 2
+    assert job["raw_text"].endswith("hello")
+    assert completed == [job["job_id"]]
+
+
+@pytest.mark.asyncio
+async def test_ocr_job_state_shared_across_workers(monkeypatch, tmp_path):
+    """測試 OCR 背景工作狀態寫入共用儲存，其他 worker 也能查詢進度與結果"""
+    import asyncio
+    import threading
+    from app import jobs
+    from app.document_store import SQLiteDocumentStore
+    
+    release = threading.Event()
+    
+    def fake_run_ocr_file(file_path, file_type, language, progress_callback=None, *args, **kwargs):
+        progress_callback(1, 2)
+        release.wait(5)
+        progress_callback(2, 2)
+        return {"raw_text": "--- 第 1 頁 ---\nhello", "layout_info": [[], []], "page_errors": [], "cached": False}
+    
+    monkeypatch.setattr(jobs, "run_ocr_file", fake_run_ocr_file)
+    
+    path = str(tmp_path / "documents.db")
+    worker_a = jobs.OCRJobManager(max_concurrent=1, store=SQLiteDocumentStore(path))
+    worker_b = jobs.OCRJobManager(max_concurrent=1, store=SQLiteDocumentStore(path))
+    
+    job = worker_a.create_job("file-1", "/tmp/none.pdf", "application/pdf", "en")
+    assert worker_b.get_job(job["job_id"])["status"] == jobs.JOB_QUEUED
+    
+    for _ in range(100):
+        if worker_b.get_job(job["job_id"])["status"] == jobs.JOB_RUNNING:
+            break
+        await asyncio.sleep(0.01)
+    running = worker_b.get_job(job["job_id"])
+    assert running["status"] == jobs.JOB_RUNNING and running["current_page"] == 1
+    
+    release.set()
+    await worker_a._tasks[job["job_id"]]
+    
+    finished = worker_b.get_job(job["job_id"])
+    assert finished["status"] == jobs.JOB_COMPLETED
+    assert finished["current_page"] == finished["total_pages"] == 2
+    assert finished["raw_text"].endswith("hello")
+    assert worker_b.get_job("missing") is None
+
+
+@pytest.mark.parametrize("executor_mode", ["thread", "process"])
+def test_process_ocr_stream_emits_pages(monkeypatch, tmp_path, executor_mode):
+    """測試 OCR 串流端點逐頁輸出 NDJSON（process 模式於完成後送出，同樣包含每頁文字）"""
+    import asyncio
+    import functools
+    import json
+    from fastapi.testclient import TestClient
+    from app import main
+    
+    def fake_run_ocr_file(file_path, file_type, language, progress_callback=None, page_callback=None,
+                          file_sha256=None, return_pages=False, cache_checked=False):
+        pages = [
+            {"page": page, "total_pages": 2, "text": f"page {page}", "layout": [], "status": "ok", "error": None}
+            for page in (1, 2)
+        ]
+        for page in pages:
+            if page_callback is not None:
+                page_callback(page)
+        result = {
+            "raw_text": "--- 第 1 頁 ---\npage 1\n\n--- 第 2 頁 ---\npage 2",
+            "layout_info": [[], []],
+            "page_errors": [],
+            "cached": False
+        }
+        if return_pages:
+            result["pages"] = pages
+        return result
+    
+    class FakeExecutor:
+        """以執行緒模擬的執行器（mode 決定端點是否傳入 page_callback）"""
+        mode = executor_mode
+        
+        def submit(self, fn, *args, **kwargs):
+            if self.mode == "process":
+                assert args[4] is None
+            return asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+    
+    monkeypatch.setattr(main, "run_ocr_file", fake_run_ocr_file)
+    monkeypatch.setattr(main, "get_ocr_executor", lambda: FakeExecutor())
+    
+    from app.document_store import MemoryDocumentStore
+    
+    store = MemoryDocumentStore()
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    
+    upload = tmp_path / "doc.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    store.create(
+        "stream-test",
+        filename="doc.pdf",
+        file_type="application/pdf",
+        file_path=str(upload)
+    )
+    
+    client = TestClient(main.app)
+    response = client.post("/api/process-ocr/stream", json={"file_id": "stream-test"})
+    assert response.status_code == 200
+    
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert [e["type"] for e in events] == ["page", "page", "done"]
+    assert [e["text"] for e in events[:2]] == ["page 1", "page 2"]
+    assert events[1]["status"] == "ok"
+    assert "page 2" in events[-1]["raw_text"]
+    assert store.get("stream-test")["raw_text"] == events[-1]["raw_text"]
+
+
+def _fake_worker_init(lang):
+    """平行處理測試用的工作行程初始化"""
+
+
+def _failing_worker_init(lang):
+    """平行處理測試用的工作行程初始化：模擬引擎載入失敗"""
+    raise RuntimeError("model unavailable")
+
+
+def _fake_page_fn(image):
+    """平行處理測試用的單頁函數：寬度 20 崩潰、寬度 30 卡住"""
+    import os
+    import time
+    if image.width == 20:
+        os._exit(1)
+    if image.width == 30:
+        time.sleep(10)
+    return f"width {image.width}", []
+
+
+def test_parallel_processor_keeps_order_and_survives_failures():
+    """測試平行頁面處理維持頁碼順序並處理崩潰與逾時"""
+    from app.parallel import ParallelPageProcessor
+    
+    images = [Image.new("RGB", (width, 10)) for width in (10, 20, 30, 40)]
+    # 逾時包含工作行程啟動時間，保留足夠餘裕（卡住的頁面仍遠超過此時限）
+    processor = ParallelPageProcessor(
+        "en", workers=1, page_timeout=3,
+        initializer=_fake_worker_init, page_fn=_fake_page_fn
+    )
+    
+    try:
+        pages = list(processor.iter_pages(images))
+    finally:
+        processor.shutdown()
+    
+    assert [page["page"] for page in pages] == [1, 2, 3, 4]
+    assert [page["status"] for page in pages] == ["ok", "error", "timeout", "ok"]
+    assert pages[0]["text"] == "width 10"
+    assert pages[3]["text"] == "width 40"
+
+
+def test_parallel_processor_timeout_does_not_break_other_documents():
+    """測試一份文件的單頁逾時重建行程池時，同時處理的其他文件頁面不受影響"""
+    import threading
+    from app.parallel import ParallelPageProcessor
+
+    # 逾時包含工作行程啟動時間，保留足夠餘裕（卡住的頁面仍遠超過此時限）
+    processor = ParallelPageProcessor(
+        "en", workers=1, page_timeout=3,
+        initializer=_fake_worker_init, page_fn=_fake_page_fn
+    )
+    results = {}
+
+    def run(name, widths):
+        images = [Image.new("RGB", (width, 10)) for width in widths]
+        results[name] = [page["status"] for page in processor.iter_pages(images)]
+
+    threads = [
+        threading.Thread(target=run, args=("slow", (30, 10))),
+        threading.Thread(target=run, args=("other", (10, 40, 10)))
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+    finally:
+        processor.shutdown()
+
+    assert results["slow"] == ["timeout", "ok"]
+    assert results["other"] == ["ok", "ok", "ok"]
+
+
+def test_parallel_pools_preloaded_and_reported_in_readiness(monkeypatch):
+    """測試頁面平行度 > 1 時預先啟動各語言的行程池，並納入就緒檢查"""
+    from app import parallel
+    from app.health import HealthChecker
+    from app.parallel import ParallelPageProcessor
+
+    monkeypatch.setenv("OCR_PAGE_PARALLELISM", "2")
+    processors = {
+        "en": ParallelPageProcessor("en", workers=2, initializer=_fake_worker_init, page_fn=_fake_page_fn),
+        "japan": ParallelPageProcessor("japan", workers=1, initializer=_failing_worker_init, page_fn=_fake_page_fn)
+    }
+    monkeypatch.setattr(parallel, "get_parallel_processor", lambda lang: processors[lang])
+    checker = HealthChecker([])
+    processes = []
+
+    try:
+        assert checker._compute()["checks"]["ocr_parallel"]["ok"] is False
+        assert parallel.preload_parallel_processors(["en", "japan"]) == {"en": "ready", "japan": "failed"}
+        # 預熱時所有工作行程都已啟動
+        processes = list(processors["en"]._executor._processes.values())
+        assert len(processes) == 2
+
+        check = checker._compute()["checks"]["ocr_parallel"]
+        assert check["ok"] is False and check["languages"] == {"en": "ready", "japan": "failed"}
+        # 初始化失敗的行程池已重建，之後的文件重新嘗試
+        assert processors["japan"]._executor is None
+
+        parallel.shutdown_parallel_processors()
+        assert parallel.preload_parallel_processors(["en"]) == {"en": "ready"}
+        assert checker._compute()["checks"]["ocr_parallel"]["ok"] is True
+
+        monkeypatch.setenv("OCR_PAGE_PARALLELISM", "1")
+        assert "ocr_parallel" not in checker._compute()["checks"]
+    finally:
+        parallel.shutdown_parallel_processors()
+        for processor in processors.values():
+            processor.shutdown()
+        for process in processes:
+            process.join(timeout=5)
+
+
+def test_parallel_processor_stops_outstanding_pages_after_deadline():
+    """測試文件時限在頁面之間到期時，取消其餘頁面並終止仍在執行的工作行程"""
+    import time
+    from app.deadline import Deadline
+    from app.parallel import ParallelPageProcessor
+
+    processor = ParallelPageProcessor(
+        "en", workers=1, page_timeout=30,
+        initializer=_fake_worker_init, page_fn=_fake_page_fn
+    )
+    images = [Image.new("RGB", (width, 10)) for width in (10, 30, 30)]
+    deadline = Deadline(60)
+
+    try:
+        pages = processor.iter_pages(images, deadline=deadline)
+        first = next(pages)
+        processes = list(processor._executor._processes.values())
+        # 第一頁完成後文件時限到期，卡住的後續頁面不再等待
+        deadline.expires_at = time.monotonic()
+        rest = list(pages)
+    finally:
+        processor.shutdown()
+
+    assert first["status"] == "ok"
+    assert [page["status"] for page in rest] == ["timeout", "timeout"]
+    assert all(page["timeout"]["scope"] == "document" for page in rest)
+    for process in processes:
+        process.join(timeout=5)
+        assert not process.is_alive()
+
+
+def test_page_timeout_works_in_worker_thread(monkeypatch):
+    """測試單頁逾時可在工作執行緒中運作，逾時的執行緒結束後沿用原本的引擎"""
+    import threading
+    import time
+    from app import services_simple
+    from app.deadline import Deadline
+    from app.services_simple import SimpleOCRService
+    
+    service = SimpleOCRService(lang="en")
+    engines = []
+    
+    def fake_initialize(self):
+        self.ocr_engine = object()
+        engines.append(self.ocr_engine)
+    
+    def fake_process_image(image):
+        if image.width == 20:
+            time.sleep(1)
+        return f"width {image.width}", []
+    
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", fake_initialize)
+    service.process_image = fake_process_image
+    
+    images = [Image.new("RGB", (width, 10)) for width in (10, 20, 30)]
+    pages = []
+    
+    def worker():
+        pages.extend(service.iter_pages(images, page_timeout=0.2, deadline=Deadline(60)))
+    
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    
+    assert [page["status"] for page in pages] == ["ok", "timeout", "ok"]
+    assert pages[1]["timeout"] == {"scope": "page", "limit_seconds": 0.2}
+    assert pages[2]["text"] == "width 30"
+    # 放棄的執行緒在等待期間結束，沿用原本的引擎，不重複載入
+    assert len(engines) == 1 and service.ocr_engine is engines[0]
+    
+    # 放棄的執行緒仍未結束時才重建引擎
+    monkeypatch.setattr(services_simple, "ENGINE_RECOVERY_GRACE", 0.01)
+    pages = list(service.iter_pages(images, page_timeout=0.2, deadline=Deadline(60)))
+    assert [page["status"] for page in pages] == ["ok", "timeout", "ok"]
+    assert len(engines) == 2 and service.ocr_engine is engines[1]
+    
+    # 文件時限已過時，剩餘頁面不再處理
+    expired = list(service.iter_pages(images, deadline=Deadline(0.000001)))
+    assert all(page["timeout"]["scope"] == "document" for page in expired)
+
+
+def test_legacy_service_timeout_reuses_engine_and_reports_each_page_once(monkeypatch):
+    """測試 OCRService 逾時：每頁只有一筆結果，放棄的執行緒及時結束時沿用原引擎，重建失敗只標記下一頁"""
+    import time
+    from app import services
+    from app.deadline import Deadline
+
+    monkeypatch.setattr(services.OCRService, "_initialize_engine", lambda self: None)
+    service = services.OCRService(lang="en")
+    engines = []
+
+    def fake_initialize():
+        if engines:
+            raise RuntimeError("reload failed")
+        service.ocr_engine = object()
+        engines.append(service.ocr_engine)
+
+    def fake_process_image(image, use_cls=True):
+        if image.width == 20:
+            time.sleep(0.3)
+        return f"width {image.width}", []
+
+    service._initialize_engine = fake_initialize
+    service.process_image = fake_process_image
+    fake_initialize()
+
+    images = [Image.new("RGB", (width, 10)) for width in (10, 20, 30)]
+    pages = []
+    text, layouts = service.process_images(images, page_timeout=0.1, deadline=Deadline(60), page_callback=pages.append)
+
+    assert [page["status"] for page in pages] == ["ok", "timeout", "ok"]
+    assert pages[1]["timeout"] == {"scope": "page", "limit_seconds": 0.1}
+    assert len(layouts) == 3 and text.count("--- 第") == 3
+    # 放棄的執行緒在等待期間結束，沿用原本的引擎
+    assert len(engines) == 1 and service.ocr_engine is engines[0]
+
+    # 放棄的執行緒仍未結束時重建引擎；重建失敗只記在下一頁，不重複記錄逾時頁
+    monkeypatch.setattr(services, "ENGINE_RECOVERY_GRACE", 0.01)
+    images = [Image.new("RGB", (width, 10)) for width in (20, 30, 40)]
+    pages = list(service.iter_pages(images, page_timeout=0.1))
+    assert [page["status"] for page in pages] == ["timeout", "error", "error"]
+    assert "reload failed" in pages[1]["error"]
+
+
+def test_result_cache_serves_repeat_upload(monkeypatch, tmp_path):
+    """測試重複的檔案直接使用快取結果，且快取依 LRU 淘汰"""
+    from contextlib import contextmanager
+    from app import pipeline
+    from app.result_cache import OCRResultCache
+    
+    cache = OCRResultCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    monkeypatch.setattr(pipeline, "get_result_cache", lambda: cache)
+    
+    calls = []
+    
+    class FakeService:
+        def process_images(self, images, progress_callback=None, page_callback=None, **kwargs):
+            calls.append(len(images))
+            page = {"page": 1, "total_pages": 1, "text": "hello", "layout": [], "status": "ok", "error": None}
+            page_callback(page)
+            return "--- 第 1 頁 ---\nhello", [[]]
+    
+    class FakePool:
+        @contextmanager
+        def engine(self, lang):
+            yield FakeService()
+    
+    monkeypatch.setattr(pipeline, "get_ocr_pool", lambda: FakePool())
+    
+    image_path = tmp_path / "page.png"
+    Image.new("RGB", (20, 20), color="white").save(image_path)
+    
+    first = pipeline.run_ocr_file(str(image_path), "image/png", "en")
+    pages = []
+    second = pipeline.run_ocr_file(str(image_path), "image/png", "en", page_callback=pages.append)
+    
+    assert calls == [1]
+    assert first["cached"] is False and second["cached"] is True
+    assert second["raw_text"] == first["raw_text"]
+    assert [page["text"] for page in pages] == ["hello"]
+    # process 模式的串流端點改由結果附上每頁內容
+    third = pipeline.run_ocr_file(str(image_path), "image/png", "en", return_pages=True)
+    assert [page["text"] for page in third["pages"]] == ["hello"]
+    
+    # 不同語言使用不同的快取鍵
+    pipeline.run_ocr_file(str(image_path), "image/png", "ch_tra")
+    assert calls == [1, 1]
+    
+    stats = cache.get_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["entries"] == 2
+    
+    # 超過大小上限時淘汰最久未使用的項目
+    small = OCRResultCache(str(tmp_path / "small"), max_bytes=300)
+    page = {"page": 1, "total_pages": 1, "text": "x" * 100, "layout": [], "status": "ok", "error": None}
+    small.put("a", [page])
+    small.put("b", [page])
+    assert small.get("b") is not None
+    small.put("c", [page])
+    assert small.get("a") is None
+    assert small.get_stats()["evictions"] >= 1
+    
+    # 呼叫端已查詢過快取且未命中時不重複查詢（未命中只計一次）
+    misses = cache.get_stats()["misses"]
+    pipeline.run_ocr_file(str(image_path), "image/png", "en", cache_checked=True)
+    assert calls == [1, 1, 1] and cache.get_stats()["misses"] == misses
+    
+    # 頁數上限改變時（結果可能少了頁面）不使用舊的快取
+    key = pipeline.get_cache_key("0" * 64, "en")
+    monkeypatch.setattr(pipeline, "MAX_OCR_PAGES", pipeline.MAX_OCR_PAGES + 1)
+    assert pipeline.get_cache_key("0" * 64, "en") != key
+
+
+def test_cache_hits_skip_ocr_queue_on_every_endpoint(monkeypatch, tmp_path):
+    """測試快取命中不進入 OCR 佇列：佇列已滿時 /api/process-ocr、串流與背景工作仍直接回傳快取結果，查詢不在事件迴圈中進行"""
+    import asyncio
+    import json
+    from fastapi.testclient import TestClient
+    from app import jobs, main, pipeline
+    from app.document_store import MemoryDocumentStore
+    from app.executor import QueueFullError
+    from app.result_cache import get_result_cache
+    
+    image_path = tmp_path / "page.png"
+    Image.new("RGB", (20, 20), color="white").save(image_path)
+    store = MemoryDocumentStore()
+    store.create("f1", filename="page.png", file_path=str(image_path), file_type="image/png", sha256="a" * 64)
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    
+    page = {"page": 1, "total_pages": 1, "text": "cached text", "layout": [], "status": "ok", "error": None}
+    get_result_cache().put(pipeline.get_cache_key("a" * 64, "en"), [page])
+    
+    class FullExecutor:
+        mode = "thread"
+        
+        def submit(self, *args, **kwargs):
+            raise QueueFullError("OCR 工作佇列已滿，請稍後再試", 1)
+        
+        async def run(self, *args, **kwargs):
+            raise QueueFullError("OCR 工作佇列已滿，請稍後再試", 1)
+    
+    monkeypatch.setattr(main, "get_ocr_executor", lambda: FullExecutor())
+    monkeypatch.setattr(jobs, "get_ocr_executor", lambda: FullExecutor())
+    
+    threads = []
+    real_lookup = pipeline.lookup_cached_result
+    
+    def tracking_lookup(*args):
+        try:
+            asyncio.get_running_loop()
+            threads.append("event loop")
+        except RuntimeError:
+            threads.append("worker thread")
+        return real_lookup(*args)
+    
+    monkeypatch.setattr(main, "lookup_cached_result", tracking_lookup)
+    monkeypatch.setattr(jobs, "lookup_cached_result", tracking_lookup)
+    
+    client = TestClient(main.app)
+    response = client.post("/api/process-ocr", json={"file_id": "f1", "language": "en"})
+    assert response.status_code == 200
+    assert response.json()["raw_text"].endswith("cached text")
+    
+    response = client.post("/api/process-ocr/stream", json={"file_id": "f1", "language": "en"})
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert [e["type"] for e in events] == ["page", "done"]
+    assert events[0]["text"] == "cached text" and events[1]["cached"] is True
+    
+    async def run_job():
+        manager = jobs.OCRJobManager(max_concurrent=1)
+        job = manager.create_job("f1", str(image_path), "image/png", "en", file_sha256="a" * 64)
+        await asyncio.wait_for(asyncio.gather(*manager._tasks.values()), timeout=5)
+        return job
+    
+    job = asyncio.run(run_job())
+    assert job["status"] == jobs.JOB_COMPLETED and job["cached"] is True
+    assert job["raw_text"].endswith("cached text")
+    
+    assert threads == ["worker thread"] * 3
+    assert get_result_cache().get_stats()["misses"] == 0
+
+
+def test_page_cache_only_reprocesses_changed_pages(monkeypatch, tmp_path):
+    """測試單頁快取：修訂後的文件只重新辨識內容改變的頁面"""
+    from app.result_cache import OCRResultCache
+    from app.services_simple import SimpleOCRService
+    
+    cache = OCRResultCache(str(tmp_path / "cache"))
+    service = SimpleOCRService(lang="en")
+    processed = []
+    
+    def fake_process_image(image):
+        processed.append(image.getpixel((0, 0)))
+        return f"color {image.getpixel((0, 0))}", []
+    
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", lambda self: setattr(self, "ocr_engine", object()))
+    service.process_image = fake_process_image
+    
+    draft = [Image.new("RGB", (10, 10), color=(value, 0, 0)) for value in (1, 2, 3)]
+    revised = [draft[0], Image.new("RGB", (10, 10), color=(9, 0, 0)), draft[2]]
+    
+    service.process_images(draft, page_cache=cache)
+    assert len(processed) == 3
+    
+    processed.clear()
+    pages = list(service.iter_pages(revised, page_cache=cache))
+    
+    assert processed == [(9, 0, 0)]
+    assert [page["cached"] for page in pages] == [True, False, True]
+    assert pages[2]["text"] == "color (3, 0, 0)"
+    assert cache.get_stats()["page_hits"] == 2
+
+
+def test_pdf_page_cache_keys_on_source_content(monkeypatch, tmp_path):
+    """測試 PDF 單頁快取以來源內容為鍵：adaptive 預算改變縮放係數時仍命中，佈局座標依比例換算"""
+    import fitz
+    from app.result_cache import OCRResultCache
+    from app.services_simple import SimpleOCRService
+    from app.utils import PDFPageSource, RENDER_MODE_ADAPTIVE
+    
+    def build(second_line):
+        document = fitz.open()
+        for text in ("Unchanged first page", second_line):
+            page = document.new_page()
+            page.insert_text((72, 100), text, fontsize=8)
+        data = document.tobytes()
+        document.close()
+        return data
+    
+    cache = OCRResultCache(str(tmp_path / "cache"))
+    service = SimpleOCRService(lang="en")
+    processed = []
+    
+    def fake_process_image(image):
+        processed.append(image.shape)
+        return "text", [{"text": "text", "bbox": [[10, 10], [20, 10], [20, 20], [10, 20]],
+                         "confidence": 0.9, "y_position": 15, "x_position": 15}]
+    
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", lambda self: setattr(self, "ocr_engine", object()))
+    service.process_image = fake_process_image
+    
+    draft = PDFPageSource(build("Draft second page"), render_mode=RENDER_MODE_ADAPTIVE, pixel_budget=2_000_000)
+    service.process_images(draft, page_cache=cache)
+    assert len(processed) == 2
+    
+    processed.clear()
+    revised = PDFPageSource(build("Revised second page"), render_mode=RENDER_MODE_ADAPTIVE, pixel_budget=500_000)
+    pages = list(service.iter_pages(revised, page_cache=cache))
+    assert len(processed) == 1
+    assert [page["cached"] for page in pages] == [True, False]
+    
+    scale = revised.page_sources[0][1] / draft.page_sources[0][1]
+    assert scale < 1
+    assert pages[0]["layout"][0]["bbox"][0] == pytest.approx([10 * scale, 10 * scale])
+    assert pages[0]["layout"][0]["y_position"] == pytest.approx(15 * scale)
+
+
+def test_result_cache_size_limit_shared_across_processes(monkeypatch, tmp_path):
+    """測試多個行程共用快取目錄時，定期同步的索引讓總大小維持在上限內"""
+    import json
+    import time
+    from app import result_cache
+    from app.result_cache import OCRResultCache
+    
+    monkeypatch.setattr(result_cache, "INDEX_SYNC_INTERVAL", 0)
+    page = {"page": 1, "total_pages": 1, "text": "x" * 100, "layout": [], "status": "ok", "error": None}
+    entry_size = len(json.dumps({"created_at": time.time(), "pages": [page]}).encode("utf-8"))
+    workers = [OCRResultCache(str(tmp_path / "cache"), max_bytes=entry_size * 3) for _ in range(2)]
+    
+    for i in range(6):
+        workers[i % 2].put(f"key{i}", [page])
+    
+    total = sum(path.stat().st_size for path in (tmp_path / "cache").glob("*.json"))
+    assert total <= entry_size * 3
+    assert workers[1].get("key5") is not None
+
+
+def test_pdf_renders_directly_to_bgr_array():
+    """測試 PDF 直接渲染為 BGR 陣列，與 PNG 路徑的結果一致"""
+    import fitz
+    import numpy as np
+    from app.utils import convert_pdf_to_arrays, convert_pdf_to_images
+    
+    document = fitz.open()
+    page = document.new_page()
+    page.draw_rect(fitz.Rect(50, 50, 200, 120), color=(1, 0, 0), fill=(1, 0, 0))
+    page.insert_text((60, 200), "Hello OCR", fontsize=20)
+    pdf_bytes = document.tobytes()
+    document.close()
+    
+    arrays = convert_pdf_to_arrays(pdf_bytes)
+    expected = np.array(convert_pdf_to_images(pdf_bytes)[0])[:, :, ::-1]
+    
+    assert len(arrays) == 1
+    assert arrays[0].flags["C_CONTIGUOUS"]
+    assert arrays[0].dtype == np.uint8
+    assert np.array_equal(arrays[0], expected)
+    # 紅色填滿區域在 BGR 中為 (0, 0, 255)
+    assert tuple(arrays[0][110, 150]) == (0, 0, 255)
+
+
+def test_pdf_pages_render_lazily_with_bounded_prefetch(monkeypatch):
+    """測試 PDF 頁面在 OCR 時逐頁渲染，只預取有限頁數"""
+    import fitz
+    from app import utils
+    from app.services_simple import SimpleOCRService
+    
+    document = fitz.open()
+    for number in range(1, 9):
+        document.new_page().insert_text((60, 80), f"Page {number}", fontsize=20)
+    pdf_bytes = document.tobytes()
+    document.close()
+    
+    rendered = []
+    render_page_to_array = utils.render_page_to_array
+    
+    def counting_render(page, zoom):
+        rendered.append(page.number)
+        return render_page_to_array(page, zoom)
+    
+    monkeypatch.setattr(utils, "render_page_to_array", counting_render)
+    
+    source = utils.PDFPageSource(pdf_bytes, max_pages=6, prefetch_pages=1)
+    assert len(source) == 6
+    assert rendered == []
+    
+    service = SimpleOCRService(lang="en")
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", lambda self: setattr(self, "ocr_engine", object()))
+    ahead = []
+    
+    def fake_process_image(image):
+        ahead.append(len(rendered) - len(ahead) - 1)
+        return "text", []
+    
+    service.process_image = fake_process_image
+    pages = list(service.iter_pages(source))
+    
+    assert [page["page"] for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert rendered == [0, 1, 2, 3, 4, 5]
+    # 辨識某一頁時，最多只多渲染了預取的頁面（佇列 1 頁 + 背景執行緒手上 1 頁）
+    assert max(ahead) <= 2
+
+
+def test_adaptive_render_zoom_follows_font_size_within_budget():
+    """測試 adaptive 渲染：小字頁面放大、大字頁面縮小，總像素不超過預算"""
+    import fitz
+    from app.utils import estimate_text_size, plan_render_zooms, DEFAULT_PDF_DPI
+    
+    document = fitz.open()
+    dense = document.new_page()
+    for line in range(30):
+        dense.insert_text((40, 40 + line * 9), "Recall 0.91 Precision 0.88 F1 0.89", fontsize=6)
+    sparse = document.new_page()
+    sparse.insert_text((40, 120), "Slide Title", fontsize=32)
+    document.new_page()
+    
+    assert estimate_text_size(document[0]) == 6
+    assert estimate_text_size(document[1]) == 32
+    assert estimate_text_size(document[2]) is None
+    
+    metrics = [(595, 842, 6.0, None), (595, 842, 32.0, None), (595, 842, None, None), (595, 842, None, 200 / 72)]
+    zooms = plan_render_zooms(metrics, pixel_budget=10_000_000)
+    assert zooms[0] > DEFAULT_PDF_DPI / 72 > zooms[1]
+    assert zooms[2] == DEFAULT_PDF_DPI / 72
+    assert zooms[3] == pytest.approx(200 / 72)
+    
+    budget = 1_000_000
+    zooms = plan_render_zooms(metrics, pixel_budget=budget)
+    total_pixels = sum(w * h * zoom ** 2 for (w, h, *_), zoom in zip(metrics, zooms))
+    assert total_pixels <= budget * len(metrics) * 1.001
+    assert zooms[0] > zooms[2] > zooms[1]
+    document.close()
+
+
+def test_adaptive_render_budgets_only_rendered_pages(monkeypatch):
+    """測試 adaptive 渲染與文字層：文字層頁面不佔像素預算，掃描頁面依圖片解析度渲染，每頁只讀取一次內容"""
+    import fitz
+    from app.utils import TextLayerPage, estimate_image_zoom, iter_pdf_pages, RENDER_MODE_ADAPTIVE
+    
+    document = fitz.open()
+    for _ in range(3):
+        page = document.new_page(width=612, height=792)
+        for line in range(20):
+            page.insert_text((72, 100 + line * 14), "Born digital text with an extractable layer.", fontsize=10)
+    scanned = document.new_page(width=612, height=792)
+    # 約 150 DPI 的掃描圖片
+    scanned.insert_image(scanned.rect, stream=_png_bytes(Image.new("RGB", (1275, 1650), "white")))
+    pdf_bytes = document.tobytes()
+    document.close()
+    
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as check:
+        assert estimate_image_zoom(check[3]) == pytest.approx(150 / 72, rel=0.01)
+    
+    get_text_calls = []
+    original_get_text = fitz.Page.get_text
+    
+    def counting_get_text(self, option="text", *args, **kwargs):
+        get_text_calls.append((self.number, option))
+        return original_get_text(self, option, *args, **kwargs)
+    
+    monkeypatch.setattr(fitz.Page, "get_text", counting_get_text)
+    
+    # 預算足夠時掃描頁面以原始解析度渲染
+    pages = list(iter_pdf_pages(pdf_bytes, render_mode=RENDER_MODE_ADAPTIVE, pixel_budget=10_000_000, text_layer=True))
+    assert [isinstance(page, TextLayerPage) for page in pages] == [True, True, True, False]
+    assert abs(pages[3].shape[0] - 1650) <= 2
+    assert sorted(get_text_calls) == [(n, "dict") for n in range(4)]
+    
+    # 預算只分給需要渲染的頁面：掃描頁面的像素數不超過每頁預算（而非 4 頁的總預算）
+    budget = 1_000_000
+    pages = list(iter_pdf_pages(pdf_bytes, render_mode=RENDER_MODE_ADAPTIVE, pixel_budget=budget, text_layer=True))
+    height, width = pages[3].shape[:2]
+    assert width * height <= budget * 1.01
+    assert width * height >= budget * 0.95
+
+
+def test_text_layer_pages_skip_ocr(monkeypatch):
+    """測試內嵌文字層的頁面直接使用文字層，只有掃描頁面進行 OCR"""
+    import fitz
+    from app.utils import PDFPageSource
+    from app.services_simple import SimpleOCRService
+    
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 100), "Born digital paper with an extractable text layer.", fontsize=12)
+    page.insert_text((72, 130), "Second line of the abstract.", fontsize=12)
+    scanned = document.new_page()
+    scanned.insert_image(scanned.rect, stream=_png_bytes(Image.new("RGB", (200, 280), "white")))
+    pdf_bytes = document.tobytes()
+    document.close()
+    
+    service = SimpleOCRService(lang="en")
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", lambda self: setattr(self, "ocr_engine", object()))
+    ocr_calls = []
+    
+    def fake_process_image(image):
+        ocr_calls.append(image.shape)
+        return "scanned text", []
+    
+    service.process_image = fake_process_image
+    pages = list(service.iter_pages(PDFPageSource(pdf_bytes, text_layer=True)))
+    
+    assert [page["source"] for page in pages] == ["text_layer", "ocr"]
+    assert len(ocr_calls) == 1
+    assert pages[0]["text"].splitlines() == [
+        "Born digital paper with an extractable text layer.",
+        "Second line of the abstract."
+    ]
+    entry = pages[0]["layout"][0]
+    assert entry["confidence"] == 1.0
+    # bbox 轉換為渲染圖像的像素座標（100 DPI）
+    assert entry["bbox"][0] == pytest.approx(72 * 100 / 72, abs=1)
+    assert pages[1]["text"] == "scanned text"
+
+
+def _png_bytes(image):
+    """將 PIL Image 編碼為 PNG"""
+    import io
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_sqlite_document_store_shared_across_workers(tmp_path):
+    """測試 SQLite 文件儲存：多個 worker 共用記錄、JSON 欄位與 TTL 過期"""
+    import time
+    from app.document_store import DocumentStore, SQLiteDocumentStore
+    
+    # 介面本身不可直接建立，後端必須實作所有抽象方法
+    with pytest.raises(TypeError):
+        DocumentStore()
+    
+    path = str(tmp_path / "documents.db")
+    worker_a = SQLiteDocumentStore(path, ttl=60)
+    worker_b = SQLiteDocumentStore(path, ttl=60)
+    
+    worker_a.create("doc-1", filename="paper.pdf", file_type="application/pdf", file_path="/tmp/paper.pdf")
+    assert worker_b.update("doc-1", raw_text="hello", layout_info=[[{"text": "hello", "bbox": [1, 2, 3, 4]}]])
+    
+    record = worker_a.get("doc-1")
+    assert record["filename"] == "paper.pdf"
+    assert record["raw_text"] == "hello"
+    assert record["layout_info"][0][0]["bbox"] == [1, 2, 3, 4]
+    assert record["markdown_content"] is None
+    
+    with pytest.raises(ValueError):
+        worker_a.update("doc-1", unknown_field=1)
+    assert worker_a.update("missing", raw_text="x") is False
+    
+    # 過期的記錄讀不到，並由 purge_expired 移除
+    short = SQLiteDocumentStore(path, ttl=0.01)
+    short.create("doc-2", filename="old.pdf", file_path="/tmp/old.pdf")
+    short.put_job({"job_id": "job-1", "status": "completed"})
+    time.sleep(0.05)
+    assert worker_b.get("doc-2") is None
+    assert worker_b.get_job("job-1") is None
+    assert [record["file_id"] for record in worker_a.purge_expired()] == ["doc-2"]
+    assert worker_a.get_stats()["documents"] == 1
+    assert worker_a.get_stats()["jobs"] == 0
+    
+    assert worker_b.delete("doc-1")
+    assert worker_a.get("doc-1") is None
+
+
+def test_janitor_evicts_by_age_and_disk_budget(tmp_path, monkeypatch):
+    """測試背景清理：過期記錄、超過保留時間的檔案，以及超過磁碟預算時從最舊的檔案刪除；記錄仍有效的檔案與隱藏檔不依時間刪除"""
+    import os
+    import time
+    from app import janitor as janitor_module
+    from app.document_store import MemoryDocumentStore
+
+    store = MemoryDocumentStore(ttl=60)
+    monkeypatch.setattr(janitor_module, "get_document_store", lambda: store)
+
+    upload_dir = tmp_path / "uploads"
+    temp_dir = tmp_path / "temp"
+    upload_dir.mkdir()
+    temp_dir.mkdir()
+    now = time.time()
+
+    def make_file(path, size, age):
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age, now - age))
+        return path
+
+    # 過期記錄：上傳檔案與下載用的臨時檔案一併刪除
+    expired = make_file(upload_dir / "expired.pdf", 100, 10)
+    expired_md = make_file(temp_dir / "expired_md.md", 10, 10)
+    store.create("expired", file_path=str(expired))
+    store._records["expired"]["expires_at"] = now - 1
+    # 超過保留時間的孤兒檔案
+    stale = make_file(temp_dir / "stale_txt.txt", 10, 7200)
+    gitkeep = make_file(upload_dir / ".gitkeep", 0, 7200)
+    # 超過磁碟預算時依修改時間由舊到新刪除，剛上傳的檔案不刪
+    oldest = make_file(upload_dir / "oldest.pdf", 400, 600)
+    store.create("oldest", file_path=str(oldest))
+    older = make_file(upload_dir / "older.pdf", 400, 300)
+    fresh = make_file(upload_dir / "fresh.pdf", 400, 0)
+
+    janitor = janitor_module.Janitor(str(upload_dir), str(temp_dir), max_age=3600, disk_budget=500)
+    result = janitor.run_once()
+
+    assert not expired.exists() and not expired_md.exists()
+    assert not stale.exists()
+    assert not oldest.exists() and not older.exists()
+    assert fresh.exists()
+    assert gitkeep.exists()
+    assert store.get("oldest") is None
+    assert result["records_expired"] == 1
+    assert result["files_evicted_expired"] == 2
+    assert result["files_evicted_age"] == 1
+    assert result["files_evicted_budget"] == 2
+
+    stats = janitor.get_stats()
+    assert stats["runs"] == 1
+    assert stats["bytes_freed"] == 100 + 10 + 10 + 400 + 400
+    assert stats["disk_usage_bytes"] == 400
+
+    # 檔案已超過保留時間，但記錄剛更新過仍有效
+    live = make_file(upload_dir / "live.pdf", 10, 7200)
+    store.create("live", file_path=str(live))
+    janitor_module.Janitor(str(upload_dir), str(temp_dir), max_age=3600).run_once()
+    assert live.exists() and store.get("live") is not None
+
+
+def test_upload_streams_to_disk_and_sniffs_type(tmp_path, monkeypatch):
+    """測試分塊上傳：雜湊與完整內容一致、依 magic bytes 判斷類型、超過上限時不留下檔案"""
+    import hashlib
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.document_store import MemoryDocumentStore
+
+    store = MemoryDocumentStore()
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 16)
+    monkeypatch.setenv("MAX_UPLOAD_SIZE", "100")
+    client = TestClient(main.app)
+
+    # 副檔名不可信，以內容判斷為 PNG
+    content = b"\x89PNG\r\n\x1a\n" + b"x" * 50
+    response = client.post("/api/upload", files={"file": ("scan.pdf", content, "application/pdf")})
+    assert response.status_code == 200
+    record = store.get(response.json()["file_id"])
+    assert record["file_type"] == "image/png"
+    assert record["file_path"].endswith(".png")
+    assert record["sha256"] == hashlib.sha256(content).hexdigest()
+    with open(record["file_path"], "rb") as f:
+        assert f.read() == content
+
+    response = client.post("/api/upload", files={"file": ("notes.pdf", b"#!/bin/sh\necho hi", "application/pdf")})
+    assert response.status_code == 400
+
+    response = client.post("/api/upload", files={"file": ("big.pdf", b"%PDF-1.4" + b"x" * 200, "application/pdf")})
+    assert response.status_code == 413
+    assert sorted(path.suffix for path in tmp_path.iterdir()) == [".png"]
+
+
+def test_oversized_upload_rejected_before_body_is_read(monkeypatch):
+    """測試過大的上傳請求在接收內容前（依 Content-Length）或接收途中（分塊傳輸）即被拒絕，不進入端點"""
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.upload_limit import MULTIPART_OVERHEAD
+
+    calls = []
+
+    async def fake_save_upload(file):
+        calls.append(file.filename)
+        raise AssertionError("端點不應被呼叫")
+
+    monkeypatch.setattr(main, "save_upload", fake_save_upload)
+    monkeypatch.setenv("MAX_UPLOAD_SIZE", "1000")
+    client = TestClient(main.app)
+
+    oversized = b"%PDF-1.4" + b"x" * (1000 + MULTIPART_OVERHEAD)
+
+    def body():
+        for offset in range(0, len(oversized), 4096):
+            yield oversized[offset:offset + 4096]
+
+    response = client.post("/api/upload", files={"file": ("big.pdf", oversized, "application/pdf")})
+    assert response.status_code == 413
+
+    # 未提供 Content-Length 時，超過上限即中止
+    response = client.post(
+        "/api/upload",
+        content=body(),
+        headers={"Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
+    assert calls == []
+
+
+
+def test_pdf_page_source_reads_from_path(tmp_path):
+    """測試 PDF 可直接從檔案路徑渲染（不先讀入記憶體），結果與從內容渲染相同"""
+    import fitz
+    from app.utils import PDFPageSource
+
+    document = fitz.open()
+    for number in range(1, 4):
+        document.new_page().insert_text((60, 80), f"Page {number}", fontsize=20)
+    pdf_path = tmp_path / "doc.pdf"
+    document.save(str(pdf_path))
+    document.close()
+
+    from_path = list(PDFPageSource(str(pdf_path), prefetch_pages=0))
+    from_bytes = list(PDFPageSource(pdf_path.read_bytes(), prefetch_pages=0))
+    assert len(from_path) == 3
+    assert all(np.array_equal(a, b) for a, b in zip(from_path, from_bytes))
+
+    with pytest.raises(ValueError):
+        PDFPageSource(str(tmp_path / "missing.pdf"))
+
+
+
+def test_batch_ocr_shares_engine_and_reports_per_file(monkeypatch, tmp_path):
+    """測試批次 OCR：同一組檔案共用一個引擎，單一檔案失敗不影響其他檔案"""
+    import io
+    from contextlib import contextmanager
+    from fastapi.testclient import TestClient
+    from app import main, pipeline
+    from app.document_store import MemoryDocumentStore
+    from app.result_cache import OCRResultCache
+
+    checkouts = []
+
+    class FakeService:
+        def process_images(self, images, progress_callback=None, page_callback=None, **kwargs):
+            width = images[0].width
+            page_callback({"page": 1, "total_pages": 1, "text": f"w{width}", "layout": [], "status": "ok", "error": None})
+            return f"--- 第 1 頁 ---\nw{width}", [[]]
+
+    class FakePool:
+        @contextmanager
+        def engine(self, lang):
+            checkouts.append(lang)
+            yield FakeService()
+
+    store = MemoryDocumentStore()
+    monkeypatch.setattr(pipeline, "get_ocr_pool", lambda: FakePool())
+    monkeypatch.setattr(pipeline, "get_result_cache", lambda: OCRResultCache(str(tmp_path / "cache"), max_bytes=0))
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+    client = TestClient(main.app)
+
+    def png(width):
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, 10), color="white").save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    response = client.post(
+        "/api/batch-ocr/upload",
+        files=[
+            ("files", ("a.png", png(10), "image/png")),
+            ("files", ("b.txt", b"plain text", "text/plain")),
+            ("files", ("c.png", png(30), "image/png")),
+        ],
+        data={"language": "en"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["success"] for r in data["results"]] == [True, False, True]
+    assert data["results"][0]["raw_text"].endswith("w10")
+    assert data["results"][1]["filename"] == "b.txt"
+    assert "不支援的檔案類型" in data["results"][1]["error"]
+    assert data["succeeded"] == 2 and data["failed"] == 1 and data["total_pages"] == 2
+    assert 1 <= len(checkouts) <= 2
+
+    file_id = data["results"][2]["file_id"]
+    assert store.get(file_id)["raw_text"].endswith("w30")
+
+    response = client.post("/api/batch-ocr", json={"file_ids": [file_id, "missing"], "language": "en"})
+    results = response.json()["results"]
+    assert results[0]["success"] and results[0]["raw_text"].endswith("w30")
+    assert results[1] == {**results[1], "file_id": "missing", "success": False, "error": "檔案不存在"}
+
+
+def test_batch_ocr_deferred_group_queue_full_fails_only_that_group(monkeypatch, tmp_path):
+    """測試批次 OCR：延後的分組遇到佇列已滿時退避重試，仍失敗時只標示該組檔案，已完成的組照常回傳"""
+    import asyncio
+    import time
+    from app import main
+    from app.document_store import MemoryDocumentStore
+    from app.executor import QueueFullError
+
+    def output(text):
+        return {"raw_text": text, "layout_info": [[]], "page_errors": [], "cached": False, "processing_time": 0.1}
+
+    class FakeExecutor:
+        max_workers = 3
+
+        def __init__(self, run_failures):
+            self.run_failures = run_failures
+            self.run_calls = 0
+
+        def submit(self, fn, files, language):
+            if files[0]["file_path"].endswith("0.png"):
+                future = asyncio.get_running_loop().create_future()
+                future.set_result([output("ok")])
+                return future
+            raise QueueFullError("OCR 工作佇列已滿，請稍後重試", retry_after=0)
+
+        async def run(self, fn, files, language):
+            self.run_calls += 1
+            if self.run_calls <= self.run_failures:
+                raise QueueFullError("OCR 工作佇列已滿，請稍後重試", retry_after=0)
+            return [output("later") for _ in files]
+
+    store = MemoryDocumentStore()
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    infos = []
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(b"x")
+        infos.append({"file_id": f"f{i}", "filename": path.name, "file_path": str(path), "file_type": "image"})
+        store.create(f"f{i}", filename=path.name, file_path=str(path), file_type="image")
+
+    executor = FakeExecutor(run_failures=1)
+    monkeypatch.setattr(main, "get_ocr_executor", lambda: executor)
+    response = asyncio.run(main.run_batch_ocr(infos, "en", time.time()))
+    assert [r.success for r in response.results] == [True, True, True]
+    assert [r.raw_text for r in response.results] == ["ok", "later", "later"]
+
+    executor = FakeExecutor(run_failures=100)
+    monkeypatch.setattr(main, "get_ocr_executor", lambda: executor)
+    response = asyncio.run(main.run_batch_ocr(infos, "en", time.time()))
+    assert [r.success for r in response.results] == [True, False, False]
+    assert "佇列已滿" in response.results[1].error
+    assert executor.run_calls == 2 * main.BATCH_RETRY_ATTEMPTS
+    assert store.get("f0")["raw_text"] == "ok"
+
+
+
+def test_pool_preloads_languages_in_parallel(monkeypatch, tmp_path):
+    """測試啟動時平行預先載入多個語言，全部載入完成後 /readyz 才回應 200"""
+    import time
+    from fastapi.testclient import TestClient
+    from app import health, main
+    from app.ocr_pool import OCREnginePool
+    from app.services_simple import SimpleOCRService
+
+    def slow_initialize(self):
+        if self.lang == "korean":
+            raise RuntimeError("model download failed")
+        time.sleep(0.2)
+        self.ocr_engine = object()
+
+    monkeypatch.setattr(SimpleOCRService, "_initialize_engine", slow_initialize)
+    pool = OCREnginePool()
+    monkeypatch.setattr(health, "get_ocr_pool", lambda: pool)
+    monkeypatch.setattr(main, "get_health_checker", lambda: health.HealthChecker([str(tmp_path)], cache_ttl=0))
+    client = TestClient(main.app)
+
+    assert client.get("/readyz").status_code == 503
+
+    start_time = time.monotonic()
+    status = pool.preload(["en", "ch_tra", "ch_sim", "japan"])
+    assert time.monotonic() - start_time < 0.5
+    assert status == {"en": "ready", "ch": "ready", "japan": "ready"}
+    assert pool.get_stats()["engines_created"] == 3
+
+    response = client.get("/readyz")
+    assert response.status_code == 200 and response.json()["ready"]
+
+    pool.preload(["korean"])
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert "model download failed" in response.json()["checks"]["ocr_engines"]["errors"]["korean"]
+
+
+def test_readiness_reports_queue_and_disk_from_cache(monkeypatch, tmp_path):
+    """測試就緒檢查：佇列已滿或磁碟空間不足時未就緒，結果在快取期間內不重新計算"""
+    from fastapi.testclient import TestClient
+    from app import health, main
+    from app.executor import OCRExecutor
+
+    executor = OCRExecutor(max_workers=1, max_queue=1)
+    monkeypatch.setattr(health, "get_ocr_executor", lambda: executor)
+    calls = []
+    real_disk_usage = health.shutil.disk_usage
+    monkeypatch.setattr(health.shutil, "disk_usage", lambda path: calls.append(path) or real_disk_usage(path))
+
+    checker = health.HealthChecker([str(tmp_path)], min_free_bytes=1, cache_ttl=60)
+    monkeypatch.setattr(checker, "_check_engines", lambda: {"ok": True})
+    readiness = checker.get_readiness()
+    assert readiness["ready"]
+    assert readiness["checks"]["disk"]["directories"][str(tmp_path)]["free_bytes"] > 0
+    checker.get_readiness()
+    assert len(calls) == 1
+
+    # 佇列已滿
+    executor._pending = 2
+    assert not health.HealthChecker([str(tmp_path)], cache_ttl=0)._check_queue()["ok"]
+
+    # 未設定等待佇列（OCR_MAX_QUEUE=0）時佇列檢查不影響就緒狀態
+    unqueued = OCRExecutor(max_workers=1, max_queue=0)
+    monkeypatch.setattr(health, "get_ocr_executor", lambda: unqueued)
+    assert health.HealthChecker([str(tmp_path)], cache_ttl=0)._check_queue()["ok"]
+    unqueued._pending = 1
+    assert health.HealthChecker([str(tmp_path)], cache_ttl=0)._check_queue()["ok"]
+
+    # 磁碟空間不足
+    full = health.HealthChecker([str(tmp_path)], min_free_bytes=1 << 62, cache_ttl=0)
+    monkeypatch.setattr(full, "_check_engines", lambda: {"ok": True})
+    monkeypatch.setattr(main, "get_health_checker", lambda: full)
+    client = TestClient(main.app)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["checks"]["disk"]["ok"] is False
+    assert client.get("/healthz").json() == {"status": "ok"}
+
+
+
+@pytest.fixture
+def gemini_stub():
+    """本機 Gemini API stub server：依序回應 responses 中的 (狀態碼, 延遲秒數, 文字[, 原始回應內容])，串流請求以 SSE 逐字送出"""
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"responses": [], "requests": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            import time
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"].append({"path": self.path, "headers": dict(self.headers), "body": body})
+            status, delay, text, *raw = state["responses"].pop(0) if state["responses"] else (200, 0, "ok")
+            time.sleep(delay)
+            payload = {"candidates": [{"content": {"parts": [{"text": text}]}}]} if status == 200 else {"error": text}
+            data = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+            if status == 200 and "streamGenerateContent" in self.path:
+                import re
+                data = "".join(
+                    f"data: {json.dumps({'candidates': [{'content': {'parts': [{'text': word}]}}]})}\r\n\r\n"
+                    for word in re.findall(r"\S+\s*", text)
+                ).encode("utf-8")
+                content_type = "text/event-stream"
+            if raw:
+                data = raw[0]
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except OSError:
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["endpoint"] = f"http://127.0.0.1:{server.server_port}"
+    yield state
+    server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_gemini_async_retries_with_timeout_without_blocking(gemini_stub):
+    """測試非同步 Gemini 呼叫：逾時與 5xx 會重試、4xx 不重試，等待期間不阻塞事件迴圈"""
+    import asyncio
+    from app.gemini_service import GeminiService
+
+    service = GeminiService(
+        api_key="test-key", model_name="stub-model", max_retries=3, timeout=0.3,
+        api_endpoint=gemini_stub["endpoint"], retry_base_delay=0.01
+    )
+    gemini_stub["responses"] = [(200, 1.0, "too slow"), (503, 0, "overloaded"), (200, 0, "# Title")]
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.ensure_future(ticker())
+    try:
+        text = await service.process_text_async("raw", system_instruction="be brief")
+    finally:
+        ticker_task.cancel()
+
+    assert text == "# Title"
+    assert ticks > 10
+    requests = gemini_stub["requests"]
+    assert len(requests) == 3
+    # API Key 只放在標頭，不出現在 URL（httpx 會以 INFO 記錄完整 URL）
+    assert requests[0]["path"] == "/v1beta/models/stub-model:generateContent"
+    assert requests[0]["headers"]["x-goog-api-key"] == "test-key"
+    assert requests[0]["body"]["systemInstruction"]["parts"][0]["text"] == "be brief"
+    assert requests[0]["body"]["contents"][0]["parts"][0]["text"].endswith("raw")
+
+    # 請求錯誤（例如 API Key 無效）不重試
+    gemini_stub["responses"] = [(400, 0, "bad key")]
+    with pytest.raises(RuntimeError, match="HTTP 400"):
+        await service.generate_content_async("prompt")
+    assert len(gemini_stub["requests"]) == 4
+    await service.close()
+
+
+
+def test_gemini_responses_cached_with_ttl_and_bypass(monkeypatch, tmp_path):
+    """測試 Gemini 回應快取：正規化後相同的輸入命中快取、bypass_cache 強制重新呼叫、過期後重新呼叫"""
+    import asyncio
+    import time
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.llm_cache import LLMResponseCache
+
+    calls = []
+
+    class FakeGemini:
+        model_name = "stub-model"
+
+        def is_available(self):
+            return True
+
+        def response_cache_key(self, text, prompt_type, custom_prompt, system_instruction):
+            from app.llm_cache import make_llm_cache_key
+            return make_llm_cache_key(self.model_name, custom_prompt or prompt_type, system_instruction, text)
+
+        async def process_text_async(self, text, prompt_type, custom_prompt, system_instruction):
+            calls.append(text)
+            return f"result {len(calls)}"
+
+    threads = []
+
+    class TrackingCache(LLMResponseCache):
+        """記錄快取讀寫是否在事件迴圈之外執行"""
+
+        def _track(self):
+            try:
+                asyncio.get_running_loop()
+                threads.append("event loop")
+            except RuntimeError:
+                threads.append("worker thread")
+
+        def get_response(self, key):
+            self._track()
+            return super().get_response(key)
+
+        def put_response(self, key, text):
+            self._track()
+            return super().put_response(key, text)
+
+    cache = TrackingCache(str(tmp_path), max_bytes=1024 * 1024, ttl=60)
+    monkeypatch.setattr(main, "get_gemini_service", lambda: FakeGemini())
+    monkeypatch.setattr(main, "get_llm_cache", lambda: cache)
+    client = TestClient(main.app)
+
+    def enhance(text, **kwargs):
+        response = client.post("/api/enhance-with-gemini", json={"text": text, **kwargs})
+        assert response.status_code == 200
+        return response.json()
+
+    first = enhance("line one\nline two")
+    assert first["cached"] is False and first["processed_text"] == "result 1"
+    # 換行與行尾空白的差異不影響快取鍵
+    second = enhance("line one  \r\nline two\n")
+    assert second["cached"] is True and second["processed_text"] == "result 1"
+    assert enhance("line one\nline two", prompt_type="summarize")["cached"] is False
+
+    bypassed = enhance("line one\nline two", bypass_cache=True)
+    assert bypassed["cached"] is False and bypassed["processed_text"] == "result 3"
+    assert enhance("line one\nline two")["processed_text"] == "result 3"
+    assert len(calls) == 3
+
+    # 過期的項目視為未命中並移除
+    cache.ttl = 0.01
+    time.sleep(0.05)
+    assert enhance("line one\nline two")["cached"] is False
+    assert cache.get_stats()["expired"] == 1
+    # 快取讀寫磁碟，不在事件迴圈中執行
+    assert threads and set(threads) == {"worker thread"}
+
+
+def test_llm_cache_key_and_logs_are_llm_specific(caplog, tmp_path):
+    """測試 LLM 回應快取：分段字元數不同時快取鍵不同，日誌訊息不沿用 OCR 結果的名稱"""
+    import logging
+    from app.gemini_service import GeminiService
+    from app.llm_cache import LLMResponseCache
+
+    short = GeminiService(api_key="test-key", chunk_chars=400)
+    long = GeminiService(api_key="test-key", chunk_chars=4000)
+    assert short.response_cache_key("text") != long.response_cache_key("text")
+    assert short.response_cache_key("text") == GeminiService(api_key="test-key", chunk_chars=400).response_cache_key("text")
+
+    cache = LLMResponseCache(str(tmp_path), max_bytes=10)
+    with caplog.at_level(logging.WARNING, logger="app.result_cache"):
+        cache.put_response("key", "x" * 100)
+    assert "LLM 回應過大" in caplog.text
+    assert "OCR" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_gemini_long_text_chunked_by_page_with_concurrency_limit():
+    """測試長文件依頁面標記分段、以並行上限同時處理，結構化結果依序串接、總結類先擷取重點再彙整"""
+    import asyncio
+    from app.gemini_service import GeminiService, split_text_chunks
+
+    pages = [f"--- 第 {i} 頁 ---\n" + f"page {i} " * 20 for i in range(1, 9)]
+    text = "\n\n".join(pages)
+    chunks = split_text_chunks(text, 400)
+    assert len(chunks) > 2
+    assert all(len(chunk) <= 400 and chunk.startswith("--- 第 ") for chunk in chunks)
+    assert "\n\n".join(chunks) == text
+    # 單頁超過上限時依段落與字元數切開
+    assert all(len(chunk) <= 50 for chunk in split_text_chunks("a" * 120 + "\n\n" + "b" * 30, 50))
+
+    service = GeminiService(api_key="test-key", chunk_chars=400, chunk_concurrency=2)
+    running = 0
+    peak = 0
+    prompts = []
+
+    async def fake_generate(prompt, system_instruction=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        prompts.append(prompt)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return prompt.split("以下是需要處理的內容：\n\n")[-1].split("\n")[0]
+
+    service.generate_content_async = fake_generate
+    structured = await service.process_text_async(text, prompt_type="structure")
+    assert peak == 2
+    assert len(prompts) == len(chunks)
+    assert structured.split("\n\n") == [chunk.split("\n")[0] for chunk in chunks]
+
+    prompts.clear()
+    await service.process_text_async(text, prompt_type="summarize")
+    assert len(prompts) == len(chunks) + 1
+    assert prompts[-1].count("段重點") == len(chunks)
+
+    prompts.clear()
+    await service.process_text_async("short text", prompt_type="summarize")
+    assert len(prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_gemini_chunks_fit_output_budget_and_cancel_on_failure():
+    """測試串接模式依輸出 token 上限分段，且任一段失敗時取消其餘分段請求"""
+    import asyncio
+    from app.gemini_service import GeminiService
+
+    pages = [f"--- 第 {i} 頁 ---\n" + "字" * 280 for i in range(1, 9)]
+    text = "\n\n".join(pages)
+    service = GeminiService(api_key="test-key", chunk_chars=20000, max_output_tokens=400)
+    prompts = []
+    cancelled = []
+
+    async def fake_generate(prompt, system_instruction=None):
+        prompts.append(prompt)
+        if "--- 第 1 頁 ---" in prompt:
+            return "ok"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(prompt)
+            raise
+        return "slow"
+
+    service.generate_content_async = fake_generate
+
+    # 結構化輸出與輸入等長，每段不超過 400 x 0.75 字元；彙整模式只受 chunk_chars 限制
+    assert service._chunk_limit("structure", None) == 300
+    assert service._chunk_limit("custom", "自訂提示詞") == 300
+    assert service._chunk_limit("summarize", None) == 20000
+    assert service.response_cache_key(text) != GeminiService(api_key="test-key").response_cache_key(text)
+
+    async def failing_generate(prompt, system_instruction=None):
+        if "--- 第 1 頁 ---" in prompt:
+            raise RuntimeError("HTTP 400")
+        return await fake_generate(prompt, system_instruction)
+
+    service.generate_content_async = failing_generate
+    with pytest.raises(RuntimeError, match="HTTP 400"):
+        await service.process_text_async(text, prompt_type="structure")
+    await asyncio.sleep(0)
+    # 每頁各自成段；失敗後已送出與仍在等待並行名額的分段請求全部取消
+    assert prompts and len(cancelled) == len(prompts)
+    assert [task for task in asyncio.all_tasks() if task is not asyncio.current_task()] == []
+
+
+@pytest.mark.asyncio
+async def test_gemini_stream_relays_sse_pieces(gemini_stub):
+    """測試 Gemini 串流：逐段轉送模型輸出，尚未輸出前的伺服器錯誤會重試"""
+    from app.gemini_service import GeminiService
+
+    service = GeminiService(
+        api_key="test-key", model_name="stub-model", max_retries=2, timeout=5,
+        api_endpoint=gemini_stub["endpoint"], retry_base_delay=0.01
+    )
+    gemini_stub["responses"] = [(503, 0, "overloaded"), (200, 0, "# Title\n\nfirst second")]
+
+    pieces = [piece async for piece in service.process_text_stream("raw")]
+
+    assert pieces == ["# ", "Title\n\n", "first ", "second"]
+    assert len(gemini_stub["requests"]) == 2
+    assert "streamGenerateContent" in gemini_stub["requests"][-1]["path"]
+    assert "alt=sse" in gemini_stub["requests"][-1]["path"]
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_gemini_malformed_json_raises_request_error(gemini_stub):
+    """測試 Gemini 回應或 SSE 片段不是合法 JSON 時，與其他請求錯誤一樣重試，最後拋出相同的錯誤類型"""
+    import json
+    from app.gemini_service import GeminiService
+
+    service = GeminiService(
+        api_key="test-key", model_name="stub-model", max_retries=2, timeout=5,
+        api_endpoint=gemini_stub["endpoint"], retry_base_delay=0.01
+    )
+
+    # 尚未輸出文字前的格式錯誤會重試
+    gemini_stub["responses"] = [(200, 0, "", b"data: {not json\r\n\r\n"), (200, 0, "recovered")]
+    assert [piece async for piece in service.stream_content_async("prompt")] == ["recovered"]
+    gemini_stub["responses"] = [(200, 0, "", b"<html>proxy error</html>"), (200, 0, "recovered")]
+    assert await service.generate_content_async("prompt") == "recovered"
+
+    # 已輸出部分文字後的格式錯誤不重試，與非串流路徑拋出相同類型的錯誤
+    good = json.dumps({"candidates": [{"content": {"parts": [{"text": "partial"}]}}]})
+    gemini_stub["responses"] = [(200, 0, "", f"data: {good}\r\n\r\ndata: {{truncated\r\n\r\n".encode("utf-8"))]
+    pieces = []
+    with pytest.raises(RuntimeError, match="回應格式錯誤"):
+        async for piece in service.stream_content_async("prompt"):
+            pieces.append(piece)
+    assert pieces == ["partial"]
+
+    gemini_stub["responses"] = [(200, 0, "", b"not json")] * 2
+    with pytest.raises(RuntimeError, match="回應格式錯誤"):
+        await service.generate_content_async("prompt")
+    await service.close()
+
+
+def test_gemini_stream_endpoint_stores_text_for_markdown(monkeypatch, tmp_path):
+    """測試 Gemini 串流端點：逐段送出 delta 事件，完成後寫入快取並儲存結果供生成 Markdown 使用"""
+    import json
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.document_store import MemoryDocumentStore
+    from app.llm_cache import LLMResponseCache
+
+    class FakeGemini:
+        model_name = "stub-model"
+
+        def is_available(self):
+            return True
+
+        def response_cache_key(self, text, prompt_type, custom_prompt, system_instruction):
+            return f"{prompt_type}-{text}"
+
+        async def process_text_stream(self, text, prompt_type, custom_prompt, system_instruction):
+            for piece in ("# Title", "\n\nbody"):
+                yield piece
+
+    store = MemoryDocumentStore()
+    store.create("doc-1", filename="a.png", raw_text="raw ocr text", layout_info=[])
+    cache = LLMResponseCache(str(tmp_path), max_bytes=1024 * 1024)
+    monkeypatch.setattr(main, "get_document_store", lambda: store)
+    monkeypatch.setattr(main, "get_gemini_service", lambda: FakeGemini())
+    monkeypatch.setattr(main, "get_llm_cache", lambda: cache)
+    client = TestClient(main.app)
+
+    # 尚未處理時使用 OCR 文字
+    response = client.post("/api/generate-markdown", json={"file_id": "doc-1"})
+    assert response.json()["markdown_content"] == "raw ocr text"
+
+    response = client.post("/api/enhance-with-gemini/stream", json={"text": "raw", "file_id": "doc-1"})
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["type"] for event in events] == ["delta", "delta", "done"]
+    assert events[-1]["processed_text"] == "# Title\n\nbody" and events[-1]["cached"] is False
+    assert store.get("doc-1")["processed_text"] == "# Title\n\nbody"
+
+    response = client.post("/api/generate-markdown", json={"file_id": "doc-1"})
+    assert response.json()["markdown_content"] == "# Title\n\nbody"
+
+    # 第二次命中快取，只送出一個包含完整結果的 delta
+    events = [json.loads(line) for line in client.post(
+        "/api/enhance-with-gemini/stream", json={"text": "raw"}
+    ).text.splitlines()]
+    assert [event["type"] for event in events] == ["delta", "done"]
+    assert events[-1]["cached"] is True
+
+    assert client.post(
+        "/api/enhance-with-gemini/stream", json={"text": "raw", "file_id": "missing"}
+    ).status_code == 404
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 